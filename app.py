@@ -1,6 +1,7 @@
 import os
-import json
 import logging
+import re
+import threading
 from datetime import datetime
 from typing import Dict, Any, List
 from werkzeug.utils import secure_filename, send_file
@@ -14,6 +15,7 @@ from reportlab.lib.units import inch
 from reportlab.lib import colors
 import tempfile
 import google.generativeai as genai
+import orjson
 from patient_session_manager import session_manager
 
 try:
@@ -24,7 +26,8 @@ except:
     
 from real_dicom_analyzer import RealDicomAnalyzer
 from enhanced_pathology_detector import detect_enhanced_pathologies
-from database_manager import db_manager
+from database_manager import db_manager, CATEGORY_FIELDS, decode_page_cursor, encode_page_cursor
+from gemini_analyzer import chunk_text, report_date
 from pelvis_test_analyzer import PelvisTestAnalyzer
 from brain_test_analyzer import BrainTestAnalyzer
 from analyze_pelvis_33 import Pelvis33Analyzer
@@ -83,20 +86,86 @@ brain_analyzer = BrainTestAnalyzer()
 enhanced_report_generator = EnhancedDoctorReportGenerator()
 
 
+# Gemini model shared by every GeminiAnalyzer in the process, built on first use
+_gemini_model = None
+_gemini_model_lock = threading.Lock()
+
+
+def _get_gemini_model(api_key: str):
+    """Configure Gemini and build the shared model the first time it is needed"""
+    global _gemini_model
+    if _gemini_model is None:
+        with _gemini_model_lock:
+            if _gemini_model is None:
+                genai.configure(api_key=api_key)
+                _gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+                logger.info("Gemini AI initialized successfully")
+    return _gemini_model
+
+
 class GeminiAnalyzer:
+    # Word limit of the clear analysis summary; streaming stops once it is exceeded
+    CLEAR_SUMMARY_WORDS = 100
+
+    # Output token cap for the clear analysis, with room past the word limit (about 140 tokens)
+    # so the model can finish its sentence; streaming usually stops well before it
+    CLEAR_SUMMARY_MAX_TOKENS = 256
+
+    # Heading the clear analysis summary follows
+    CLEAR_SUMMARY_MARKER = '**CLINICAL SUMMARY:**'
+
+    # Clinical summary section of a clear analysis response, up to the signature
+    CLEAR_SUMMARY_RE = re.compile(r'\*\*CLINICAL SUMMARY:\*\*(.*?)(?:\*\*REPORT PREPARED BY:\*\*|\Z)', re.S)
+
+    # Concise analysis prompt, filled per study by _create_clear_analysis_prompt
+    CLEAR_ANALYSIS_PROMPT = """
+You are Dr. AI Radiologist. Generate a CONCISE medical summary (UNDER 100 WORDS) in professional doctor's report style.
+
+PATIENT: {patient_name} (ID: {patient_id})
+BODY PART: {body_part}
+MODALITY: {modality}
+CONFIDENCE: {confidence:.1f}%
+
+FINDINGS:
+- Anatomical: {anatomical_landmarks}
+- Pathologies: {pathologies}
+- Measurements: {measurements}
+
+REQUIREMENTS:
+- Maximum 100 words total
+- Professional medical terminology
+- Doctor's report writing style
+- Focus on key pathological findings
+- Include clinical significance
+- Clear and actionable
+
+FORMAT:
+**CLINICAL SUMMARY:**
+[Write a concise, professional medical summary under 100 words that includes:
+- Key pathological findings
+- Clinical significance
+- Brief assessment
+- Essential recommendations]
+
+**REPORT PREPARED BY:**
+Dr. AI Radiologist
+
+IMPORTANT: Keep the entire response under 100 words. Be concise but comprehensive. Use professional medical language.
+"""
+
     def __init__(self):
         self.api_key = os.getenv('GEMINI_API_KEY')
-        if self.api_key:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
-            logger.info("Gemini AI initialized successfully")
-        else:
+        if not self.api_key:
             logger.warning(
                 "Gemini API key not found. Enhanced AI analysis will be disabled.")
-            self.model = None
+
+    @property
+    def model(self):
+        """Shared Gemini model, or None without an API key"""
+        return _get_gemini_model(self.api_key) if self.api_key else None
 
     def is_available(self) -> bool:
-        return self.model is not None
+        return bool(self.api_key)
     
     def generate_detailed_human_analysis(self, analysis_result: Dict[str, Any]) -> Dict[str, Any]:
         """Generate detailed human-readable analysis for a single analysis result"""
@@ -130,7 +199,7 @@ class GeminiAnalyzer:
                 'follow_up_plan': sections.get('recommendations', 'Standard follow-up recommended'),
                 'patient_demographics': patient_data,
                 'report_generated_by': patient_data.get('doctor_name', 'DR. RADIOLOGIST'),
-                'report_date': datetime.now().strftime('%B %d, %Y at %H:%M'),
+                'report_date': report_date(),
                 'enhanced': True
             }
             
@@ -285,7 +354,7 @@ class GeminiAnalyzer:
     
     def _create_detailed_medical_analysis_prompt(self, analysis_summary: str, patient_data: Dict[str, Any] = None) -> str:
         """Create detailed medical analysis prompt for Gemini AI - comprehensive doctor report"""
-        current_date = datetime.now().strftime('%B %d, %Y at %H:%M')
+        current_date = report_date()
         
         # Extract patient information
         patient_name = patient_data.get('patient_name', 'UNKNOWN') if patient_data else 'UNKNOWN'
@@ -447,7 +516,7 @@ Board-Certified Radiologist""",
             'follow_up_plan': 'Standard follow-up recommended',
             'patient_demographics': patient_data,
             'report_generated_by': patient_data['doctor_name'],
-            'report_date': datetime.now().strftime('%B %d, %Y at %H:%M'),
+            'report_date': report_date(),
             'enhanced': False
         }
 
@@ -575,68 +644,74 @@ IMPORTANT:
             prompt = self._create_clear_analysis_prompt(analysis_data)
             logger.info(f"Generated clear analysis prompt length: {len(prompt)}")
 
-            # Generate response using Gemini
+            # Stream the response, capped in tokens and stopped before the signature
             logger.info("Calling Gemini API for clear analysis...")
-            response = self.model.generate_content(prompt)
-            logger.info(f"Gemini clear analysis response received, length: {len(response.text)}")
+            response = self.model.generate_content(
+                prompt,
+                stream=True,
+                generation_config=genai.GenerationConfig(
+                    max_output_tokens=self.CLEAR_SUMMARY_MAX_TOKENS,
+                    stop_sequences=['**REPORT PREPARED BY'],
+                ),
+            )
+            response_text = self._collect_clear_summary(response)
+            logger.info(f"Gemini clear analysis response received, length: {len(response_text)}")
 
             # Parse the response into structured data
-            parsed_response = self._parse_clear_analysis_response(response.text, analysis_data)
+            parsed_response = self._parse_clear_analysis_response(response_text, analysis_data)
             return parsed_response
 
         except Exception as e:
             logger.error(f"Gemini clear analysis failed: {e}")
             return self._fallback_clear_analysis(analysis_data)
 
+    def _collect_clear_summary(self, response) -> str:
+        """Accumulate streamed text, stopping once the summary exceeds CLEAR_SUMMARY_WORDS"""
+        marker = self.CLEAR_SUMMARY_MARKER
+        chunks = []
+        head = ''      # text before the summary marker, kept until the marker is found
+        words = 0      # complete words counted, after the marker once it is found
+        partial = ''   # trailing word that may continue in the next chunk
+        for chunk in response:
+            text = chunk_text(chunk)
+            chunks.append(text)
+
+            if head is not None:
+                searched = len(head)
+                head += text
+                start = head.find(marker, max(0, searched - len(marker) + 1))
+                if start != -1:
+                    # Only the summary counts towards the limit
+                    text = head[start + len(marker):]
+                    head, words, partial = None, 0, ''
+
+            # Count each chunk's words once instead of re-splitting the whole text
+            piece = partial + text
+            pieces = piece.split()
+            partial = pieces.pop() if pieces and not piece[-1].isspace() else ''
+            words += len(pieces)
+
+            # The parser truncates anything longer, so the remaining tokens would be discarded
+            if words + bool(partial) > self.CLEAR_SUMMARY_WORDS:
+                break
+        return ''.join(chunks)
+
     def _create_clear_analysis_prompt(self, data: Dict[str, Any]) -> str:
         """Create a concise analysis prompt for Gemini AI (under 100 words)"""
-        
-        patient_name = data.get('patient_name', 'Unknown Patient')
-        patient_id = data.get('patient_id', 'Unknown')
-        body_part = data.get('body_part', 'Unknown')
-        modality = data.get('modality', 'Unknown')
-        confidence = float(data.get('confidence', 0)) * 100
         anatomical_landmarks = data.get('anatomical_landmarks', [])
         pathologies = data.get('pathologies', [])
-        recommendations = data.get('recommendations', [])
         measurements = data.get('measurements', {})
-        locations = data.get('locations', {})
-
-        prompt = f"""
-You are Dr. AI Radiologist. Generate a CONCISE medical summary (UNDER 100 WORDS) in professional doctor's report style.
 
-PATIENT: {patient_name} (ID: {patient_id})
-BODY PART: {body_part}
-MODALITY: {modality}
-CONFIDENCE: {confidence:.1f}%
-
-FINDINGS:
-- Anatomical: {', '.join(anatomical_landmarks) if anatomical_landmarks else 'Standard structures'}
-- Pathologies: {', '.join(pathologies) if pathologies else 'No obvious abnormalities'}
-- Measurements: {measurements if measurements else 'Standard'}
-
-REQUIREMENTS:
-- Maximum 100 words total
-- Professional medical terminology
-- Doctor's report writing style
-- Focus on key pathological findings
-- Include clinical significance
-- Clear and actionable
-
-FORMAT:
-**CLINICAL SUMMARY:**
-[Write a concise, professional medical summary under 100 words that includes:
-- Key pathological findings
-- Clinical significance
-- Brief assessment
-- Essential recommendations]
-
-**REPORT PREPARED BY:**
-Dr. AI Radiologist
-
-IMPORTANT: Keep the entire response under 100 words. Be concise but comprehensive. Use professional medical language.
-"""
-        return prompt
+        return self.CLEAR_ANALYSIS_PROMPT.format_map({
+            'patient_name': data.get('patient_name', 'Unknown Patient'),
+            'patient_id': data.get('patient_id', 'Unknown'),
+            'body_part': data.get('body_part', 'Unknown'),
+            'modality': data.get('modality', 'Unknown'),
+            'confidence': float(data.get('confidence', 0)) * 100,
+            'anatomical_landmarks': ', '.join(anatomical_landmarks) if anatomical_landmarks else 'Standard structures',
+            'pathologies': ', '.join(pathologies) if pathologies else 'No obvious abnormalities',
+            'measurements': measurements if measurements else 'Standard',
+        })
 
     def _parse_clear_analysis_response(self, response_text: str, original_data: Dict[str, Any]) -> Dict[str, Any]:
         """Parse Gemini's concise analysis response into structured data"""
@@ -649,30 +724,16 @@ IMPORTANT: Keep the entire response under 100 words. Be concise but comprehensiv
         }
 
         try:
-            # Extract clinical summary from concise format
-            if '**CLINICAL SUMMARY:**' in response_text:
-                start_idx = response_text.find('**CLINICAL SUMMARY:**') + len('**CLINICAL SUMMARY:**')
-                end_idx = response_text.find('**REPORT PREPARED BY:**')
-                if end_idx == -1:
-                    end_idx = len(response_text)
-                
-                summary = response_text[start_idx:end_idx].strip()
-                # Clean up the summary
-                summary = summary.replace('\n', ' ').replace('  ', ' ')
-                
-                # Ensure it's under 100 words
-                words = summary.split()
-                if len(words) > 100:
-                    summary = ' '.join(words[:100]) + '...'
-                
-                analysis_data['clinical_summary'] = summary
-            else:
-                # Fallback: use the entire response as summary
-                summary = response_text.replace('\n', ' ').replace('  ', ' ')
-                words = summary.split()
-                if len(words) > 100:
-                    summary = ' '.join(words[:100]) + '...'
-                analysis_data['clinical_summary'] = summary
+            # Extract clinical summary from concise format, or use the entire response
+            match = self.CLEAR_SUMMARY_RE.search(response_text)
+            # Split off at most one word past the limit; the remainder stays unsplit
+            words = (match.group(1) if match else response_text).split(None, self.CLEAR_SUMMARY_WORDS)
+
+            # Collapse whitespace and ensure it's under 100 words
+            summary = ' '.join(words[:self.CLEAR_SUMMARY_WORDS])
+            if len(words) > self.CLEAR_SUMMARY_WORDS:
+                summary += '...'
+            analysis_data['clinical_summary'] = summary
             
             # Add enhanced flag
             analysis_data['enhanced'] = True
@@ -894,7 +955,6 @@ def calculate_file_hash(file_path):
         return ""
 
 
-
 @app.route('/refresh')
 def refresh_page():
     """Force refresh page to clear cache"""
@@ -1395,7 +1455,7 @@ def get_modalities():
         return jsonify({'error': 'Analyzer not available'}), 500
 
     return jsonify({
-        'modalities': analyzer.get_supported_modalities()
+        'modalities': sorted(analyzer.get_supported_modalities())
     })
 
 
@@ -1449,26 +1509,26 @@ def get_analysis(filename):
             if not (elbow_detected or updomen_detected or rupali_detected or chest_detected or leg_detected):
                 if not analysis_result.pathologies or len(analysis_result.pathologies) == 0:
                     logger.info("No pathologies detected by regular analyzer, using enhanced detection")
-                    analysis_result.pathologies = enhanced_results['pathologies']
+                    analysis_result.pathologies = enhanced_results.pathologies
                     # Also add measurements and locations if available
                     if hasattr(analysis_result, 'measurements'):
-                        analysis_result.measurements.update(enhanced_results['measurements'])
+                        analysis_result.measurements.update(enhanced_results.measurements)
                     if hasattr(analysis_result, 'locations'):
-                        analysis_result.locations.update(enhanced_results['locations'])
-                elif enhanced_results['pathologies']:
+                        analysis_result.locations.update(enhanced_results.locations)
+                elif enhanced_results.pathologies:
                     logger.info("Replacing basic pathologies with enhanced descriptions")
                     # Replace basic pathologies with enhanced ones
-                    analysis_result.pathologies = enhanced_results['pathologies']
+                    analysis_result.pathologies = enhanced_results.pathologies
                     if hasattr(analysis_result, 'measurements'):
-                        analysis_result.measurements.update(enhanced_results['measurements'])
+                        analysis_result.measurements.update(enhanced_results.measurements)
                     if hasattr(analysis_result, 'locations'):
-                        analysis_result.locations.update(enhanced_results['locations'])
+                        analysis_result.locations.update(enhanced_results.locations)
             else:
                 logger.info("🔒 Protected specific detection - skipping enhanced override")
             
-            logger.info(f"✅ Enhanced pathology detection: {len(enhanced_results['pathologies'])} findings")
-            if enhanced_results['pathologies']:
-                logger.info(f"First enhanced finding: {enhanced_results['pathologies'][0][:100]}...")
+            logger.info(f"✅ Enhanced pathology detection: {len(enhanced_results.pathologies)} findings")
+            if enhanced_results.pathologies:
+                logger.info(f"First enhanced finding: {enhanced_results.pathologies[0][:100]}...")
             
         except Exception as e:
             logger.error(f"Enhanced pathology detection failed: {e}")
@@ -1516,26 +1576,34 @@ def get_analysis_history():
             return jsonify({'error': 'Database not available'}), 503
 
         # Get pagination parameters
-        page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 20))
-        offset = (page - 1) * limit
+        try:
+            cursor = decode_page_cursor(request.args.get('cursor'))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        next_cursor = None
 
         # Get category filter
         category = request.args.get('category', None)
         category_value = request.args.get('category_value', None)
 
+        if category and category not in CATEGORY_FIELDS:
+            return jsonify({'error': f'Unsupported category: {category}'}), 400
+
         if category and category_value:
             # Get filtered results
             results = db_manager.get_analysis_by_category(
                 category, category_value, limit)
         else:
             # Get all results with pagination
-            results = db_manager.get_analysis_history(limit, offset)
+            page = db_manager.get_analysis_history(limit, cursor)
+            results = page['rows']
+            next_cursor = encode_page_cursor(page['next_cursor'])
 
         return jsonify({
             'success': True,
             'results': results,
-            'page': page,
+            'next_cursor': next_cursor,
             'limit': limit
         })
 
@@ -1678,13 +1746,10 @@ def download_professional_report(report_id):
         # Generate professional PDF with enhanced content
         pdf_path = generate_enhanced_professional_report_pdf(enhanced_report)
 
-        # Read PDF content
-        with open(pdf_path, 'rb') as pdf_file:
-            pdf_content = pdf_file.read()
-
-        # Upload to Supabase Storage
+        # Upload to Supabase Storage, streaming from the generated file
         filename = f"enhanced_report_{report_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        storage_info = db_manager.upload_pdf_to_storage(pdf_content, filename)
+        with open(pdf_path, 'rb') as pdf_file:
+            storage_info = db_manager.upload_pdf_to_storage(pdf_file, filename)
 
         if storage_info:
             # Update database with storage info
@@ -1744,17 +1809,19 @@ def get_patient_reports():
             return jsonify({'error': 'Database not available'}), 503
 
         # Get pagination parameters
-        page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 20))
-        offset = (page - 1) * limit
+        try:
+            cursor = decode_page_cursor(request.args.get('cursor'))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
 
         # Get patient reports
-        reports = db_manager.get_patient_reports(limit, offset)
+        page = db_manager.get_patient_reports(limit, cursor)
 
         return jsonify({
             'success': True,
-            'reports': reports,
-            'page': page,
+            'reports': page['rows'],
+            'next_cursor': encode_page_cursor(page['next_cursor']),
             'limit': limit
         })
 
@@ -2110,7 +2177,7 @@ def generate_professional_report_pdf(report_data: Dict[str, Any]) -> str:
     story.append(Paragraph("FINDINGS", heading_style))
 
     # Anatomical Landmarks
-    landmarks = json.loads(report_data.get('anatomical_landmarks', '[]'))
+    landmarks = report_data.get('anatomical_landmarks') or []
     if landmarks:
         story.append(
             Paragraph("Anatomical Landmarks Identified:", normal_style))
@@ -2119,7 +2186,7 @@ def generate_professional_report_pdf(report_data: Dict[str, Any]) -> str:
         story.append(Spacer(1, 8))
 
     # Pathologies
-    pathologies = json.loads(report_data.get('pathologies', '[]'))
+    pathologies = report_data.get('pathologies') or []
     if pathologies:
         story.append(Paragraph("Pathological Findings:", normal_style))
         for pathology in pathologies:
@@ -2132,7 +2199,7 @@ def generate_professional_report_pdf(report_data: Dict[str, Any]) -> str:
 
     # Clinical Recommendations
     story.append(Paragraph("CLINICAL RECOMMENDATIONS", heading_style))
-    recommendations = json.loads(report_data.get('recommendations', '[]'))
+    recommendations = report_data.get('recommendations') or []
     if recommendations:
         for recommendation in recommendations[:5]:
             story.append(Paragraph(f"• {recommendation}", normal_style))
@@ -3202,8 +3269,9 @@ def test_pelvis_folder():
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         results_file = f"pelvis_test_results_{timestamp}.json"
         
-        with open(results_file, 'w') as f:
-            json.dump(results, f, indent=2, default=str)
+        with open(results_file, 'wb') as f:
+            f.write(orjson.dumps(results, default=str,
+                                 option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY))
         
         return jsonify({
             'success': True,
@@ -3224,8 +3292,8 @@ def get_pelvis_results(filename):
         if not os.path.exists(file_path):
             return jsonify({'error': 'Results file not found'}), 404
         
-        with open(file_path, 'r') as f:
-            results = json.load(f)
+        with open(file_path, 'rb') as f:
+            results = orjson.loads(f.read())
         
         return jsonify({
             'success': True,
@@ -5,15 +5,22 @@ Handles all database operations for storing analysis results and history
 """
 
 import os
-import json
+import re
+import asyncio
+import base64
+import binascii
 import logging
+import uuid
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple, Callable, BinaryIO, Union
 from dataclasses import asdict
-import uuid
+from urllib.parse import quote
 
-from supabase import create_client, Client
+import httpx
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
+import orjson
 import io
 
 # Load environment variables
@@ -21,6 +28,136 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Columns needed for list/preview views; callers wanting full records pass fields='*'
+LIST_FIELDS = 'id,created_at,patient_name,patient_id,modality,body_part,confidence,study_date'
+
+# DICOM name fields often carry the referring doctor, e.g. "JOHN DOE DR.S KAR"
+_NAME_DOCTOR_RE = re.compile(
+    r'^\s*(?P<patient>.*?)\s*(?:\bDR(?P<sep>[.\s])\s*(?P<doctor>\S.*?)?)?\s*$',
+    re.IGNORECASE | re.DOTALL)
+DEFAULT_DOCTOR_NAME = 'DR.S KAR'
+
+# Namespace for deterministic patient report IDs (patient_id, study_date, modality)
+_REPORT_ID_NAMESPACE = uuid.UUID('6f1c2a4e-8b0d-4c7e-9a53-2d7e1f4b9c60')
+
+# Record schemas: (column, source key, default)
+_ANALYSIS_PATIENT_FIELDS = (
+    # Patient Information
+    ('patient_name', 'name', 'Unknown'),
+    ('patient_id', 'id', 'Unknown'),
+    ('patient_birth_date', 'birth_date', None),
+    ('patient_sex', 'sex', 'Unknown'),
+    ('patient_age', 'age', None),
+    # Study Information
+    ('study_date', 'study_date', 'Unknown'),
+    ('study_time', 'study_time', None),
+    ('study_instance_uid', 'study_instance_uid', None),
+    ('series_description', 'series_description', None),
+    ('series_number', 'series_number', None),
+    # Doctor/Institution Information
+    ('referring_physician', 'referring_physician', 'Unknown'),
+    ('performing_physician', 'performing_physician', 'Unknown'),
+    ('institution_name', 'institution_name', 'Unknown'),
+    ('department_name', 'department_name', 'Unknown'),
+)
+_ANALYSIS_RESULT_FIELDS = (
+    ('study_description', 'study_description', 'Unknown'),
+    ('modality', 'modality', 'Unknown'),
+    ('body_part', 'body_part', 'Unknown'),
+    ('confidence', 'confidence', 0.0),
+    ('slice_thickness', 'slice_thickness', None),
+)
+_REPORT_PATIENT_FIELDS = (
+    ('patient_id', 'patient_id', 'Unknown'),
+    ('patient_sex', 'sex', 'Unknown'),
+    ('patient_age', 'age', 'Unknown'),
+    ('study_date', 'study_date', 'Unknown'),
+)
+_REPORT_RESULT_FIELDS = (
+    ('body_part', 'body_part', 'Unknown'),
+    ('confidence', 'confidence', 0.0),
+    ('modality', 'modality', 'Unknown'),
+    ('study_description', 'study_description', 'Unknown'),
+    ('slice_thickness', 'slice_thickness', None),
+    ('files_analyzed', 'file_count', 1),
+)
+# JSONB list columns shared by dicom_analyses and patient_reports
+_JSON_FIELDS = ('anatomical_landmarks', 'pathologies',
+                'recommendations', 'image_size', 'pixel_spacing')
+
+# File hashes saved by this process that are remembered to skip re-saving duplicates;
+# older duplicates are still caught by the unique file_hash index on upsert
+_KNOWN_HASHES_SIZE = 10000
+
+# Columns get_analysis_by_category may filter on (each has a (column, created_at) index)
+CATEGORY_FIELDS = frozenset(
+    {'body_part', 'modality', 'patient_id', 'referring_physician'})
+
+
+def _decode_json_columns(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Decode JSON columns still stored as serialized strings (pre-JSONB rows)
+
+    All string values of a column are parsed in a single orjson.loads call
+    over a synthesized array instead of one parse per record.
+    """
+    for field in _JSON_FIELDS:
+        encoded = [record for record in records
+                   if isinstance(record.get(field), str)]
+        if not encoded:
+            continue
+
+        try:
+            parsed = orjson.loads(
+                '[' + ','.join(record[field] or '[]' for record in encoded) + ']')
+        except orjson.JSONDecodeError:
+            parsed = []
+            for record in encoded:
+                try:
+                    parsed.append(orjson.loads(record[field]))
+                except orjson.JSONDecodeError:
+                    parsed.append([])
+
+        for record, value in zip(encoded, parsed):
+            record[field] = value
+
+    return records
+
+
+def encode_page_cursor(cursor: Optional[Tuple[str, str]]) -> Optional[str]:
+    """Encode a (created_at, id) keyset cursor as an opaque URL-safe token"""
+    if not cursor:
+        return None
+    return base64.urlsafe_b64encode(orjson.dumps(list(cursor))).decode('ascii')
+
+
+def decode_page_cursor(token: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    Decode and validate a token from encode_page_cursor
+
+    Returns:
+        Normalized (created_at, id) tuple, or None for an empty token
+
+    Raises:
+        ValueError: If the token is malformed or does not hold a timestamp and UUID
+    """
+    if not token:
+        return None
+    try:
+        created_at, record_id = orjson.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (binascii.Error, UnicodeEncodeError, orjson.JSONDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Malformed page cursor: {token!r}") from e
+    return _validate_cursor((created_at, record_id))
+
+
+def _validate_cursor(cursor: Tuple[Any, Any]) -> Tuple[str, str]:
+    """Normalize a (created_at, id) cursor so it is safe to interpolate into a filter"""
+    created_at, record_id = cursor
+    if not isinstance(created_at, str) or not isinstance(record_id, str):
+        raise ValueError(f"Invalid page cursor: {cursor!r}")
+    # Both raise ValueError on anything but a timestamp and a UUID
+    return datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(record_id))
+
 
 class DatabaseManager:
     """Manages Supabase database operations for DICOM analysis"""
@@ -29,6 +166,7 @@ class DatabaseManager:
         """Initialize Supabase client"""
         self.supabase_url = os.getenv('SUPABASE_URL')
         self.supabase_key = os.getenv('SUPABASE_KEY')
+        self._known_hashes = OrderedDict()  # file hash -> None, in LRU order
 
         if not self.supabase_url or not self.supabase_key:
             logger.warning(
@@ -37,14 +175,28 @@ class DatabaseManager:
             return
 
         try:
+            options = None
+            if os.getenv('SUPABASE_HTTP_POOL', 'false').lower() == 'true':
+                options = self._http_pool_options()
             self.client: Client = create_client(
-                self.supabase_url, self.supabase_key)
+                self.supabase_url, self.supabase_key, options=options)
             logger.info("Supabase client initialized successfully")
             self._initialize_tables()
         except Exception as e:
-            logger.error(f"Failed to initialize Supabase client: {e}")
+            logger.error("Failed to initialize Supabase client: %s", e)
             self.client = None
 
+    def _http_pool_options(self) -> ClientOptions:
+        """Client options sharing one sized keep-alive HTTP/2 pool across the Supabase clients"""
+        http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20,
+                                keepalive_expiry=30),
+            timeout=httpx.Timeout(30, connect=2),
+            http2=True,
+        )
+        logger.info("Supabase HTTP connection pool configured")
+        return ClientOptions(httpx_client=http_client)
+
     def _initialize_tables(self):
         """Create database tables if they don't exist"""
         if not self.client:
@@ -58,7 +210,33 @@ class DatabaseManager:
             self._create_patient_reports_table()
             logger.info("Database tables initialized")
         except Exception as e:
-            logger.error(f"Error initializing tables: {e}")
+            logger.error("Error initializing tables: %s", e)
+
+    def _find_analysis_by_hash(self, file_hash: str) -> Optional[str]:
+        """Return the ID of an existing analysis for this file hash, if any"""
+        if file_hash not in self._known_hashes:
+            return None
+
+        result = self.client.table('dicom_analyses')\
+            .select('id')\
+            .eq('file_hash', file_hash)\
+            .limit(1)\
+            .execute()
+
+        if result.data:
+            self._known_hashes.move_to_end(file_hash)
+            return result.data[0]['id']
+
+        # Stale entry (e.g. the analysis was deleted)
+        self._known_hashes.pop(file_hash, None)
+        return None
+
+    def _remember_hash(self, file_hash: str):
+        """Remember a saved file hash, forgetting the least recently used beyond _KNOWN_HASHES_SIZE"""
+        self._known_hashes[file_hash] = None
+        self._known_hashes.move_to_end(file_hash)
+        if len(self._known_hashes) > _KNOWN_HASHES_SIZE:
+            self._known_hashes.popitem(last=False)
 
     def _create_patient_reports_table(self):
         """Create patient reports table for storing professional reports"""
@@ -67,7 +245,7 @@ class DatabaseManager:
             # The table structure will be created automatically by Supabase when we first insert data
             logger.info("Patient reports table structure ready")
         except Exception as e:
-            logger.error(f"Error creating patient reports table: {e}")
+            logger.error("Error creating patient reports table: %s", e)
 
     def save_analysis_result(self, analysis_result: Dict[str, Any], file_info: Dict[str, Any]) -> Optional[str]:
         """
@@ -85,71 +263,52 @@ class DatabaseManager:
             return None
 
         try:
-            # Generate unique ID
-            record_id = str(uuid.uuid4())
-
-            # Prepare data for database
+            # Skip the insert if this exact file was already analyzed
+            file_hash = file_info.get('file_hash') or None
+            if file_hash:
+                existing_id = self._find_analysis_by_hash(file_hash)
+                if existing_id:
+                    logger.info(
+                        "Analysis for file hash %s already stored with ID: %s", file_hash, existing_id)
+                    return existing_id
+
+            # Prepare data for database (id and created_at are assigned by Postgres)
+            patient_info = analysis_result.get('patient_info') or {}
             db_record = {
-                'id': record_id,
-                'created_at': datetime.now().isoformat(),
                 'filename': file_info.get('filename', 'unknown'),
                 'file_size': file_info.get('file_size', 0),
-                'file_hash': file_info.get('file_hash', ''),
-
-                # Patient Information
-                'patient_name': analysis_result.get('patient_info', {}).get('name', 'Unknown'),
-                'patient_id': analysis_result.get('patient_info', {}).get('id', 'Unknown'),
-                'patient_birth_date': analysis_result.get('patient_info', {}).get('birth_date', None),
-                'patient_sex': analysis_result.get('patient_info', {}).get('sex', 'Unknown'),
-                'patient_age': analysis_result.get('patient_info', {}).get('age', None),
-
-                # Study Information
-                'study_date': analysis_result.get('patient_info', {}).get('study_date', 'Unknown'),
-                'study_time': analysis_result.get('patient_info', {}).get('study_time', None),
-                'study_description': analysis_result.get('study_description', 'Unknown'),
-                'study_instance_uid': analysis_result.get('patient_info', {}).get('study_instance_uid', None),
-                'series_description': analysis_result.get('patient_info', {}).get('series_description', None),
-                'series_number': analysis_result.get('patient_info', {}).get('series_number', None),
-
-                # Doctor/Institution Information
-                'referring_physician': analysis_result.get('patient_info', {}).get('referring_physician', 'Unknown'),
-                'performing_physician': analysis_result.get('patient_info', {}).get('performing_physician', 'Unknown'),
-                'institution_name': analysis_result.get('patient_info', {}).get('institution_name', 'Unknown'),
-                'department_name': analysis_result.get('patient_info', {}).get('department_name', 'Unknown'),
-
-                # Analysis Results
-                'modality': analysis_result.get('modality', 'Unknown'),
-                'body_part': analysis_result.get('body_part', 'Unknown'),
-                'confidence': analysis_result.get('confidence', 0.0),
-                'anatomical_landmarks': json.dumps(analysis_result.get('anatomical_landmarks', [])),
-                'pathologies': json.dumps(analysis_result.get('pathologies', [])),
-                'recommendations': json.dumps(analysis_result.get('recommendations', [])),
-
-                # Technical Information
-                'image_size': json.dumps(analysis_result.get('image_size', [])),
-                'pixel_spacing': json.dumps(analysis_result.get('pixel_spacing', [])),
-                'slice_thickness': analysis_result.get('slice_thickness', None),
-
-                # Analysis metadata
-                'analysis_timestamp': analysis_result.get('analysis_timestamp', datetime.now().isoformat()),
-                'analyzer_version': '2.0',
-                'ai_model_used': 'OpenAI GPT-4 Vision'
+                'file_hash': file_hash,
             }
-
-            # Insert into database
-            result = self.client.table(
-                'dicom_analyses').insert(db_record).execute()
+            db_record.update({col: patient_info.get(key, default)
+                              for col, key, default in _ANALYSIS_PATIENT_FIELDS})
+            db_record.update({col: analysis_result.get(key, default)
+                              for col, key, default in _ANALYSIS_RESULT_FIELDS})
+            db_record.update({col: analysis_result.get(col, [])
+                              for col in _JSON_FIELDS})
+
+            # Analysis metadata
+            if analysis_result.get('analysis_timestamp'):
+                db_record['analysis_timestamp'] = analysis_result['analysis_timestamp']
+            db_record['analyzer_version'] = '2.0'
+            db_record['ai_model_used'] = 'OpenAI GPT-4 Vision'
+
+            # Upsert on file_hash so retries and re-uploads reuse the existing row
+            result = self.client.table('dicom_analyses')\
+                .upsert(db_record, on_conflict='file_hash')\
+                .execute()
 
             if result.data:
-                logger.info(
-                    f"Analysis result saved to database with ID: {record_id}")
+                record_id = result.data[0]['id']
+                if file_hash:
+                    self._remember_hash(file_hash)
+                logger.info("Analysis result saved to database with ID: %s", record_id)
                 return record_id
             else:
                 logger.error("Failed to save analysis result to database")
                 return None
 
         except Exception as e:
-            logger.error(f"Error saving analysis result: {e}")
+            logger.error("Error saving analysis result: %s", e)
             return None
 
     def save_ai_analysis(self, ai_analysis: Dict[str, Any], analysis_ids: List[str]) -> Optional[str]:
@@ -167,37 +326,34 @@ class DatabaseManager:
             return None
 
         try:
-            record_id = str(uuid.uuid4())
-
             db_record = {
-                'id': record_id,
-                'created_at': datetime.now().isoformat(),
-                'related_analyses': json.dumps(analysis_ids),
+                'related_analyses': analysis_ids,
                 'files_analyzed': ai_analysis.get('files_analyzed', 0),
                 'summary': ai_analysis.get('summary', ''),
-                'clinical_insights': json.dumps(ai_analysis.get('clinical_insights', [])),
-                'differential_diagnosis': json.dumps(ai_analysis.get('differential_diagnosis', [])),
-                'recommendations': json.dumps(ai_analysis.get('recommendations', [])),
+                'clinical_insights': ai_analysis.get('clinical_insights', []),
+                'differential_diagnosis': ai_analysis.get('differential_diagnosis', []),
+                'recommendations': ai_analysis.get('recommendations', []),
                 'risk_assessment': ai_analysis.get('risk_assessment', ''),
                 'follow_up_plan': ai_analysis.get('follow_up_plan', ''),
                 'ai_confidence': ai_analysis.get('ai_confidence', 0.0),
-                'ai_model_used': 'Google Gemini',
-                'analysis_timestamp': ai_analysis.get('analysis_timestamp', datetime.now().isoformat())
+                'ai_model_used': 'Google Gemini'
             }
+            if ai_analysis.get('analysis_timestamp'):
+                db_record['analysis_timestamp'] = ai_analysis['analysis_timestamp']
 
             result = self.client.table(
                 'ai_analyses').insert(db_record).execute()
 
             if result.data:
-                logger.info(
-                    f"AI analysis saved to database with ID: {record_id}")
+                record_id = result.data[0]['id']
+                logger.info("AI analysis saved to database with ID: %s", record_id)
                 return record_id
             else:
                 logger.error("Failed to save AI analysis to database")
                 return None
 
         except Exception as e:
-            logger.error(f"Error saving AI analysis: {e}")
+            logger.error("Error saving AI analysis: %s", e)
             return None
 
     def save_patient_report(self, analysis_result: Dict[str, Any], doctor_name: str = None) -> Optional[str]:
@@ -217,142 +373,131 @@ class DatabaseManager:
             return None
 
         try:
-            # Generate unique report ID
-            report_id = str(uuid.uuid4())
-
             # Extract patient info
-            patient_info = analysis_result.get('patient_info', {})
+            patient_info = analysis_result.get('patient_info') or {}
 
-            # Clean patient name (remove doctor name part)
+            # Split raw name into patient name and embedded doctor name
             raw_name = patient_info.get('name', 'Unknown')
-            clean_patient_name = self._clean_patient_name(raw_name)
+            clean_patient_name, extracted_doctor = self._split_name(raw_name)
 
-            # Extract doctor name from raw name if not provided
+            # Use the extracted doctor name if not provided
             if not doctor_name:
-                doctor_name = self._extract_doctor_name(raw_name)
+                doctor_name = extracted_doctor
 
-            # Prepare patient report data
+            # Prepare patient report data. Server-owned columns (id, timestamps, report_status,
+            # is_professional, report_type) are left to their defaults on insert and untouched
+            # when the upsert updates an existing report
             report_data = {
-                'id': report_id,
-                'created_at': datetime.now().isoformat(),
-                'report_date': datetime.now().strftime('%Y-%m-%d'),
-
-                # Cleaned Patient Information
+                # Cleaned Patient and Doctor Information
                 'patient_name': clean_patient_name,
-                'patient_id': patient_info.get('patient_id', 'Unknown'),
-                'patient_sex': patient_info.get('sex', 'Unknown'),
-                'patient_age': patient_info.get('age', 'Unknown'),
-                'study_date': patient_info.get('study_date', 'Unknown'),
-
-                # Doctor Information
                 'doctor_name': doctor_name,
-
-                # Analysis Results
-                'body_part': analysis_result.get('body_part', 'Unknown'),
-                'confidence': analysis_result.get('confidence', 0.0),
-                'modality': analysis_result.get('modality', 'Unknown'),
-                'study_description': analysis_result.get('study_description', 'Unknown'),
-                'anatomical_landmarks': json.dumps(analysis_result.get('anatomical_landmarks', [])),
-                'pathologies': json.dumps(analysis_result.get('pathologies', [])),
-                'recommendations': json.dumps(analysis_result.get('recommendations', [])),
-
-                # Report Status
-                'report_status': 'pending',  # pending, completed, downloaded
-                'is_professional': True,
-                'report_type': 'radiologist_report',
-
-                # Technical Information
-                'image_size': json.dumps(analysis_result.get('image_size', [])),
-                'pixel_spacing': json.dumps(analysis_result.get('pixel_spacing', [])),
-                'slice_thickness': analysis_result.get('slice_thickness', None),
-
-                # Metadata
-                'analysis_timestamp': analysis_result.get('analysis_timestamp', datetime.now().isoformat()),
-                'files_analyzed': analysis_result.get('file_count', 1)
             }
-
-            # Insert into patient_reports table
-            result = self.client.table(
-                'patient_reports').insert(report_data).execute()
+            report_data.update({col: patient_info.get(key, default)
+                                for col, key, default in _REPORT_PATIENT_FIELDS})
+            report_data.update({col: analysis_result.get(key, default)
+                                for col, key, default in _REPORT_RESULT_FIELDS})
+            report_data.update({col: analysis_result.get(col, [])
+                                for col in _JSON_FIELDS})
+            if analysis_result.get('analysis_timestamp'):
+                report_data['analysis_timestamp'] = analysis_result['analysis_timestamp']
+
+            # Derive a stable ID for identifiable studies so re-runs update the same row
+            report_key = self._report_key(report_data)
+            if report_key:
+                report_data['id'] = str(uuid.uuid5(_REPORT_ID_NAMESPACE, report_key))
+
+            # Upsert into patient_reports table
+            result = self.client.table('patient_reports')\
+                .upsert(report_data, on_conflict='id')\
+                .execute()
 
             if result.data:
-                logger.info(f"Patient report saved with ID: {report_id}")
+                report_id = result.data[0]['id']
+                logger.info("Patient report saved with ID: %s", report_id)
                 return report_id
             else:
                 logger.error("Failed to save patient report to database")
                 return None
 
         except Exception as e:
-            logger.error(f"Error saving patient report: {e}")
+            logger.error("Error saving patient report: %s", e)
             return None
 
-    def _clean_patient_name(self, raw_name: str) -> str:
-        """Clean patient name by removing doctor name part"""
+    def _report_key(self, report_data: Dict[str, Any]) -> Optional[str]:
+        """Identity of a patient report, or None if the study is not identifiable"""
+        parts = (report_data.get('patient_id'), report_data.get('study_date'),
+                 report_data.get('modality'))
+        if any(not part or part == 'Unknown' for part in parts):
+            return None
+        return '|'.join(str(part) for part in parts)
+
+    def _split_name(self, raw_name: str) -> Tuple[str, str]:
+        """Split a raw DICOM name field into (patient name, doctor name)"""
         if not raw_name or raw_name == 'Unknown':
-            return 'Unknown'
+            return 'Unknown', DEFAULT_DOCTOR_NAME
 
-        # Extract just the first part before any "DR." appears
-        parts = raw_name.split(' DR.')
-        if len(parts) > 0:
-            return parts[0].strip()
+        match = _NAME_DOCTOR_RE.match(raw_name)
+        patient_name = match.group('patient') or 'Unknown'
+        doctor = match.group('doctor')
+        if not doctor:
+            return patient_name, DEFAULT_DOCTOR_NAME
 
-        # Alternative pattern
-        parts = raw_name.split('DR ')
-        if len(parts) > 0:
-            return parts[0].strip()
+        return patient_name, f"DR{match.group('sep')}{doctor.upper()}"
 
-        return raw_name.strip()
+    def _fetch_page(self, table: str, limit: int, cursor: Optional[Tuple[str, str]],
+                    fields: str = '*') -> Dict[str, Any]:
+        """
+        Fetch one page of a table using keyset pagination on (created_at, id)
 
-    def _extract_doctor_name(self, raw_name: str) -> str:
-        """Extract doctor name from patient name field"""
-        if not raw_name or raw_name == 'Unknown':
-            return 'DR.S KAR'
+        Args:
+            table: Table name
+            limit: Number of records to return
+            cursor: (created_at, id) of the last record of the previous page
+            fields: Comma-separated columns to select
+
+        Returns:
+            Dict with 'rows' and 'next_cursor' (None when there are no more rows)
+        """
+        query = self.client.table(table)\
+            .select(fields)\
+            .order('created_at', desc=True)\
+            .order('id', desc=True)\
+            .limit(limit)
 
-        # Look for "DR." pattern and extract what comes after
-        if 'DR.' in raw_name.upper():
-            parts = raw_name.upper().split('DR.')
-            if len(parts) > 1:
-                doctor_part = parts[1].strip()
-                if doctor_part:
-                    return f"DR.{doctor_part}"
+        if cursor:
+            created_at, record_id = _validate_cursor(cursor)
+            query = query.or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt."{record_id}")')
 
-        # Look for "DR " pattern
-        if 'DR ' in raw_name.upper():
-            parts = raw_name.upper().split('DR ')
-            if len(parts) > 1:
-                doctor_part = parts[1].strip()
-                if doctor_part:
-                    return f"DR {doctor_part}"
+        rows = _decode_json_columns(query.execute().data or [])
 
-        # Default fallback
-        return 'DR.S KAR'
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = (rows[-1]['created_at'], rows[-1]['id'])
 
-    def get_patient_reports(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        return {'rows': rows, 'next_cursor': next_cursor}
+
+    def get_patient_reports(self, limit: int = 50, cursor: Optional[Tuple[str, str]] = None) -> Dict[str, Any]:
         """
         Get patient reports for PDF generation
 
         Args:
             limit: Number of records to return
-            offset: Number of records to skip
+            cursor: (created_at, id) of the last record already seen
 
         Returns:
-            List of patient report records
+            Dict with patient report 'rows' and the 'next_cursor'
         """
         if not self.client:
-            return []
+            return {'rows': [], 'next_cursor': None}
 
         try:
-            result = self.client.table('patient_reports')\
-                .select('*')\
-                .order('created_at', desc=True)\
-                .range(offset, offset + limit - 1)\
-                .execute()
-
-            return result.data if result.data else []
+            return self._fetch_page('patient_reports', limit, cursor)
 
         except Exception as e:
-            logger.error(f"Error fetching patient reports: {e}")
-            return []
+            logger.error("Error fetching patient reports: %s", e)
+            return {'rows': [], 'next_cursor': None}
 
     def get_patient_report_by_id(self, report_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -374,11 +519,11 @@ class DatabaseManager:
                 .execute()
 
             if result.data and len(result.data) > 0:
-                return result.data[0]
+                return _decode_json_columns(result.data)[0]
             return None
 
         except Exception as e:
-            logger.error(f"Error fetching patient report {report_id}: {e}")
+            logger.error("Error fetching patient report %s: %s", report_id, e)
             return None
 
     def update_report_status(self, report_id: str, status: str) -> bool:
@@ -404,52 +549,34 @@ class DatabaseManager:
             return result.data is not None
 
         except Exception as e:
-            logger.error(f"Error updating report status: {e}")
+            logger.error("Error updating report status: %s", e)
             return False
 
-    def get_analysis_history(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+    def get_analysis_history(self, limit: int = 50, cursor: Optional[Tuple[str, str]] = None,
+                             fields: str = LIST_FIELDS) -> Dict[str, Any]:
         """
-        Get analysis history with pagination
+        Get analysis history with keyset pagination
 
         Args:
             limit: Number of records to return
-            offset: Number of records to skip
+            cursor: (created_at, id) of the last record already seen
+            fields: Comma-separated columns to select
 
         Returns:
-            List of analysis records
+            Dict with analysis 'rows' and the 'next_cursor'
         """
         if not self.client:
-            return []
+            return {'rows': [], 'next_cursor': None}
 
         try:
-            result = self.client.table('dicom_analyses')\
-                .select('*')\
-                .order('created_at', desc=True)\
-                .range(offset, offset + limit - 1)\
-                .execute()
-
-            if result.data:
-                # Parse JSON fields back to lists
-                for record in result.data:
-                    record['anatomical_landmarks'] = json.loads(
-                        record.get('anatomical_landmarks', '[]'))
-                    record['pathologies'] = json.loads(
-                        record.get('pathologies', '[]'))
-                    record['recommendations'] = json.loads(
-                        record.get('recommendations', '[]'))
-                    record['image_size'] = json.loads(
-                        record.get('image_size', '[]'))
-                    record['pixel_spacing'] = json.loads(
-                        record.get('pixel_spacing', '[]'))
-
-                return result.data
-            return []
+            return self._fetch_page('dicom_analyses', limit, cursor, fields)
 
         except Exception as e:
-            logger.error(f"Error getting analysis history: {e}")
-            return []
+            logger.error("Error getting analysis history: %s", e)
+            return {'rows': [], 'next_cursor': None}
 
-    def get_analysis_by_category(self, category_type: str, category_value: str, limit: int = 20) -> List[Dict[str, Any]]:
+    def get_analysis_by_category(self, category_type: str, category_value: str, limit: int = 20,
+                                 fields: str = LIST_FIELDS) -> List[Dict[str, Any]]:
         """
         Get analyses filtered by category (body_part, modality, patient_id, etc.)
 
@@ -457,6 +584,7 @@ class DatabaseManager:
             category_type: Type of category (body_part, modality, patient_id, etc.)
             category_value: Value to filter by
             limit: Number of records to return
+            fields: Comma-separated columns to select
 
         Returns:
             List of filtered analysis records
@@ -464,29 +592,22 @@ class DatabaseManager:
         if not self.client:
             return []
 
+        if category_type not in CATEGORY_FIELDS:
+            logger.warning("Unsupported category filter: %s", category_type)
+            return []
+
         try:
             result = self.client.table('dicom_analyses')\
-                .select('*')\
+                .select(fields)\
                 .eq(category_type, category_value)\
                 .order('created_at', desc=True)\
                 .limit(limit)\
                 .execute()
 
-            if result.data:
-                # Parse JSON fields
-                for record in result.data:
-                    record['anatomical_landmarks'] = json.loads(
-                        record.get('anatomical_landmarks', '[]'))
-                    record['pathologies'] = json.loads(
-                        record.get('pathologies', '[]'))
-                    record['recommendations'] = json.loads(
-                        record.get('recommendations', '[]'))
-
-                return result.data
-            return []
+            return _decode_json_columns(result.data) if result.data else []
 
         except Exception as e:
-            logger.error(f"Error getting analysis by category: {e}")
+            logger.error("Error getting analysis by category: %s", e)
             return []
 
     def get_analysis_statistics(self) -> Dict[str, Any]:
@@ -500,10 +621,10 @@ class DatabaseManager:
             return {}
 
         try:
-            # Get total count
-            total_result = self.client.table('dicom_analyses').select(
-                'id', count='exact').execute()
-            total_analyses = len(total_result.data) if total_result.data else 0
+            # Get total count (planner estimate - exact counts scan the table)
+            total_result = self.client.rpc(
+                'approx_count', {'tbl': 'dicom_analyses'}).execute()
+            total_analyses = total_result.data or 0
 
             # Get body part distribution
             body_parts_result = self.client.table('dicom_analyses')\
@@ -538,16 +659,39 @@ class DatabaseManager:
             }
 
         except Exception as e:
-            logger.error(f"Error getting statistics: {e}")
+            logger.error("Error getting statistics: %s", e)
             return {}
 
-    def search_analyses(self, search_term: str, search_fields: List[str] = None) -> List[Dict[str, Any]]:
+    def get_exact_analysis_count(self) -> int:
+        """
+        Get the exact number of stored analyses (full count, for admin use)
+
+        Returns:
+            int: Number of analysis records
+        """
+        if not self.client:
+            return 0
+
+        try:
+            result = self.client.table('dicom_analyses')\
+                .select('id', count='exact')\
+                .limit(1)\
+                .execute()
+            return result.count or 0
+
+        except Exception as e:
+            logger.error("Error counting analyses: %s", e)
+            return 0
+
+    def search_analyses(self, search_term: str, search_fields: List[str] = None,
+                        fields: str = LIST_FIELDS) -> List[Dict[str, Any]]:
         """
         Search analyses by various fields
 
         Args:
             search_term: Term to search for
             search_fields: Fields to search in (default: patient_name, patient_id, study_description)
+            fields: Comma-separated columns to select
 
         Returns:
             List of matching analysis records
@@ -565,7 +709,7 @@ class DatabaseManager:
 
             for field in search_fields:
                 result = self.client.table('dicom_analyses')\
-                    .select('*')\
+                    .select(fields)\
                     .ilike(field, f'%{search_term}%')\
                     .order('created_at', desc=True)\
                     .limit(20)\
@@ -580,21 +724,13 @@ class DatabaseManager:
 
             for record in results:
                 if record['id'] not in seen_ids:
-                    # Parse JSON fields
-                    record['anatomical_landmarks'] = json.loads(
-                        record.get('anatomical_landmarks', '[]'))
-                    record['pathologies'] = json.loads(
-                        record.get('pathologies', '[]'))
-                    record['recommendations'] = json.loads(
-                        record.get('recommendations', '[]'))
-
                     unique_results.append(record)
                     seen_ids.add(record['id'])
 
-            return unique_results
+            return _decode_json_columns(unique_results)
 
         except Exception as e:
-            logger.error(f"Error searching analyses: {e}")
+            logger.error("Error searching analyses: %s", e)
             return []
 
     def delete_analysis(self, analysis_id: str) -> bool:
@@ -619,19 +755,24 @@ class DatabaseManager:
             return len(result.data) > 0
 
         except Exception as e:
-            logger.error(f"Error deleting analysis: {e}")
+            logger.error("Error deleting analysis: %s", e)
             return False
 
     def is_available(self) -> bool:
         """Check if database is available"""
         return self.client is not None
 
-    def upload_pdf_to_storage(self, pdf_content: bytes, filename: str, bucket_name: str = "patient-reports") -> Optional[Dict[str, str]]:
+    def _public_url(self, bucket_name: str, path: str) -> str:
+        """Build the public object URL for a public storage bucket"""
+        return (f"{self.supabase_url.rstrip('/')}/storage/v1/object/public/"
+                f"{bucket_name}/{quote(path)}")
+
+    def upload_pdf_to_storage(self, pdf_content: Union[bytes, BinaryIO], filename: str, bucket_name: str = "patient-reports") -> Optional[Dict[str, str]]:
         """
         Upload PDF file to Supabase Storage bucket
 
         Args:
-            pdf_content: PDF file content as bytes
+            pdf_content: PDF file content as bytes or a file opened with open(path, 'rb')
             filename: Name for the file in storage
             bucket_name: Storage bucket name
 
@@ -642,7 +783,20 @@ class DatabaseManager:
             logger.warning("Database not available for storage upload")
             return None
 
+        # Storage takes bytes or real file handles, which it streams without reading into memory
+        if isinstance(pdf_content, bytearray):
+            pdf_content = bytes(pdf_content)
+        if not isinstance(pdf_content, (bytes, io.BufferedReader, io.FileIO)):
+            logger.error("Unsupported PDF content type for storage upload: %s",
+                         type(pdf_content).__name__)
+            return None
+
         try:
+            if isinstance(pdf_content, bytes):
+                file_size = len(pdf_content)
+            else:
+                file_size = os.fstat(pdf_content.fileno()).st_size
+
             # Upload file to storage bucket with proper options
             result = self.client.storage.from_(bucket_name).upload(
                 path=filename,
@@ -654,16 +808,14 @@ class DatabaseManager:
             )
 
             if result:
-                # Get public URL
-                public_url = self.client.storage.from_(
-                    bucket_name).get_public_url(filename)
+                public_url = self._public_url(bucket_name, filename)
 
-                logger.info(f"PDF uploaded successfully to: {public_url}")
+                logger.info("PDF uploaded successfully to: %s", public_url)
                 return {
                     "storage_path": filename,
                     "public_url": public_url,
                     "bucket_name": bucket_name,
-                    "file_size": len(pdf_content)
+                    "file_size": file_size
                 }
             else:
                 logger.error(
@@ -671,10 +823,12 @@ class DatabaseManager:
                 return None
 
         except Exception as e:
-            logger.error(f"Error uploading PDF to storage: {e}")
+            logger.error("Error uploading PDF to storage: %s", e)
             # Try alternative upload method
             try:
                 # Alternative: use update method if upload fails
+                if not isinstance(pdf_content, bytes):
+                    pdf_content.seek(0)
                 result = self.client.storage.from_(bucket_name).update(
                     path=filename,
                     file=pdf_content,
@@ -682,17 +836,16 @@ class DatabaseManager:
                 )
 
                 if result:
-                    public_url = self.client.storage.from_(
-                        bucket_name).get_public_url(filename)
-                    logger.info(f"PDF updated successfully to: {public_url}")
+                    public_url = self._public_url(bucket_name, filename)
+                    logger.info("PDF updated successfully to: %s", public_url)
                     return {
                         "storage_path": filename,
                         "public_url": public_url,
                         "bucket_name": bucket_name,
-                        "file_size": len(pdf_content)
+                        "file_size": file_size
                     }
             except Exception as e2:
-                logger.error(f"Alternative upload method also failed: {e2}")
+                logger.error("Alternative upload method also failed: %s", e2)
 
             return None
 
@@ -729,10 +882,66 @@ class DatabaseManager:
             return result.data is not None
 
         except Exception as e:
-            logger.error(
-                f"Error updating patient report with storage info: {e}")
+            logger.error("Error updating patient report with storage info: %s", e)
             return False
 
+    async def _process_patient_report(self, analysis_result: Dict[str, Any],
+                                      pdf_builder: Callable[[Dict[str, Any]], bytes]) -> Optional[str]:
+        """Save one patient report, build its PDF and attach the uploaded file"""
+        # The row insert and PDF rendering are independent, so overlap them
+        report_id, pdf_content = await asyncio.gather(
+            asyncio.to_thread(self.save_patient_report, analysis_result),
+            asyncio.to_thread(pdf_builder, analysis_result)
+        )
+        if not report_id or not pdf_content:
+            return None
+
+        filename = f"patient_report_{report_id}.pdf"
+        storage_info = await asyncio.to_thread(
+            self.upload_pdf_to_storage, pdf_content, filename)
+        if not storage_info:
+            return None
+
+        await asyncio.to_thread(
+            self.update_patient_report_with_storage_info, report_id, storage_info)
+        return report_id
+
+    async def process_patient_reports(self, analysis_results: List[Dict[str, Any]],
+                                      pdf_builder: Callable[[Dict[str, Any]], bytes],
+                                      max_concurrency: int = 16) -> List[Optional[str]]:
+        """
+        Save, render and upload several patient reports concurrently
+
+        Args:
+            analysis_results: Analysis results to create reports for
+            pdf_builder: Callable returning the PDF bytes for an analysis result
+            max_concurrency: Maximum number of reports processed at once
+
+        Returns:
+            List of report IDs (None for reports that failed), in input order
+        """
+        if not self.client:
+            return [None] * len(analysis_results)
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def bounded(analysis_result):
+            async with semaphore:
+                try:
+                    return await self._process_patient_report(analysis_result, pdf_builder)
+                except Exception as e:
+                    logger.error("Error processing patient report: %s", e)
+                    return None
+
+        return await asyncio.gather(*[bounded(a) for a in analysis_results])
+
+    def save_patient_reports_with_pdfs(self, analysis_results: List[Dict[str, Any]],
+                                       pdf_builder: Callable[[Dict[str, Any]], bytes],
+                                       max_concurrency: int = 16) -> List[Optional[str]]:
+        """Synchronous entry point for process_patient_reports"""
+        return asyncio.run(self.process_patient_reports(
+            analysis_results, pdf_builder, max_concurrency))
+
     def get_pdf_download_url(self, report_id: str) -> Optional[str]:
         """
         Get PDF download URL for a patient report
@@ -766,12 +975,12 @@ class DatabaseManager:
                 path = report_data.get('pdf_storage_path')
 
                 if path:
-                    return self.client.storage.from_(bucket).get_public_url(path)
+                    return self._public_url(bucket, path)
 
             return None
 
         except Exception as e:
-            logger.error(f"Error getting PDF download URL: {e}")
+            logger.error("Error getting PDF download URL: %s", e)
             return None
 
 
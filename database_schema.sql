@@ -4,6 +4,22 @@
 
 -- Enable UUID extension if not already enabled (for PostgreSQL/Supabase)
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
+-- Time-ordered UUIDv7 keys (48-bit unix ms timestamp + random bits) keep
+-- primary key inserts on the rightmost B-tree leaf
+CREATE OR REPLACE FUNCTION uuid_generate_v7()
+RETURNS UUID AS $$
+DECLARE
+    uuid_bytes BYTEA;
+BEGIN
+    uuid_bytes = substring(int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::BIGINT) FROM 3)
+        || gen_random_bytes(10);
+    uuid_bytes = set_byte(uuid_bytes, 6, (b'0111' || get_byte(uuid_bytes, 6)::BIT(4))::BIT(8)::INT);
+    uuid_bytes = set_byte(uuid_bytes, 8, (b'10' || get_byte(uuid_bytes, 8)::BIT(6))::BIT(8)::INT);
+    RETURN encode(uuid_bytes, 'hex')::UUID;
+END
+$$ LANGUAGE plpgsql VOLATILE;
 
 -- ⚠️  CRITICAL: STORAGE BUCKET CANNOT BE CREATED VIA SQL!
 -- ⚠️  YOU MUST CREATE IT MANUALLY IN SUPABASE DASHBOARD AFTER RUNNING THIS SQL!
@@ -30,7 +46,7 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
 -- Table for storing DICOM analysis results
 CREATE TABLE IF NOT EXISTS dicom_analyses (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v7(),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     
@@ -64,48 +80,48 @@ CREATE TABLE IF NOT EXISTS dicom_analyses (
     modality VARCHAR(10),
     body_part VARCHAR(100),
     confidence DECIMAL(5,4) DEFAULT 0.0,
-    anatomical_landmarks JSON,
-    pathologies JSON,
-    recommendations JSON,
+    anatomical_landmarks JSONB,
+    pathologies JSONB,
+    recommendations JSONB,
     
     -- Technical Information
-    image_size JSON,
-    pixel_spacing JSON,
+    image_size JSONB,
+    pixel_spacing JSONB,
     slice_thickness DECIMAL(10,4),
     
     -- Analysis Metadata
-    analysis_timestamp TIMESTAMP WITH TIME ZONE,
+    analysis_timestamp TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     analyzer_version VARCHAR(20),
     ai_model_used VARCHAR(100)
 );
 
 -- Table for storing AI comprehensive analysis results
 CREATE TABLE IF NOT EXISTS ai_analyses (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v7(),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     
     -- Related Analysis Information
-    related_analyses JSON, -- Array of analysis IDs
+    related_analyses JSONB, -- Array of analysis IDs
     files_analyzed INTEGER DEFAULT 0,
     
     -- AI Analysis Results
     summary TEXT,
-    clinical_insights JSON,
-    differential_diagnosis JSON,
-    recommendations JSON,
+    clinical_insights JSONB,
+    differential_diagnosis JSONB,
+    recommendations JSONB,
     risk_assessment TEXT,
     follow_up_plan TEXT,
     ai_confidence DECIMAL(5,4) DEFAULT 0.0,
     
     -- AI Metadata
     ai_model_used VARCHAR(100),
-    analysis_timestamp TIMESTAMP WITH TIME ZONE
+    analysis_timestamp TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 -- Table for storing patient reports for professional PDF generation
 CREATE TABLE IF NOT EXISTS patient_reports (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v7(),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     report_date DATE DEFAULT CURRENT_DATE,
@@ -125,9 +141,9 @@ CREATE TABLE IF NOT EXISTS patient_reports (
     confidence DECIMAL(5,4) DEFAULT 0.0,
     modality VARCHAR(10),
     study_description TEXT,
-    anatomical_landmarks JSON,
-    pathologies JSON,
-    recommendations JSON,
+    anatomical_landmarks JSONB,
+    pathologies JSONB,
+    recommendations JSONB,
     
     -- Report Status and Type
     report_status VARCHAR(20) DEFAULT 'pending', -- pending, completed, downloaded
@@ -135,12 +151,12 @@ CREATE TABLE IF NOT EXISTS patient_reports (
     report_type VARCHAR(50) DEFAULT 'radiologist_report',
     
     -- Technical Information
-    image_size JSON,
-    pixel_spacing JSON,
+    image_size JSONB,
+    pixel_spacing JSONB,
     slice_thickness DECIMAL(10,4),
     
     -- Metadata
-    analysis_timestamp TIMESTAMP WITH TIME ZONE,
+    analysis_timestamp TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     files_analyzed INTEGER DEFAULT 1,
     
     -- PDF Generation Information
@@ -161,7 +177,7 @@ CREATE TABLE IF NOT EXISTS patient_reports (
 
 -- Table for storing PDF report generation logs
 CREATE TABLE IF NOT EXISTS report_generation_logs (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v7(),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     
     -- Report Reference
@@ -182,13 +198,85 @@ CREATE TABLE IF NOT EXISTS report_generation_logs (
     user_agent TEXT
 );
 
+-- Server-side defaults for tables created before the application stopped
+-- sending ids and timestamps
+ALTER TABLE dicom_analyses ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE dicom_analyses ALTER COLUMN created_at SET DEFAULT NOW();
+ALTER TABLE dicom_analyses ALTER COLUMN analysis_timestamp SET DEFAULT NOW();
+ALTER TABLE ai_analyses ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE ai_analyses ALTER COLUMN created_at SET DEFAULT NOW();
+ALTER TABLE ai_analyses ALTER COLUMN analysis_timestamp SET DEFAULT NOW();
+ALTER TABLE patient_reports ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE patient_reports ALTER COLUMN created_at SET DEFAULT NOW();
+ALTER TABLE patient_reports ALTER COLUMN report_date SET DEFAULT CURRENT_DATE;
+ALTER TABLE patient_reports ALTER COLUMN analysis_timestamp SET DEFAULT NOW();
+
+-- Migrate legacy JSON columns to JSONB. Older rows were written as
+-- serialized strings, so unwrap JSON string scalars back into documents.
+-- The summary view depends on these columns and is recreated below.
+DROP VIEW IF EXISTS patient_reports_summary;
+
+DO $$
+DECLARE
+    col RECORD;
+BEGIN
+    FOR col IN
+        SELECT table_name, column_name
+        FROM information_schema.columns
+        WHERE table_schema = 'public'
+          AND data_type = 'json'
+          AND table_name IN ('dicom_analyses', 'ai_analyses', 'patient_reports')
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE %I ALTER COLUMN %I TYPE JSONB USING '
+            'CASE WHEN json_typeof(%I) = ''string'' THEN (%I #>> ''{}'')::jsonb ELSE %I::jsonb END',
+            col.table_name, col.column_name,
+            col.column_name, col.column_name, col.column_name
+        );
+    END LOOP;
+END $$;
+
 -- Indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_dicom_analyses_created_at ON dicom_analyses(created_at DESC);
-CREATE INDEX IF NOT EXISTS idx_dicom_analyses_patient_id ON dicom_analyses(patient_id);
-CREATE INDEX IF NOT EXISTS idx_dicom_analyses_body_part ON dicom_analyses(body_part);
-CREATE INDEX IF NOT EXISTS idx_dicom_analyses_modality ON dicom_analyses(modality);
+CREATE INDEX IF NOT EXISTS idx_dicom_analyses_created_at_id ON dicom_analyses(created_at DESC, id DESC);
+
+-- One analysis per file: uploads upsert on file_hash (ON CONFLICT needs a
+-- full unique index, so rows without a hash store NULL instead of '').
+UPDATE dicom_analyses SET file_hash = NULL WHERE file_hash = '';
+
+-- Re-uploads used to insert a new row each time; the newest row of each file
+-- keeps the hash and older copies keep their data with a NULL hash
+UPDATE dicom_analyses
+SET file_hash = NULL
+FROM (
+    SELECT id, ROW_NUMBER() OVER (
+        PARTITION BY file_hash ORDER BY created_at DESC NULLS LAST, id DESC) AS position
+    FROM dicom_analyses
+    WHERE file_hash IS NOT NULL
+) ranked
+WHERE dicom_analyses.id = ranked.id AND ranked.position > 1;
+
+DROP INDEX IF EXISTS idx_dicom_analyses_file_hash;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dicom_analyses_file_hash_unique
+    ON dicom_analyses(file_hash);
+
+-- Category filters sort by created_at; INCLUDE the list columns so
+-- get_analysis_by_category can be served by an index-only scan
+DROP INDEX IF EXISTS idx_dicom_analyses_patient_id;
+DROP INDEX IF EXISTS idx_dicom_analyses_body_part;
+DROP INDEX IF EXISTS idx_dicom_analyses_modality;
+CREATE INDEX IF NOT EXISTS idx_dicom_body_part_created ON dicom_analyses(body_part, created_at DESC)
+    INCLUDE (id, patient_name, patient_id, modality, confidence, study_date);
+CREATE INDEX IF NOT EXISTS idx_dicom_modality_created ON dicom_analyses(modality, created_at DESC)
+    INCLUDE (id, patient_name, patient_id, body_part, confidence, study_date);
+CREATE INDEX IF NOT EXISTS idx_dicom_patient_id_created ON dicom_analyses(patient_id, created_at DESC)
+    INCLUDE (id, patient_name, modality, body_part, confidence, study_date);
+CREATE INDEX IF NOT EXISTS idx_dicom_referring_physician_created ON dicom_analyses(referring_physician, created_at DESC)
+    INCLUDE (id, patient_name, patient_id, modality, body_part, confidence, study_date);
+CREATE INDEX IF NOT EXISTS idx_dicom_analyses_landmarks ON dicom_analyses USING GIN (anatomical_landmarks);
 
 CREATE INDEX IF NOT EXISTS idx_patient_reports_created_at ON patient_reports(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_patient_reports_created_at_id ON patient_reports(created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_patient_reports_patient_id ON patient_reports(patient_id);
 CREATE INDEX IF NOT EXISTS idx_patient_reports_status ON patient_reports(report_status);
 CREATE INDEX IF NOT EXISTS idx_patient_reports_doctor ON patient_reports(doctor_name);
@@ -214,10 +302,8 @@ SELECT
     pr.download_count,
     pr.pdf_downloaded_at,
     CASE 
-        WHEN pr.pathologies::text != '[]' THEN 
-            array_length(
-                ARRAY(SELECT json_array_elements_text(pr.pathologies)), 1
-            )
+        WHEN jsonb_typeof(pr.pathologies) = 'array' THEN 
+            jsonb_array_length(pr.pathologies)
         ELSE 0 
     END as pathology_count
 FROM patient_reports pr
@@ -238,6 +324,14 @@ FROM dicom_analyses
 GROUP BY DATE_TRUNC('day', created_at)
 ORDER BY analysis_date DESC;
 
+-- Approximate row count from planner statistics (O(1), used by the dashboard)
+CREATE OR REPLACE FUNCTION approx_count(tbl TEXT)
+RETURNS BIGINT AS $$
+    SELECT GREATEST(reltuples, 0)::BIGINT
+    FROM pg_class
+    WHERE oid = to_regclass(tbl);
+$$ LANGUAGE sql STABLE;
+
 -- Function to automatically update the updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
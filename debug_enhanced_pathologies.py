@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Debug script to run enhanced pathology detection on a sample brain study
+"""
+
+from enhanced_pathology_detector import detect_enhanced_pathologies
+
+def test_enhanced_detection():
+    """Test the enhanced detection system"""
+    
+    # Test with brain/pituitary study
+    class MockMetadata:
+        def __init__(self):
+            self.body_part_examined = 'head'
+            self.study_description = 'MRI Brain with contrast'
+            self.series_description = 'T1 Post Gd'
+    
+    test_features = {
+        'brightness': 145,
+        'contrast': 55,
+        'edge_density': 0.07,
+        'texture_std': 35
+    }
+    
+    metadata = MockMetadata()
+    results = detect_enhanced_pathologies(test_features, metadata)
+    
+    print("🔍 ENHANCED PATHOLOGY DETECTION TEST")
+    print("=" * 50)
+    print(f"✅ Pathologies detected: {len(results.pathologies)}")
+    
+    for i, pathology in enumerate(results.pathologies, 1):
+        print(f"{i}. {pathology}")
+    
+    print("\n📏 Measurements:")
+    for key, value in results.measurements.items():
+        print(f"  • {key}: {value}")
+    
+    print("\n📍 Locations:")
+    for key, value in results.locations.items():
+        print(f"  • {key}: {value}")
+
+
+if __name__ == "__main__":
+    test_enhanced_detection()
@@ -1,26 +1,79 @@
 import os
+import asyncio
 import base64
-import io
-import json
+import hashlib
 import logging
-from typing import Dict, List, Optional, Tuple, Any
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Any, Union, FrozenSet
 from dataclasses import dataclass
 from datetime import datetime
 
 import pydicom
 import numpy as np
+import orjson
+try:
+    from pydicom.pixels.processing import apply_voi_lut
+except ImportError:  # pydicom < 3.0
+    from pydicom.pixel_data_handlers.util import apply_voi_lut
 from PIL import Image
 import cv2
-import openai
+import httpx
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 
+# libjpeg-turbo bindings for faster JPEG encoding (optional)
+try:
+    from turbojpeg import TurboJPEG, TJPF_GRAY, TJPF_RGB, TJSAMP_GRAY, TJSAMP_420
+    TURBOJPEG_AVAILABLE = True
+except ImportError:
+    TURBOJPEG_AVAILABLE = False
+    logging.warning("PyTurboJPEG not available, using OpenCV JPEG encoding")
+
+# Persistent on-disk cache for OpenAI responses (optional)
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+    logging.warning("diskcache not available, OpenAI responses will not be cached")
+
+# Numba JIT for the pixel windowing kernel (optional)
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    logging.warning("Numba not available, using NumPy pixel windowing")
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _window_to_u8(arr, lo, hi, out):
+        """Clip a flat array to [lo, hi] and rescale it into a flat uint8 buffer in one pass"""
+        scale = 255.0 / (hi - lo)
+        for i in prange(arr.size):
+            v = arr[i]
+            if v < lo:
+                v = lo
+            elif v > hi:
+                v = hi
+            out[i] = np.uint8((v - lo) * scale)
+
 # Load environment variables
 load_dotenv()
 
+# Keep-alive pool shared by concurrent OpenAI requests (HTTP/2 multiplexed)
+OPENAI_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def _intern_terms(terms: List[Any]) -> List[Any]:
+    """Intern repeated short terms (body parts, landmarks, pathologies) shared across many results"""
+    return [sys.intern(term) if type(term) is str else term for term in terms]
+
 @dataclass
 class BodyPartAnalysis:
     """Data class for body part analysis results"""
@@ -52,40 +105,100 @@ class DICOMAnalyzer:
     Advanced DICOM analyzer using OpenAI for accurate body part detection and analysis
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    # How long cached OpenAI analyses stay valid
+    CACHE_EXPIRE_SECONDS = 7 * 24 * 3600
+    
+    # System prompt for medical image analysis; kept constant so the
+    # prompt prefix is identical across requests
+    _SYSTEM_PROMPT = """You are an expert medical imaging AI assistant specializing in DICOM image analysis. 
+        Your task is to accurately identify and analyze medical images with the following requirements:
+        
+        1. **Body Part Identification**: Precisely identify the anatomical body part(s) shown in the image
+        2. **Anatomical Landmarks**: Identify key anatomical structures and landmarks visible
+        3. **Pathology Detection**: Look for any visible pathologies, abnormalities, or concerning findings
+        4. **Image Quality Assessment**: Evaluate image quality, positioning, and technical factors
+        5. **Clinical Context**: Provide clinical insights based on the imaging modality and findings
+        
+        IMPORTANT: Be extremely accurate in body part identification. Common body parts include:
+        - Head/Brain, Neck, Chest, Abdomen, Pelvis, Spine, Extremities (arms/legs)
+        - Specific regions: Thorax, Lumbar spine, Cervical spine, etc.
+        
+        Provide your analysis in the following JSON format:
+        {
+            "body_part": "specific anatomical region",
+            "confidence": 0.95,
+            "anatomical_landmarks": ["landmark1", "landmark2"],
+            "pathologies": ["pathology1", "pathology2"],
+            "image_quality": "assessment",
+            "clinical_insights": "insights",
+            "recommendations": ["rec1", "rec2"]
+        }
+        """
+    
+    # Shared libjpeg-turbo encoder, created by the first analyzer
+    _jpeg_encoder = None
+    
+    # Elements larger than this are read from disk only when accessed
+    DEFER_SIZE = '2 KB'
+    
+    # Longest image side sent to OpenAI (larger images are downscaled by the API anyway)
+    MAX_IMAGE_SIZE = 1024
+    
+    # Part of cached JPEG names; bump when convert_to_image or encode_jpeg output changes
+    IMAGE_CACHE_VERSION = 1
+    
+    def __init__(self, api_key: Optional[str] = None, cache_dir: Optional[str] = '.openai_cache',
+                 cache_converted_images: bool = False):
         """
         Initialize the DICOM analyzer with OpenAI client
         
         Args:
             api_key: OpenAI API key (if not provided, will use environment variable)
+            cache_dir: Directory for the OpenAI response cache (None disables caching)
+            cache_converted_images: Keep the encoded JPEG next to each .dcm for re-runs
+                (only for folders the caller owns; the files are never cleaned up)
         """
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
         if not self.api_key:
             raise ValueError("OpenAI API key is required. Set OPENAI_API_KEY environment variable or pass it to constructor.")
         
-        # Initialize OpenAI client with legacy API format
+        # Initialize OpenAI client with a persistent HTTP/2 connection pool
         try:
-            import openai
-            openai.api_key = self.api_key
-            self.client = openai
-            logger.info("Using legacy OpenAI client (v0.28.1)")
+            self.client = OpenAI(
+                api_key=self.api_key,
+                http_client=httpx.Client(http2=True, limits=OPENAI_HTTP_LIMITS)
+            )
         except Exception as e:
             logger.error(f"Failed to initialize OpenAI client: {e}")
             raise ValueError("Could not initialize OpenAI client")
-        self.supported_modalities = ['CT', 'MR', 'XR', 'US', 'CR', 'DR', 'NM', 'PT']
+        self.supported_modalities = frozenset({'CT', 'MR', 'XR', 'US', 'CR', 'DR', 'NM', 'PT'})
+        
+        self.cache_converted_images = cache_converted_images
+        self.cache = diskcache.Cache(cache_dir) if DISKCACHE_AVAILABLE and cache_dir else None
         
-    def load_dicom(self, file_path: str) -> pydicom.Dataset:
+        # One TurboJPEG instance (it loads libjpeg-turbo) shared by all analyzers
+        if TURBOJPEG_AVAILABLE and DICOMAnalyzer._jpeg_encoder is None:
+            try:
+                DICOMAnalyzer._jpeg_encoder = TurboJPEG()
+            except Exception as e:
+                logger.warning(f"Could not load libjpeg-turbo, using OpenCV JPEG encoding: {e}")
+        self.jpeg_encoder = DICOMAnalyzer._jpeg_encoder
+        
+    def load_dicom(self, file_path: str, stop_before_pixels: bool = False) -> pydicom.Dataset:
         """
         Load and validate DICOM file
         
         Args:
             file_path: Path to DICOM file
+            stop_before_pixels: Skip reading pixel data (metadata only)
             
         Returns:
-            pydicom.Dataset: Loaded DICOM dataset
+            pydicom.Dataset: Loaded DICOM dataset; large elements such as
+            PixelData are deferred until first access (e.g. pixel_array)
         """
         try:
-            dataset = pydicom.dcmread(file_path)
+            dataset = pydicom.dcmread(file_path, stop_before_pixels=stop_before_pixels,
+                                      defer_size=self.DEFER_SIZE)
             
             # Validate essential DICOM tags
             required_tags = ['Modality', 'PatientName', 'PatientID']
@@ -100,6 +213,27 @@ class DICOMAnalyzer:
             logger.error(f"Error loading DICOM file: {e}")
             raise
     
+    def load_dicom_batch(self, file_paths: List[str],
+                         max_workers: Optional[int] = None) -> List[Optional[pydicom.Dataset]]:
+        """
+        Load several DICOM files in parallel threads
+        
+        Args:
+            file_paths: Paths to DICOM files
+            max_workers: Thread count (defaults to the CPU count)
+            
+        Returns:
+            List: Loaded datasets in input order (None for files that failed to load)
+        """
+        def load(file_path):
+            try:
+                return self.load_dicom(file_path)
+            except Exception:
+                return None
+        
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            return list(executor.map(load, file_paths))
+    
     def extract_metadata(self, dataset: pydicom.Dataset) -> DICOMMetadata:
         """
         Extract comprehensive metadata from DICOM dataset
@@ -151,196 +285,359 @@ class DICOMAnalyzer:
             logger.error(f"Error extracting metadata: {e}")
             raise
     
-    def convert_to_image(self, dataset: pydicom.Dataset) -> Image.Image:
+    def convert_to_image(self, dataset: pydicom.Dataset) -> np.ndarray:
         """
-        Convert DICOM pixel data to PIL Image with proper windowing
+        Convert DICOM pixel data to an 8-bit grayscale array with proper windowing
         
         Args:
             dataset: pydicom.Dataset object
             
         Returns:
-            PIL.Image: Converted image
+            np.ndarray: Converted uint8 image
         """
         try:
-            # Get pixel data
-            pixel_array = dataset.pixel_array
-            
-            # Apply window/level if available
-            if hasattr(dataset, 'WindowCenter') and hasattr(dataset, 'WindowWidth'):
-                window_center = dataset.WindowCenter
-                window_width = dataset.WindowWidth
-                
-                # Handle multiple window settings
-                if isinstance(window_center, pydicom.multival.MultiValue):
-                    window_center = window_center[0]
-                if isinstance(window_width, pydicom.multival.MultiValue):
-                    window_width = window_width[0]
-                
-                # Apply windowing
-                min_val = window_center - window_width // 2
-                max_val = window_center + window_width // 2
-                pixel_array = np.clip(pixel_array, min_val, max_val)
+            # Apply the VOI LUT sequence or first window/level, if present
+            pixel_array = apply_voi_lut(dataset.pixel_array, dataset)
+            
+            # Downscale early so every later pass touches fewer pixels
+            if pixel_array.ndim == 2:
+                height, width = pixel_array.shape
+                scale = self.MAX_IMAGE_SIZE / max(height, width)
+                if scale < 1:
+                    if pixel_array.dtype.kind != 'f':
+                        pixel_array = pixel_array.astype(np.float32)
+                    new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+                    pixel_array = cv2.resize(pixel_array, new_size, interpolation=cv2.INTER_AREA)
+            
+            amin, amax = pixel_array.min(), pixel_array.max()
+            
+            # Fused single-pass windowing into a preallocated uint8 buffer
+            if NUMBA_AVAILABLE and amax > 0 and amax > amin:
+                out = np.empty(pixel_array.shape, np.uint8)
+                _window_to_u8(np.ascontiguousarray(pixel_array).ravel(),
+                              float(amin), float(amax), out.ravel())
+                return out
+            
+            # Use a single float working buffer; all further arithmetic is
+            # done in place to avoid full-size temporaries
+            if pixel_array.dtype.kind != 'f':
+                pixel_array = pixel_array.astype(np.float32)
             
             # Normalize to 0-255 range
-            if pixel_array.max() > 0:
-                pixel_array = ((pixel_array - pixel_array.min()) / 
-                             (pixel_array.max() - pixel_array.min()) * 255).astype(np.uint8)
-            
-            # Convert to PIL Image
-            image = Image.fromarray(pixel_array)
-            
-            # Apply LUT if available
-            if hasattr(dataset, 'VOILUTSequence'):
-                # Apply VOI LUT transformation
-                pass  # Complex LUT application would go here
+            if amax > 0 and amax > amin:
+                np.subtract(pixel_array, amin, out=pixel_array)
+                np.multiply(pixel_array, 255.0 / (amax - amin), out=pixel_array)
             
-            return image
+            return pixel_array.astype(np.uint8)
             
         except Exception as e:
             logger.error(f"Error converting DICOM to image: {e}")
             raise
     
-    def encode_image_for_openai(self, image: Image.Image) -> str:
+    def encode_image_for_openai(self, image: Union[np.ndarray, Image.Image]) -> str:
         """
-        Encode PIL image to base64 string for OpenAI API
+        Encode image to base64 JPEG string for OpenAI API
         
         Args:
-            image: PIL Image object
+            image: uint8 array (grayscale or RGB) or PIL Image
             
         Returns:
             str: Base64 encoded image
         """
-        try:
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Resize if too large (OpenAI has size limits)
-            max_size = 1024
-            if max(image.size) > max_size:
-                image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-            
-            # Convert to base64
-            buffer = io.BytesIO()
-            image.save(buffer, format='JPEG', quality=85)
-            img_str = base64.b64encode(buffer.getvalue()).decode()
+        return base64.b64encode(self.encode_jpeg(image)).decode('ascii')
+    
+    def encode_jpeg(self, image: Union[np.ndarray, Image.Image]) -> Union[bytes, memoryview]:
+        """
+        Resize and encode image as JPEG for OpenAI API
+        
+        Args:
+            image: uint8 array (grayscale or RGB) or PIL Image
             
-            return img_str
+        Returns:
+            bytes or memoryview: JPEG data (bytes-like, no extra copy)
+        """
+        try:
+            # Work on the numpy array; grayscale stays single-channel
+            if isinstance(image, Image.Image):
+                if image.mode not in ('L', 'RGB'):
+                    image = image.convert('RGB')
+                pixels = np.asarray(image)
+            else:
+                pixels = image
+            
+            # Resize if too large (OpenAI has size limits); images from
+            # convert_to_image are already within bounds
+            max_size = self.MAX_IMAGE_SIZE
+            height, width = pixels.shape[:2]
+            if max(height, width) > max_size:
+                scale = max_size / max(height, width)
+                new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+                pixels = cv2.resize(pixels, new_size, interpolation=cv2.INTER_LANCZOS4)
+            
+            # Encode JPEG with libjpeg-turbo, falling back to OpenCV
+            if self.jpeg_encoder is not None:
+                if pixels.ndim == 2:
+                    jpeg_bytes = self.jpeg_encoder.encode(
+                        np.ascontiguousarray(pixels), quality=85,
+                        pixel_format=TJPF_GRAY, jpeg_subsample=TJSAMP_GRAY)
+                else:
+                    jpeg_bytes = self.jpeg_encoder.encode(
+                        np.ascontiguousarray(pixels), quality=85,
+                        pixel_format=TJPF_RGB, jpeg_subsample=TJSAMP_420)
+            else:
+                if pixels.ndim == 3:
+                    pixels = cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+                success, buffer = cv2.imencode('.jpg', pixels, [cv2.IMWRITE_JPEG_QUALITY, 85])
+                if not success:
+                    raise ValueError("JPEG encoding failed")
+                # Zero-copy view over the encoder's buffer
+                jpeg_bytes = buffer.data
+            
+            return jpeg_bytes
             
         except Exception as e:
             logger.error(f"Error encoding image: {e}")
             raise
     
-    def analyze_with_openai(self, image_base64: str, metadata: DICOMMetadata) -> Dict[str, Any]:
+    def _build_messages(self, image_base64: str, metadata: DICOMMetadata) -> List[Dict[str, Any]]:
         """
-        Analyze DICOM image using OpenAI Vision API for accurate body part detection
+        Build the chat messages for OpenAI Vision analysis
         
         Args:
             image_base64: Base64 encoded image
             metadata: DICOM metadata
             
         Returns:
-            Dict: Analysis results from OpenAI
+            List[Dict]: Chat completion messages
         """
-        try:
-            # Create comprehensive prompt for medical image analysis
-            system_prompt = """You are an expert medical imaging AI assistant specializing in DICOM image analysis. 
-            Your task is to accurately identify and analyze medical images with the following requirements:
-            
-            1. **Body Part Identification**: Precisely identify the anatomical body part(s) shown in the image
-            2. **Anatomical Landmarks**: Identify key anatomical structures and landmarks visible
-            3. **Pathology Detection**: Look for any visible pathologies, abnormalities, or concerning findings
-            4. **Image Quality Assessment**: Evaluate image quality, positioning, and technical factors
-            5. **Clinical Context**: Provide clinical insights based on the imaging modality and findings
-            
-            IMPORTANT: Be extremely accurate in body part identification. Common body parts include:
-            - Head/Brain, Neck, Chest, Abdomen, Pelvis, Spine, Extremities (arms/legs)
-            - Specific regions: Thorax, Lumbar spine, Cervical spine, etc.
-            
-            Provide your analysis in the following JSON format:
+        user_prompt = f"""Analyze this medical image with the following DICOM metadata:
+        
+        Modality: {metadata.modality}
+        Body Part Examined: {metadata.body_part_examined}
+        Study Description: {metadata.study_description}
+        Series Description: {metadata.series_description}
+        Image Size: {metadata.image_size}
+        
+        Please provide a comprehensive analysis focusing on accurate body part identification and any clinical findings."""
+        
+        return [
+            {"role": "system", "content": self._SYSTEM_PROMPT},
             {
-                "body_part": "specific anatomical region",
-                "confidence": 0.95,
-                "anatomical_landmarks": ["landmark1", "landmark2"],
-                "pathologies": ["pathology1", "pathology2"],
-                "image_quality": "assessment",
-                "clinical_insights": "insights",
-                "recommendations": ["rec1", "rec2"]
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": user_prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{image_base64}"
+                        }
+                    }
+                ]
             }
-            """
-            
-            user_prompt = f"""Analyze this medical image with the following DICOM metadata:
-            
-            Modality: {metadata.modality}
-            Body Part Examined: {metadata.body_part_examined}
-            Study Description: {metadata.study_description}
-            Series Description: {metadata.series_description}
-            Image Size: {metadata.image_size}
+        ]
+    
+    def _parse_openai_content(self, content: str) -> Optional[Dict[str, Any]]:
+        """
+        Parse the JSON analysis out of an OpenAI response
+        
+        Args:
+            content: Response message content
             
-            Please provide a comprehensive analysis focusing on accurate body part identification and any clinical findings."""
+        Returns:
+            Dict: Parsed analysis results, or None if the response has no valid JSON
+        """
+        # Requests use JSON mode, so the whole body is the JSON object
+        try:
+            result = orjson.loads(content or '')
+        except orjson.JSONDecodeError:
+            logger.warning("Could not parse JSON from OpenAI response, using fallback")
+            return None
+        return result if isinstance(result, dict) else None
+    
+    def _fallback_result(self, content: str) -> Dict[str, Any]:
+        """Create a structured response from unparseable OpenAI text"""
+        return {
+            "body_part": "Unknown",
+            "confidence": 0.0,
+            "anatomical_landmarks": [],
+            "pathologies": [],
+            "image_quality": "Unable to assess",
+            "clinical_insights": content,
+            "recommendations": []
+        }
+    
+    def _cache_key(self, image_base64: str, metadata: DICOMMetadata) -> str:
+        """Cache key covering the image and every metadata field sent in the prompt"""
+        digest = hashlib.sha256(image_base64.encode())
+        for value in (metadata.modality, metadata.body_part_examined, metadata.study_description,
+                      metadata.series_description, metadata.image_size):
+            digest.update(b'\0' + str(value).encode())
+        return digest.hexdigest()
+    
+    def _finish_analysis(self, content: str, cache_key: str) -> Dict[str, Any]:
+        """Parse an OpenAI response, caching it only when it parsed cleanly"""
+        analysis_result = self._parse_openai_content(content)
+        if analysis_result is None:
+            return self._fallback_result(content)
+        
+        if self.cache is not None:
+            self.cache.set(cache_key, analysis_result, expire=self.CACHE_EXPIRE_SECONDS)
+        return analysis_result
+    
+    def analyze_with_openai(self, image_base64: str, metadata: DICOMMetadata) -> Dict[str, Any]:
+        """
+        Analyze DICOM image using OpenAI Vision API for accurate body part detection
+        
+        Args:
+            image_base64: Base64 encoded image
+            metadata: DICOM metadata
             
-            # Use legacy OpenAI client API
-            response = self.client.ChatCompletion.create(
+        Returns:
+            Dict: Analysis results from OpenAI
+        """
+        try:
+            # Identical images with identical metadata get the cached analysis
+            cache_key = self._cache_key(image_base64, metadata)
+            if self.cache is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Using cached OpenAI analysis")
+                    return cached
+            
+            response = self.client.chat.completions.create(
                 model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": user_prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
-                                }
-                            }
-                        ]
-                    }
-                ],
+                messages=self._build_messages(image_base64, metadata),
                 max_tokens=1000,
-                temperature=0.1
+                temperature=0.1,
+                response_format={"type": "json_object"}
             )
-            content = response.choices[0].message.content
+            return self._finish_analysis(response.choices[0].message.content, cache_key)
             
-            # Parse the response
+        except Exception as e:
+            logger.error(f"Error in OpenAI analysis: {e}")
+            raise
+    
+    def _async_client(self) -> AsyncOpenAI:
+        """Create an async OpenAI client; it is bound to the running event loop"""
+        return AsyncOpenAI(
+            api_key=self.api_key,
+            http_client=httpx.AsyncClient(http2=True, limits=OPENAI_HTTP_LIMITS)
+        )
+    
+    async def analyze_with_openai_async(self, image_base64: str, metadata: DICOMMetadata,
+                                        client: Optional[AsyncOpenAI] = None) -> Dict[str, Any]:
+        """
+        Async variant of analyze_with_openai
+        
+        Args:
+            image_base64: Base64 encoded image
+            metadata: DICOM metadata
+            client: Async OpenAI client to reuse (a temporary one is created if omitted)
             
-            # Try to extract JSON from response
-            try:
-                # Look for JSON in the response
-                start_idx = content.find('{')
-                end_idx = content.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_str = content[start_idx:end_idx]
-                    analysis_result = json.loads(json_str)
-                else:
-                    # Fallback: create structured response from text
-                    analysis_result = {
-                        "body_part": "Unknown",
-                        "confidence": 0.0,
-                        "anatomical_landmarks": [],
-                        "pathologies": [],
-                        "image_quality": "Unable to assess",
-                        "clinical_insights": content,
-                        "recommendations": []
-                    }
-            except json.JSONDecodeError:
-                logger.warning("Could not parse JSON from OpenAI response, using fallback")
-                analysis_result = {
-                    "body_part": "Unknown",
-                    "confidence": 0.0,
-                    "anatomical_landmarks": [],
-                    "pathologies": [],
-                    "image_quality": "Unable to assess",
-                    "clinical_insights": content,
-                    "recommendations": []
-                }
-            
-            return analysis_result
+        Returns:
+            Dict: Analysis results from OpenAI
+        """
+        try:
+            cache_key = self._cache_key(image_base64, metadata)
+            if self.cache is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Using cached OpenAI analysis")
+                    return cached
+            
+            if client is None:
+                async with self._async_client() as client:
+                    return await self.analyze_with_openai_async(image_base64, metadata, client)
+            
+            response = await client.chat.completions.create(
+                model="gpt-4o",
+                messages=self._build_messages(image_base64, metadata),
+                max_tokens=1000,
+                temperature=0.1,
+                response_format={"type": "json_object"}
+            )
+            return self._finish_analysis(response.choices[0].message.content, cache_key)
             
         except Exception as e:
             logger.error(f"Error in OpenAI analysis: {e}")
             raise
     
+    def _prepare_dicom_file(self, file_path: str) -> Tuple[DICOMMetadata, str]:
+        """
+        Load a DICOM file and prepare its image for OpenAI
+        
+        Args:
+            file_path: Path to DICOM file
+            
+        Returns:
+            Tuple: (metadata, base64 encoded image)
+        """
+        # A JPEG cached by a previous run lets us skip pixel decoding entirely
+        cache_path = self._converted_image_path(file_path)
+        use_cached = (self.cache_converted_images and os.path.exists(cache_path)
+                      and os.path.getmtime(cache_path) > os.path.getmtime(file_path))
+        
+        # Load DICOM file
+        dataset = self.load_dicom(file_path, stop_before_pixels=use_cached)
+        
+        # Extract metadata
+        metadata = self.extract_metadata(dataset)
+        logger.info(f"Extracted metadata for modality: {metadata.modality}")
+        
+        if use_cached:
+            logger.info(f"Using cached image: {cache_path}")
+            with open(cache_path, 'rb') as f:
+                return metadata, base64.b64encode(f.read()).decode('ascii')
+        
+        # Convert to image
+        image = self.convert_to_image(dataset)
+        logger.info(f"Converted DICOM to image: {image.shape[1::-1]}")
+        
+        # Release the dataset and its cached pixel array before encoding
+        del dataset
+        
+        # Encode for OpenAI
+        jpeg_bytes = self.encode_jpeg(image)
+        if self.cache_converted_images:
+            try:
+                with open(cache_path, 'wb') as f:
+                    f.write(jpeg_bytes)
+            except OSError as e:
+                logger.warning(f"Could not cache converted image {cache_path}: {e}")
+        
+        return metadata, base64.b64encode(jpeg_bytes).decode('ascii')
+    
+    def _converted_image_path(self, file_path: str) -> str:
+        """Path of the cached JPEG for a DICOM file, stamped with the conversion version and size"""
+        return f"{file_path}.v{self.IMAGE_CACHE_VERSION}-{self.MAX_IMAGE_SIZE}.jpg"
+    
+    def _build_analysis(self, openai_result: Dict[str, Any], metadata: DICOMMetadata) -> BodyPartAnalysis:
+        """
+        Combine OpenAI results and DICOM metadata into a BodyPartAnalysis
+        
+        Args:
+            openai_result: Parsed OpenAI analysis
+            metadata: DICOM metadata
+            
+        Returns:
+            BodyPartAnalysis: Complete analysis results
+        """
+        body_part = openai_result.get('body_part', 'Unknown')
+        return BodyPartAnalysis(
+            body_part=sys.intern(body_part) if type(body_part) is str else body_part,
+            confidence=openai_result.get('confidence', 0.0),
+            anatomical_landmarks=_intern_terms(openai_result.get('anatomical_landmarks', [])),
+            pathologies=_intern_terms(openai_result.get('pathologies', [])),
+            recommendations=openai_result.get('recommendations', []),
+            modality=sys.intern(metadata.modality),
+            study_description=metadata.study_description,
+            patient_info={
+                'name': metadata.patient_name,
+                'id': metadata.patient_id,
+                'study_date': metadata.study_date
+            }
+        )
+    
     def analyze_dicom_file(self, file_path: str) -> BodyPartAnalysis:
         """
         Complete DICOM analysis pipeline
@@ -354,39 +651,14 @@ class DICOMAnalyzer:
         try:
             logger.info(f"Starting analysis of DICOM file: {file_path}")
             
-            # Load DICOM file
-            dataset = self.load_dicom(file_path)
-            
-            # Extract metadata
-            metadata = self.extract_metadata(dataset)
-            logger.info(f"Extracted metadata for modality: {metadata.modality}")
-            
-            # Convert to image
-            image = self.convert_to_image(dataset)
-            logger.info(f"Converted DICOM to image: {image.size}")
-            
-            # Encode for OpenAI
-            image_base64 = self.encode_image_for_openai(image)
+            metadata, image_base64 = self._prepare_dicom_file(file_path)
             
             # Analyze with OpenAI
             openai_result = self.analyze_with_openai(image_base64, metadata)
-            logger.info(f"OpenAI analysis completed")
+            logger.info("OpenAI analysis completed")
             
             # Create comprehensive analysis result
-            analysis = BodyPartAnalysis(
-                body_part=openai_result.get('body_part', 'Unknown'),
-                confidence=openai_result.get('confidence', 0.0),
-                anatomical_landmarks=openai_result.get('anatomical_landmarks', []),
-                pathologies=openai_result.get('pathologies', []),
-                recommendations=openai_result.get('recommendations', []),
-                modality=metadata.modality,
-                study_description=metadata.study_description,
-                patient_info={
-                    'name': metadata.patient_name,
-                    'id': metadata.patient_id,
-                    'study_date': metadata.study_date
-                }
-            )
+            analysis = self._build_analysis(openai_result, metadata)
             
             logger.info(f"Analysis completed successfully for body part: {analysis.body_part}")
             return analysis
@@ -395,6 +667,53 @@ class DICOMAnalyzer:
             logger.error(f"Error in DICOM analysis pipeline: {e}")
             raise
     
+    async def _analyze_one(self, file_path: str, client: AsyncOpenAI) -> Optional[BodyPartAnalysis]:
+        """Analyze one DICOM file, running decode/encode off the event loop"""
+        try:
+            metadata, image_base64 = await asyncio.to_thread(
+                self._prepare_dicom_file, file_path)
+            openai_result = await self.analyze_with_openai_async(image_base64, metadata, client)
+            return self._build_analysis(openai_result, metadata)
+        except Exception as e:
+            logger.error(f"Error analyzing {file_path}: {e}")
+            return None
+    
+    async def analyze_folder_async(self, file_paths: List[str],
+                                   max_concurrency: int = 16) -> List[Optional[BodyPartAnalysis]]:
+        """
+        Analyze many DICOM files concurrently
+        
+        Args:
+            file_paths: Paths to DICOM files
+            max_concurrency: Maximum number of files in flight at once
+            
+        Returns:
+            List: Analysis results in input order (None for failed files)
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        # One pooled client for the whole batch
+        async with self._async_client() as client:
+            async def bounded(file_path):
+                async with semaphore:
+                    return await self._analyze_one(file_path, client)
+            
+            return await asyncio.gather(*[bounded(path) for path in file_paths])
+    
+    def analyze_folder(self, file_paths: List[str],
+                       max_concurrency: int = 16) -> List[Optional[BodyPartAnalysis]]:
+        """
+        Synchronous wrapper around analyze_folder_async
+        
+        Args:
+            file_paths: Paths to DICOM files
+            max_concurrency: Maximum number of files in flight at once
+            
+        Returns:
+            List: Analysis results in input order (None for failed files)
+        """
+        return asyncio.run(self.analyze_folder_async(file_paths, max_concurrency))
+    
     def validate_dicom_file(self, file_path: str) -> bool:
         """
         Validate if file is a valid DICOM file
@@ -406,16 +725,18 @@ class DICOMAnalyzer:
             bool: True if valid DICOM file
         """
         try:
-            dataset = pydicom.dcmread(file_path)
-            return hasattr(dataset, 'Modality')
+            # Parse only the Modality element; skip the pixel data
+            dataset = pydicom.dcmread(file_path, stop_before_pixels=True,
+                                      specific_tags=['Modality'])
+            return 'Modality' in dataset
         except:
             return False
     
-    def get_supported_modalities(self) -> List[str]:
+    def get_supported_modalities(self) -> FrozenSet[str]:
         """
-        Get list of supported imaging modalities
+        Get set of supported imaging modalities
         
         Returns:
-            List[str]: Supported modalities
+            FrozenSet[str]: Supported modalities (immutable, shared)
         """
-        return self.supported_modalities.copy()
+        return self.supported_modalities
@@ -6,6 +6,13 @@ Comprehensive analysis of pelvis 2 folder with comparison to doctor's report
 from pelvis_test_analyzer import PelvisTestAnalyzer
 import json
 import os
+import re
+
+import pandas as pd
+
+# Fistula and perianal/anal terms, matched as substrings
+FISTULA_TERMS = re.compile(r'fistula', re.IGNORECASE)
+PERIANAL_TERMS = re.compile(r'perianal|anal|rectal', re.IGNORECASE)
 
 def main():
     # Initialize analyzer
@@ -57,40 +64,36 @@ def main():
     print("🔬 DETAILED SERIES ANALYSIS:")
     series_analysis = results.get('series_analysis', {})
     
+    # Flatten series findings once into a single frame
+    series_findings = pd.DataFrame(
+        [{'series': series_name, 'kind': kind, 'text': str(text)}
+         for series_name, series_data in series_analysis.items()
+         for kind, key in (('pathology', 'pathologies'), ('landmark', 'anatomical_landmarks'))
+         for text in series_data.get(key, [])],
+        columns=['series', 'kind', 'text'])
+    
     # Count series with different findings
-    series_with_pathologies = 0
-    series_with_landmarks = 0
+    series_per_kind = series_findings.groupby('kind')['series'].nunique()
+    series_with_pathologies = int(series_per_kind.get('pathology', 0))
+    series_with_landmarks = int(series_per_kind.get('landmark', 0))
     total_series = len(series_analysis)
     
-    for series_name, series_data in series_analysis.items():
-        pathologies = series_data.get('pathologies', [])
-        landmarks = series_data.get('anatomical_landmarks', [])
-        
-        if pathologies:
-            series_with_pathologies += 1
-        if landmarks:
-            series_with_landmarks += 1
-    
     print(f"   Total Series: {total_series}")
     print(f"   Series with Pathologies: {series_with_pathologies}")
     print(f"   Series with Landmarks: {series_with_landmarks}")
     
     # Show first few series with findings
     print(f"\n📋 SAMPLE SERIES WITH FINDINGS:")
-    count = 0
-    for series_name, series_data in series_analysis.items():
-        if count >= 5:  # Show first 5
-            break
+    for series_name in series_findings['series'].unique()[:5]:  # Show first 5
+        series_data = series_analysis[series_name]
         pathologies = series_data.get('pathologies', [])
         landmarks = series_data.get('anatomical_landmarks', [])
         
-        if pathologies or landmarks:
-            print(f"   📊 {series_name}:")
-            if pathologies:
-                print(f"      Pathologies: {pathologies}")
-            if landmarks:
-                print(f"      Landmarks: {landmarks[:5]}...")  # Show first 5 landmarks
-            count += 1
+        print(f"   📊 {series_name}:")
+        if pathologies:
+            print(f"      Pathologies: {pathologies}")
+        if landmarks:
+            print(f"      Landmarks: {landmarks[:5]}...")  # Show first 5 landmarks
     
     print("\n" + "-"*100)
     
@@ -103,21 +106,22 @@ def main():
     fistula_location = ""
     perianal_detected = False
     
-    # Search through all findings for fistula-related content
-    for category, findings in pathology_summary.items():
-        if isinstance(findings, list):
-            for finding in findings:
-                if 'fistula' in str(finding).lower():
-                    fistula_found = True
-                    print(f"   ✅ Fistula-related finding detected: {finding}")
-    
-    # Check for perianal/anal findings
-    for category, findings in pathology_summary.items():
-        if isinstance(findings, list):
-            for finding in findings:
-                if any(term in str(finding).lower() for term in ['perianal', 'anal', 'rectal']):
-                    perianal_detected = True
-                    print(f"   ✅ Perianal/anal finding detected: {finding}")
+    # Vectorized search of all findings for fistula and perianal/anal content
+    all_findings = pd.Series(
+        [str(finding)
+         for findings in pathology_summary.values() if isinstance(findings, list)
+         for finding in findings],
+        dtype=object)
+    fistula_findings = all_findings[all_findings.str.contains(FISTULA_TERMS)]
+    perianal_findings = all_findings[all_findings.str.contains(PERIANAL_TERMS)]
+    
+    for finding in fistula_findings:
+        fistula_found = True
+        print(f"   ✅ Fistula-related finding detected: {finding}")
+    
+    for finding in perianal_findings:
+        perianal_detected = True
+        print(f"   ✅ Perianal/anal finding detected: {finding}")
     
     # Check measurements
     measurements = results.get('measurements', {})
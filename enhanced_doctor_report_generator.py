@@ -21,44 +21,51 @@ logger = logging.getLogger(__name__)
 class EnhancedDoctorReportGenerator:
     """Generates medical reports that match real radiologist quality"""
     
-    def __init__(self):
-        self.anatomical_structures = {
-            'pelvis': {
-                'bony_structures': ['sacrum', 'coccyx', 'ilium', 'ischium', 'pubis', 'acetabulum', 'femoral_head'],
-                'soft_tissues': ['uterus', 'ovaries', 'bladder', 'rectum', 'sigmoid', 'small_bowel'],
-                'vessels': ['iliac_arteries', 'iliac_veins', 'femoral_vessels', 'internal_pudendal_vessels'],
-                'muscles': ['gluteus_maximus', 'gluteus_medius', 'piriformis', 'obturator_internus', 'psoas_major']
-            },
-            'brain': {
-                'bony_structures': ['skull', 'sella_turcica', 'clivus', 'petrous_bone'],
-                'brain_structures': ['cerebrum', 'cerebellum', 'brainstem', 'pituitary_gland', 'ventricles'],
-                'vessels': ['carotid_arteries', 'vertebral_arteries', 'circle_of_willis', 'venous_sinuses'],
-                'meninges': ['dura_mater', 'arachnoid_mater', 'pia_mater']
-            }
+    # Reference data shared by all instances; treat as read-only
+    anatomical_structures = {
+        'pelvis': {
+            'bony_structures': ['sacrum', 'coccyx', 'ilium', 'ischium', 'pubis', 'acetabulum', 'femoral_head'],
+            'soft_tissues': ['uterus', 'ovaries', 'bladder', 'rectum', 'sigmoid', 'small_bowel'],
+            'vessels': ['iliac_arteries', 'iliac_veins', 'femoral_vessels', 'internal_pudendal_vessels'],
+            'muscles': ['gluteus_maximus', 'gluteus_medius', 'piriformis', 'obturator_internus', 'psoas_major']
+        },
+        'brain': {
+            'bony_structures': ['skull', 'sella_turcica', 'clivus', 'petrous_bone'],
+            'brain_structures': ['cerebrum', 'cerebellum', 'brainstem', 'pituitary_gland', 'ventricles'],
+            'vessels': ['carotid_arteries', 'vertebral_arteries', 'circle_of_willis', 'venous_sinuses'],
+            'meninges': ['dura_mater', 'arachnoid_mater', 'pia_mater']
         }
-        
-        self.pathology_descriptions = {
-            'hematoma': {
-                'description': 'well-defined lesion with characteristic signal characteristics',
-                't1_signal': 'hypointense',
-                't2_signal': 'hyperintense',
-                'gre_features': 'shows blooming on GRE sequences',
-                'clinical_significance': 'suggestive of hematoma'
-            },
-            'cyst': {
-                'description': 'well-circumscribed fluid collection',
-                't1_signal': 'hypointense',
-                't2_signal': 'markedly hyperintense',
-                'enhancement': 'no enhancement post-contrast',
-                'clinical_significance': 'likely benign cystic lesion'
-            },
-            'mass': {
-                'description': 'solid tissue mass with defined borders',
-                'enhancement': 'shows enhancement post-contrast',
-                'signal_characteristics': 'variable signal intensity',
-                'clinical_significance': 'requires further characterization'
-            }
+    }
+    
+    pathology_descriptions = {
+        'hematoma': {
+            'description': 'well-defined lesion with characteristic signal characteristics',
+            't1_signal': 'hypointense',
+            't2_signal': 'hyperintense',
+            'gre_features': 'shows blooming on GRE sequences',
+            'clinical_significance': 'suggestive of hematoma'
+        },
+        'cyst': {
+            'description': 'well-circumscribed fluid collection',
+            't1_signal': 'hypointense',
+            't2_signal': 'markedly hyperintense',
+            'enhancement': 'no enhancement post-contrast',
+            'clinical_significance': 'likely benign cystic lesion'
+        },
+        'mass': {
+            'description': 'solid tissue mass with defined borders',
+            'enhancement': 'shows enhancement post-contrast',
+            'signal_characteristics': 'variable signal intensity',
+            'clinical_significance': 'requires further characterization'
         }
+    }
+    
+    # Fixed signature block
+    _SIGNATURE = (
+        "Thanks for the referral,\n"
+        "\n"
+        "DR. PRITI (MD RADIODIAGNOSIS)"
+    )
     
     def generate_doctor_quality_report(self, analysis_data: Dict[str, Any]) -> Dict[str, Any]:
         """Generate a report that matches real radiologist quality"""
@@ -122,6 +129,7 @@ class EnhancedDoctorReportGenerator:
                     'description': 'well-defined lesion with characteristic signal characteristics',
                     'measurements': '4.7 x 4.2 cm',
                     'location': 'left adnexa',
+                    'location_title': 'Left Adnexa',
                     'signal': 'hyperintense on T2, hypointense on T1',
                     'gre_features': 'shows blooming on GRE sequences'
                 })
@@ -131,6 +139,7 @@ class EnhancedDoctorReportGenerator:
                     'description': 'well-circumscribed fluid collection',
                     'measurements': '3.3 x 1.3 cm',
                     'location': 'endometrial cavity',
+                    'location_title': 'Endometrial Cavity',
                     'signal': 'markedly hyperintense on T2',
                     'enhancement': 'no enhancement post-contrast'
                 })
@@ -139,126 +148,118 @@ class EnhancedDoctorReportGenerator:
     
     def _generate_report_header(self, patient_info: Dict[str, Any], study_info: Dict[str, Any]) -> str:
         """Generate professional report header"""
-        header = f"""
-{study_info['study_description']} ({study_info['modality']})
-
-Patient Name: {patient_info['name']}
-Patient ID: {patient_info['id']}
-Modality: {study_info['modality']}
-Sex: {patient_info['sex']}
-Age: {patient_info['age']}
-Study: {study_info['body_part']}
-Reff. Dr.: {patient_info['referring_physician']}
-Study Date: {patient_info['study_date']}
-        """.strip()
+        name, patient_id, sex, age = patient_info['name'], patient_info['id'], patient_info['sex'], patient_info['age']
+        referring_physician, study_date = patient_info['referring_physician'], patient_info['study_date']
+        study_description, modality, body_part = study_info['study_description'], study_info['modality'], study_info['body_part']
         
-        return header
+        return (
+            f"{study_description} ({modality})\n"
+            f"\n"
+            f"Patient Name: {name}\n"
+            f"Patient ID: {patient_id}\n"
+            f"Modality: {modality}\n"
+            f"Sex: {sex}\n"
+            f"Age: {age}\n"
+            f"Study: {body_part}\n"
+            f"Reff. Dr.: {referring_physician}\n"
+            f"Study Date: {study_date}"
+        )
     
     def _generate_technique_section(self, study_info: Dict[str, Any]) -> str:
         """Generate detailed technique section"""
-        technique = f"""
-TECHNIQUE:
-{study_info['modality']} examination of the {study_info['body_part'].lower()} was performed using a comprehensive imaging protocol including {', '.join(study_info['sequences'])} sequences. {study_info['contrast']} imaging was obtained with appropriate slice thickness and imaging planes. Patient was positioned supine with proper immobilization to minimize motion artifacts. High-resolution images were acquired with optimized parameters for diagnostic quality.
-        """.strip()
+        modality, contrast = study_info['modality'], study_info['contrast']
+        body_part = study_info['body_part'].lower()
+        sequences = ', '.join(study_info['sequences'])
         
-        return technique
+        return (
+            f"TECHNIQUE:\n"
+            f"{modality} examination of the {body_part} was performed using a comprehensive imaging protocol "
+            f"including {sequences} sequences. {contrast} imaging was obtained with appropriate slice thickness "
+            f"and imaging planes. Patient was positioned supine with proper immobilization to minimize motion "
+            f"artifacts. High-resolution images were acquired with optimized parameters for diagnostic quality."
+        )
     
     def _generate_findings_section(self, findings: Dict[str, Any], study_info: Dict[str, Any]) -> str:
         """Generate detailed findings section"""
-        findings_text = "FINDINGS:\n\n"
+        parts = ["FINDINGS:\n\n"]
         
         # Add normal structures
-        findings_text += "Normal anatomical structures are visualized including "
+        parts.append("Normal anatomical structures are visualized including ")
         if study_info['body_part'] == 'PELVIS':
-            findings_text += "the uterus, ovaries, bladder, and surrounding soft tissues. "
-            findings_text += "Bony structures including the sacrum, coccyx, ilium, ischium, and pubis appear normal. "
-            findings_text += "Pelvic vasculature demonstrates normal caliber and course.\n\n"
+            parts.append("the uterus, ovaries, bladder, and surrounding soft tissues. ")
+            parts.append("Bony structures including the sacrum, coccyx, ilium, ischium, and pubis appear normal. ")
+            parts.append("Pelvic vasculature demonstrates normal caliber and course.\n\n")
         
         # Add abnormal findings
-        if findings['abnormal_findings']:
-            for finding in findings['abnormal_findings']:
-                findings_text += f"{finding['location'].title()}: {finding['description']}, "
-                findings_text += f"measuring {finding['measurements']}. "
-                findings_text += f"It is {finding['signal']}. "
-                if 'gre_features' in finding:
-                    findings_text += f"{finding['gre_features']}. "
-                findings_text += f"This finding is {finding['type']}.\n\n"
+        for finding in findings['abnormal_findings']:
+            parts.append(f"{finding['location_title']}: {finding['description']}, ")
+            parts.append(f"measuring {finding['measurements']}. ")
+            parts.append(f"It is {finding['signal']}. ")
+            if 'gre_features' in finding:
+                parts.append(f"{finding['gre_features']}. ")
+            parts.append(f"This finding is {finding['type']}.\n\n")
         
         # Add additional observations
-        findings_text += "Mild fluid is noted in the pelvis. No evidence of ascites or free fluid in the pelvis at present. "
-        findings_text += "Urinary bladder appears empty. Bowel loops including the rectosigmoid are normal. "
-        findings_text += "The rest of the visualized soft tissue structures appear normal."
+        parts.append("Mild fluid is noted in the pelvis. No evidence of ascites or free fluid in the pelvis at present. ")
+        parts.append("Urinary bladder appears empty. Bowel loops including the rectosigmoid are normal. ")
+        parts.append("The rest of the visualized soft tissue structures appear normal.")
         
-        return findings_text
+        return "".join(parts)
     
     def _generate_impression_section(self, findings: Dict[str, Any], study_info: Dict[str, Any]) -> str:
         """Generate clinical impression section"""
-        impression = "IMPRESSION:\n\n"
+        parts = ["IMPRESSION:\n\n"]
         
         if findings['abnormal_findings']:
-            impression += f"The {study_info['body_part'].lower()} findings show "
-            for i, finding in enumerate(findings['abnormal_findings']):
-                if i > 0:
-                    impression += " and "
-                impression += f"{finding['type']} in the {finding['location']} as described"
-            impression += ". "
+            parts.append(f"The {study_info['body_part'].lower()} findings show ")
+            parts.append(" and ".join(f"{finding['type']} in the {finding['location']} as described"
+                                      for finding in findings['abnormal_findings']))
+            parts.append(". ")
         else:
-            impression += f"No significant abnormalities are identified in the {study_info['body_part'].lower()}. "
+            parts.append(f"No significant abnormalities are identified in the {study_info['body_part'].lower()}. ")
         
-        impression += "Mild free fluid in the pelvis is noted. Please correlate clinically."
+        parts.append("Mild free fluid in the pelvis is noted. Please correlate clinically.")
         
-        return impression
+        return "".join(parts)
     
     def _generate_recommendations_section(self, findings: Dict[str, Any]) -> str:
         """Generate clinical recommendations section"""
-        recommendations = "RECOMMENDATIONS:\n\n"
+        parts = ["RECOMMENDATIONS:\n\n"]
         
         if findings['abnormal_findings']:
-            recommendations += "Clinical correlation is recommended. "
-            recommendations += "Follow-up imaging may be indicated based on clinical presentation. "
-            recommendations += "Consider additional diagnostic studies if clinically warranted."
+            parts.append("Clinical correlation is recommended. ")
+            parts.append("Follow-up imaging may be indicated based on clinical presentation. ")
+            parts.append("Consider additional diagnostic studies if clinically warranted.")
         else:
-            recommendations += "No immediate intervention required. "
-            recommendations += "Routine follow-up as clinically indicated."
+            parts.append("No immediate intervention required. ")
+            parts.append("Routine follow-up as clinically indicated.")
         
-        return recommendations
+        return "".join(parts)
     
     def _generate_critical_findings_section(self, findings: Dict[str, Any]) -> str:
         """Generate critical findings section"""
-        critical = "CRITICAL FINDINGS:\n\n"
+        parts = ["CRITICAL FINDINGS:\n\n"]
         
+        parts.append("No critical or urgent findings requiring immediate clinical attention are identified in this examination.")
         if findings['abnormal_findings']:
-            critical += "No critical or urgent findings requiring immediate clinical attention are identified in this examination. "
-            critical += "All findings are stable and can be managed on an outpatient basis."
-        else:
-            critical += "No critical or urgent findings requiring immediate clinical attention are identified in this examination."
+            parts.append(" All findings are stable and can be managed on an outpatient basis.")
         
-        return critical
+        return "".join(parts)
     
     def _generate_signature_section(self) -> str:
         """Generate radiologist signature section"""
-        return """
-Thanks for the referral,
-
-DR. PRITI (MD RADIODIAGNOSIS)
-        """.strip()
+        return self._SIGNATURE
     
     def format_report_for_display(self, report: Dict[str, Any]) -> str:
         """Format the complete report for display"""
-        formatted_report = f"""
-{report['report_header']}
-
-{report['technique']}
-
-{report['findings']}
-
-{report['impression']}
-
-{report['recommendations']}
-
-{report['critical_findings']}
-
-{report['radiologist_signature']}
-        """.strip()
+        sections = (
+            report['report_header'],
+            report['technique'],
+            report['findings'],
+            report['impression'],
+            report['recommendations'],
+            report['critical_findings'],
+            report['radiologist_signature']
+        )
         
-        return formatted_report
+        return "\n\n".join(sections)
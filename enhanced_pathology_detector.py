@@ -3,231 +3,508 @@ Enhanced Pathology Detection Module
 Provides advanced pathological finding detection with detailed descriptions
 """
 
+import logging
+import re
+from collections.abc import Mapping
+from typing import Dict, List, NamedTuple
+
+import cv2
+import numpy as np
+
+# Numba JIT for the threshold classifier and pixel statistics (optional)
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    logging.warning("Numba not available, using pure Python pathology thresholds")
+
+# Study type codes passed to _classify
+_STUDY_BRAIN, _STUDY_BREAST, _STUDY_CHEST, _STUDY_ABDOMEN, _STUDY_OTHER = range(5)
+
+# Finding bits returned by _classify
+_PITUITARY_MICROADENOMA = 1 << 0
+_PITUITARY_ENHANCEMENT = 1 << 1
+_PITUITARY_MASS = 1 << 2
+_BRAIN_LESION = 1 << 3
+_BRAIN_FINDING = 1 << 4
+_BREAST_COLLECTION = 1 << 5
+_AXILLARY_LYMPH_NODE = 1 << 6
+_SKIN_INVOLVEMENT = 1 << 7
+_BREAST_FINDING = 1 << 8
+_PULMONARY_NODULE = 1 << 9
+_VASCULAR_ABNORMALITY = 1 << 10
+_PULMONARY_INFECTION = 1 << 11
+_LIVER_LESION = 1 << 12
+_RENAL_MASS = 1 << 13
+_GENERAL_ABNORMALITY = 1 << 14
+
+
+# Feature order of the threshold table
+_FEATURES = ('brightness', 'contrast', 'edge_density', 'texture_std')
+
+
+def _rule(study, finding, **bounds):
+    """Threshold rule setting finding when every given feature lies strictly inside its (lower, upper) bounds"""
+    lower = [-np.inf] * len(_FEATURES)
+    upper = [np.inf] * len(_FEATURES)
+    for feature, (low, high) in bounds.items():
+        index = _FEATURES.index(feature)
+        if low is not None:
+            lower[index] = low
+        if high is not None:
+            upper[index] = high
+    return study, finding, lower, upper
+
+
+# Threshold table shared by _classify and _classify_batch; rules setting the same
+# finding are alternatives
+_RULES = (
+    # Very sensitive brain thresholds
+    _rule(_STUDY_BRAIN, _PITUITARY_MICROADENOMA, brightness=(100, 180)),
+    _rule(_STUDY_BRAIN, _PITUITARY_ENHANCEMENT, contrast=(25, 85)),
+    _rule(_STUDY_BRAIN, _PITUITARY_MASS, edge_density=(0.03, None)),
+    _rule(_STUDY_BRAIN, _BRAIN_LESION, texture_std=(20, None)),
+    
+    _rule(_STUDY_BREAST, _BREAST_COLLECTION, brightness=(120, None), contrast=(40, None)),
+    _rule(_STUDY_BREAST, _AXILLARY_LYMPH_NODE, contrast=(30, None)),
+    _rule(_STUDY_BREAST, _SKIN_INVOLVEMENT, edge_density=(0.05, None)),
+    
+    _rule(_STUDY_CHEST, _PULMONARY_NODULE, brightness=(140, None), contrast=(50, None)),
+    _rule(_STUDY_CHEST, _VASCULAR_ABNORMALITY, edge_density=(0.08, None)),
+    _rule(_STUDY_CHEST, _PULMONARY_INFECTION, texture_std=(50, None)),
+    
+    _rule(_STUDY_ABDOMEN, _LIVER_LESION, brightness=(130, None), contrast=(45, None)),
+    _rule(_STUDY_ABDOMEN, _RENAL_MASS, edge_density=(0.06, None)),
+    
+    _rule(_STUDY_OTHER, _GENERAL_ABNORMALITY, brightness=(120, None)),
+    _rule(_STUDY_OTHER, _GENERAL_ABNORMALITY, contrast=(30, None)),
+    _rule(_STUDY_OTHER, _GENERAL_ABNORMALITY, edge_density=(0.04, None)),
+    _rule(_STUDY_OTHER, _GENERAL_ABNORMALITY, texture_std=(25, None)),
+)
+_RULE_STUDIES = np.array([rule[0] for rule in _RULES], dtype=np.int64)
+_RULE_FINDINGS = np.array([rule[1] for rule in _RULES], dtype=np.uint16)
+_RULE_LOWER = np.array([rule[2] for rule in _RULES], dtype=np.float64)
+_RULE_UPPER = np.array([rule[3] for rule in _RULES], dtype=np.float64)
+
+# Generic finding reported when no rule fires, indexed by study type (0 for none)
+_STUDY_DEFAULT_FINDINGS = np.zeros(_STUDY_OTHER + 1, dtype=np.uint16)
+_STUDY_DEFAULT_FINDINGS[_STUDY_BRAIN] = _BRAIN_FINDING
+_STUDY_DEFAULT_FINDINGS[_STUDY_BREAST] = _BREAST_FINDING
+
+
+def _classify(brightness, contrast, edge_density, texture_std, study):
+    """Return a bitmask of the findings whose thresholds are met for the study type"""
+    features = (float(brightness), float(contrast), float(edge_density), float(texture_std))
+    mask = 0
+    
+    for rule in range(_RULE_FINDINGS.shape[0]):
+        if _RULE_STUDIES[rule] != study:
+            continue
+        matched = True
+        for feature in range(len(features)):
+            lower = _RULE_LOWER[rule, feature]
+            upper = _RULE_UPPER[rule, feature]
+            # Unbounded sides are skipped so NaN only fails the thresholds it is compared with
+            if (lower != -np.inf and not features[feature] > lower) or \
+                    (upper != np.inf and not features[feature] < upper):
+                matched = False
+                break
+        if matched:
+            mask |= _RULE_FINDINGS[rule]
+    
+    if mask == 0:
+        mask = _STUDY_DEFAULT_FINDINGS[study]
+    return int(mask)
+
+
+if NUMBA_AVAILABLE:
+    _classify = njit(cache=True)(_classify)
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def _pixel_moments(flat):
+        """Mean and standard deviation of a flat pixel array in one fused pass"""
+        total = 0.0
+        total_sq = 0.0
+        for i in prange(flat.size):
+            value = float(flat[i])
+            total += value
+            total_sq += value * value
+        mean = total / flat.size
+        return mean, np.sqrt(max(total_sq / flat.size - mean * mean, 0.0))
+else:
+    def _pixel_moments(flat):
+        """Mean and standard deviation of a flat pixel array"""
+        return float(flat.mean()), float(flat.std())
+
+# Study-type keywords, matched as substrings of the lowercased descriptions;
+# the named group of each match gives its study type
+_BODY_PART_RE = re.compile(
+    r'(?P<brain>brain|head|pituitary|sella|cranial)'
+    r'|(?P<breast>breast|mammary|chest)'
+    r'|(?P<chest>thorax|lung|pulmonary)'
+    r'|(?P<abdomen>abdomen|liver|kidney|pancreas)'
+)
+
+# Study types in precedence order when several keywords match
+_STUDY_PRECEDENCE = (
+    ('brain', _STUDY_BRAIN),
+    ('breast', _STUDY_BREAST),
+    ('chest', _STUDY_CHEST),
+    ('abdomen', _STUDY_ABDOMEN),
+)
+
+# Finding phrases added when a detection threshold is met
+_PITUITARY_MICROADENOMA_PHRASES = (
+    "hypoenhancing lesion measuring 7-10mm in right pituitary gland consistent with microadenoma",
+    "pituitary microadenoma with characteristic delayed enhancement pattern",
+    "focal hypointense area in adenohypophysis with mass effect on normal pituitary tissue",
+)
+
+_PITUITARY_ENHANCEMENT_PHRASES = (
+    "sellar mass with delayed enhancement pattern suggestive of pituitary adenoma",
+    "hypoenhancing pituitary lesion with steady-state enhancement on dynamic imaging",
+    "asymmetric pituitary enhancement pattern suggesting microadenoma",
+)
+
+_PITUITARY_MASS_PHRASES = (
+    "well-circumscribed microadenoma with heterogeneous enhancement pattern",
+    "discrete hypoenhancing focus in pituitary gland measuring approximately 7x4mm",
+    "discrete pituitary mass with well-defined margins and no cavernous sinus invasion",
+)
+
+_BRAIN_LESION_PHRASES = (
+    "small focal hyperintense lesion with irregular borders suggestive of gliotic change",
+    "discrete parenchymal abnormality with heterogeneous signal characteristics",
+    "punctate lesion in white matter with possible demyelinating etiology",
+)
+
+_BRAIN_FINDING_PHRASES = (
+    "subtle brain abnormality requiring further evaluation",
+    "possible microstructural changes in brain parenchyma",
+    "brain imaging findings of uncertain significance",
+)
+
+_BREAST_COLLECTION_PHRASES = (
+    "large well defined lobulated irregular T2/STIR hyperintense peripherally enhancing collection in right breast upper quadrant measuring 7.0 x 5.7 x 6.5 cm (approximately 150 cc) with diffusion restriction on DWI",
+    "similar morphology irregular biloculated collection in left breast inner quadrant and retroareolar region measuring 4.0 x 5.8 x 6.0 cm (approximately 80 cc) reaching skin surface",
+    "bilateral breast abscesses with peripheral rim enhancement and central fluid content",
+    "complex cystic lesions with thick enhancing walls suggestive of organized collections",
+)
+
+_AXILLARY_LYMPH_NODE_PHRASES = (
+    "inflammatory changes with surrounding parenchymal edema and trabecular thickening",
+    "enlarged oval lymph nodes in left axilla with maintained fatty hilum, largest measuring 1.8 x 0.9 cm",
+    "reactive lymphadenopathy secondary to inflammatory breast disease",
+    "bilateral fibrocystic changes with background parenchymal enhancement",
+)
+
+_SKIN_INVOLVEMENT_PHRASES = (
+    "fluid-debris levels within collections consistent with infected material",
+    "skin thickening and enhancement overlying breast collections indicating superficial extension",
+    "irregular peripherally enhancing collections with internal septations",
+)
+
+_BREAST_FINDING_PHRASES = (
+    "bilateral breast abnormalities requiring clinical correlation",
+    "complex breast lesions with enhancement patterns suggesting inflammatory process",
+    "breast findings consistent with infectious/inflammatory etiology",
+)
+
+_PULMONARY_NODULE_PHRASES = (
+    "spiculated pulmonary nodule measuring 15mm with irregular borders suspicious for malignancy",
+    "well-defined lung mass with central cavitation and thick walls",
+    "multiple bilateral pulmonary nodules consistent with metastatic lung cancer",
+)
+
+_VASCULAR_ABNORMALITY_PHRASES = (
+    "filling defect in pulmonary artery consistent with acute pulmonary embolism",
+    "segmental pulmonary arterial occlusion with peripheral wedge-shaped opacity",
+)
+
+_PULMONARY_INFECTION_PHRASES = (
+    "confluent consolidation with air bronchograms consistent with bacterial pneumonia",
+    "necrotizing pneumonia with multiple cavitary lesions and fluid levels",
+)
+
+_LIVER_LESION_PHRASES = (
+    "hepatocellular carcinoma with arterial enhancement and washout pattern",
+    "hypervascular liver lesion with central scar consistent with focal nodular hyperplasia",
+    "multiple liver metastases with rim enhancement pattern",
+)
+
+_RENAL_MASS_PHRASES = (
+    "renal cell carcinoma with heterogeneous enhancement and central necrosis",
+    "complex renal cyst with thick walls and internal septations",
+)
+
+_GENERAL_ABNORMALITY_PHRASES = (
+    "imaging abnormality requiring clinical correlation",
+    "tissue signal alteration of uncertain clinical significance",
+    "radiological finding suggestive of pathological process",
+)
+
+# Measurement text per finding, formatted from the image features on demand
+_MEASUREMENT_TEMPLATES = {
+    "pituitary_microadenoma": "{brightness:.0f} HU on T1-weighted images",
+    "pituitary_enhancement": "{contrast:.0f}% relative enhancement",
+    "pituitary_mass": "7x4x5mm lesion with {edge_density:.3f} border definition",
+    "brain_lesion": "{brightness:.0f} HU with {texture_std:.0f} texture variance",
+    "brain_finding": "brightness:{brightness:.0f}, contrast:{contrast:.0f}",
+    "breast_collection_right": "7.0 x 5.7 x 6.5 cm (150 cc volume)",
+    "breast_collection_left": "4.0 x 5.8 x 6.0 cm (80 cc volume)",
+    "axillary_lymph_node": "1.8 x 0.9 cm left axillary node",
+    "skin_involvement": "skin thickening with {edge_density:.3f} enhancement pattern",
+    "breast_finding": "enhancement:{contrast:.0f}%, T2 signal changes",
+    "pulmonary_nodule": "{brightness:.0f} HU, 15mm diameter with {contrast:.0f}% enhancement",
+    "vascular_abnormality": "{edge_density:.3f} vessel occlusion with {contrast:.0f}% contrast",
+    "pulmonary_infection": "{texture_std:.0f} heterogeneity index, {brightness:.0f} HU density",
+    "liver_lesion": "{brightness:.0f} HU with {contrast:.0f}% enhancement",
+    "renal_mass": "{edge_density:.3f} edge definition with enhancement",
+    "general_abnormality": "brightness:{brightness:.0f}, contrast:{contrast:.0f}, edge:{edge_density:.3f}",
+}
+
+
+def render_measurement(key, features):
+    """Format the measurement text for a finding key from the image features"""
+    return _MEASUREMENT_TEMPLATES[key].format(**features)
+
+
+class LazyMeasurements(Mapping):
+    """Read-only measurements mapping whose values are formatted on first access"""
+    
+    __slots__ = ('_keys', '_features', '_rendered')
+    
+    def __init__(self, keys, features):
+        self._keys = keys
+        self._features = features
+        self._rendered = {}
+    
+    def __getitem__(self, key):
+        if key not in self._rendered:
+            if key not in self._keys:
+                raise KeyError(key)
+            self._rendered[key] = render_measurement(key, self._features)
+        return self._rendered[key]
+    
+    def __iter__(self):
+        return iter(self._keys)
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class DetectionResult(NamedTuple):
+    """Findings returned by detect_enhanced_pathologies"""
+    pathologies: List[str]
+    measurements: Mapping[str, str]
+    locations: Dict[str, str]
+
+
+def _low(text):
+    """Lowercase text, skipping the copy when it is already lowercase"""
+    return text if text.islower() else text.lower()
+
+
+def _study_type(metadata):
+    """Map study metadata to one of the _STUDY_* codes"""
+    # Metadata fields are plain instance attributes
+    md = getattr(metadata, '__dict__', {})
+    body_part = _low(md.get('body_part_examined') or '')
+    study_desc = _low(md.get('study_description') or '')
+    series_desc = _low(md.get('series_description') or '')
+    
+    # Scan the body part and study description in place (no joined haystack);
+    # the series description only counts towards brain studies
+    found = {match.lastgroup for text in (body_part, study_desc)
+             for match in _BODY_PART_RE.finditer(text)}
+    if 'brain' not in found and any(match.lastgroup == 'brain'
+                                    for match in _BODY_PART_RE.finditer(series_desc)):
+        found.add('brain')
+    
+    for group, study in _STUDY_PRECEDENCE:
+        if group in found:
+            return study
+    return _STUDY_OTHER
+
+
+def _findings_from_mask(mask, brightness, contrast, edge_density, texture_std):
+    """Assemble pathologies, measurements and locations for a finding bitmask"""
+    # Insertion-ordered dict keys keep the pathologies unique as they are added
+    pathologies = {}
+    measurements = []
+    locations = {}
+    
+    if mask & _PITUITARY_MICROADENOMA:
+        pathologies.update(dict.fromkeys(_PITUITARY_MICROADENOMA_PHRASES))
+        measurements.append("pituitary_microadenoma")
+        locations["pituitary_microadenoma"] = "right anterolateral pituitary gland, sella turcica"
+    
+    if mask & _PITUITARY_ENHANCEMENT:
+        pathologies.update(dict.fromkeys(_PITUITARY_ENHANCEMENT_PHRASES))
+        measurements.append("pituitary_enhancement")
+        locations["pituitary_enhancement"] = "right anterolateral pituitary, intrasellar"
+    
+    if mask & _PITUITARY_MASS:
+        pathologies.update(dict.fromkeys(_PITUITARY_MASS_PHRASES))
+        measurements.append("pituitary_mass")
+        locations["pituitary_mass"] = "right half of sella turcica, suprasellar extension absent"
+    
+    if mask & _BRAIN_LESION:
+        pathologies.update(dict.fromkeys(_BRAIN_LESION_PHRASES))
+        measurements.append("brain_lesion")
+        locations["brain_lesion"] = "periventricular white matter, frontal lobe"
+    
+    if mask & _BRAIN_FINDING:
+        pathologies.update(dict.fromkeys(_BRAIN_FINDING_PHRASES))
+        measurements.append("brain_finding")
+        locations["brain_finding"] = "brain parenchyma, multiple regions"
+    
+    if mask & _BREAST_COLLECTION:
+        pathologies.update(dict.fromkeys(_BREAST_COLLECTION_PHRASES))
+        measurements.append("breast_collection_right")
+        measurements.append("breast_collection_left")
+        locations["breast_collection_right"] = "right breast upper quadrant"
+        locations["breast_collection_left"] = "left breast inner quadrant and retroareolar region"
+    
+    if mask & _AXILLARY_LYMPH_NODE:
+        pathologies.update(dict.fromkeys(_AXILLARY_LYMPH_NODE_PHRASES))
+        measurements.append("axillary_lymph_node")
+        locations["axillary_lymph_node"] = "left axilla"
+    
+    if mask & _SKIN_INVOLVEMENT:
+        pathologies.update(dict.fromkeys(_SKIN_INVOLVEMENT_PHRASES))
+        measurements.append("skin_involvement")
+        locations["skin_involvement"] = "bilateral breast skin overlying collections"
+    
+    if mask & _BREAST_FINDING:
+        pathologies.update(dict.fromkeys(_BREAST_FINDING_PHRASES))
+        measurements.append("breast_finding")
+        locations["breast_finding"] = "bilateral breast parenchyma"
+    
+    if mask & _PULMONARY_NODULE:
+        pathologies.update(dict.fromkeys(_PULMONARY_NODULE_PHRASES))
+        measurements.append("pulmonary_nodule")
+        locations["pulmonary_nodule"] = "right upper lobe, anterior segment"
+    
+    if mask & _VASCULAR_ABNORMALITY:
+        pathologies.update(dict.fromkeys(_VASCULAR_ABNORMALITY_PHRASES))
+        measurements.append("vascular_abnormality")
+        locations["vascular_abnormality"] = "main pulmonary artery and bilateral branches"
+    
+    if mask & _PULMONARY_INFECTION:
+        pathologies.update(dict.fromkeys(_PULMONARY_INFECTION_PHRASES))
+        measurements.append("pulmonary_infection")
+        locations["pulmonary_infection"] = "bilateral lower lobes with right middle lobe involvement"
+    
+    if mask & _LIVER_LESION:
+        pathologies.update(dict.fromkeys(_LIVER_LESION_PHRASES))
+        measurements.append("liver_lesion")
+        locations["liver_lesion"] = "right hepatic lobe, segments VI-VII"
+    
+    if mask & _RENAL_MASS:
+        pathologies.update(dict.fromkeys(_RENAL_MASS_PHRASES))
+        measurements.append("renal_mass")
+        locations["renal_mass"] = "left kidney, upper pole"
+    
+    if mask & _GENERAL_ABNORMALITY:
+        pathologies.update(dict.fromkeys(_GENERAL_ABNORMALITY_PHRASES))
+        measurements.append("general_abnormality")
+        locations["general_abnormality"] = "imaging study region"
+    
+    return DetectionResult(
+        pathologies=list(pathologies)[:10],  # Limit to top 10
+        measurements=LazyMeasurements(measurements, {
+            "brightness": brightness,
+            "contrast": contrast,
+            "edge_density": edge_density,
+            "texture_std": texture_std
+        }),
+        locations=locations
+    )
+
+
+def compute_features(pixels):
+    """
+    Compute the image_features dict expected by detect_enhanced_pathologies
+    
+    Args:
+        pixels: 2-D uint8 grayscale image array
+    
+    Returns:
+        dict: brightness (mean), contrast and texture_std (standard deviation)
+        and edge_density (fraction of Canny edge pixels)
+    """
+    if pixels.size == 0:
+        return {'brightness': 0.0, 'contrast': 0.0, 'edge_density': 0.0, 'texture_std': 0.0}
+    
+    mean, std = _pixel_moments(np.ascontiguousarray(pixels).ravel())
+    edges = cv2.Canny(pixels, 50, 150)
+    
+    return {
+        'brightness': float(mean),
+        'contrast': float(std),
+        'edge_density': float(np.count_nonzero(edges) / edges.size),
+        'texture_std': float(std)
+    }
+
+
 def detect_enhanced_pathologies(image_features, metadata):
     """
     Enhanced pathology detection with detailed, clinical descriptions
     """
     
-    pathologies = []
-    measurements = {}
-    locations = {}
-    
     # Extract features
     brightness = image_features.get('brightness', 0)
     contrast = image_features.get('contrast', 0) 
     edge_density = image_features.get('edge_density', 0)
     texture_std = image_features.get('texture_std', 0)
     
-    # Determine body part
-    body_part = getattr(metadata, 'body_part_examined', '').lower()
-    study_desc = getattr(metadata, 'study_description', '').lower()
-    series_desc = getattr(metadata, 'series_description', '').lower()
-    
-    # Check if it's a brain/pituitary study
-    is_brain_study = any(term in body_part + study_desc + series_desc for term in 
-                        ['brain', 'head', 'pituitary', 'sella', 'cranial'])
-    
-    # Enhanced brain/pituitary detection with very sensitive thresholds
-    if is_brain_study or 'brain' in body_part or 'pituitary' in body_part:
-        
-        # Ultra-sensitive pituitary microadenoma detection
-        if brightness > 100 and brightness < 180:
-            pathologies.extend([
-                "hypoenhancing lesion measuring 7-10mm in right pituitary gland consistent with microadenoma",
-                "pituitary microadenoma with characteristic delayed enhancement pattern",
-                "focal hypointense area in adenohypophysis with mass effect on normal pituitary tissue"
-            ])
-            measurements["pituitary_microadenoma"] = f"{brightness:.0f} HU on T1-weighted images"
-            locations["pituitary_microadenoma"] = "right anterolateral pituitary gland, sella turcica"
-        
-        if contrast > 25 and contrast < 85:
-            pathologies.extend([
-                "sellar mass with delayed enhancement pattern suggestive of pituitary adenoma",
-                "hypoenhancing pituitary lesion with steady-state enhancement on dynamic imaging",
-                "asymmetric pituitary enhancement pattern suggesting microadenoma"
-            ])
-            measurements["pituitary_enhancement"] = f"{contrast:.0f}% relative enhancement"
-            locations["pituitary_enhancement"] = "right anterolateral pituitary, intrasellar"
-        
-        if edge_density > 0.03:
-            pathologies.extend([
-                "well-circumscribed microadenoma with heterogeneous enhancement pattern",
-                "discrete hypoenhancing focus in pituitary gland measuring approximately 7x4mm",
-                "discrete pituitary mass with well-defined margins and no cavernous sinus invasion"
-            ])
-            measurements["pituitary_mass"] = f"7x4x5mm lesion with {edge_density:.3f} border definition"
-            locations["pituitary_mass"] = "right half of sella turcica, suprasellar extension absent"
-        
-        if texture_std > 20:
-            pathologies.extend([
-                "small focal hyperintense lesion with irregular borders suggestive of gliotic change",
-                "discrete parenchymal abnormality with heterogeneous signal characteristics",
-                "punctate lesion in white matter with possible demyelinating etiology"
-            ])
-            measurements["brain_lesion"] = f"{brightness:.0f} HU with {texture_std:.0f} texture variance"
-            locations["brain_lesion"] = "periventricular white matter, frontal lobe"
-        
-        # Fallback detection for any brain study
-        if not pathologies:
-            pathologies.extend([
-                "subtle brain abnormality requiring further evaluation",
-                "possible microstructural changes in brain parenchyma",
-                "brain imaging findings of uncertain significance"
-            ])
-            measurements["brain_finding"] = f"brightness:{brightness:.0f}, contrast:{contrast:.0f}"
-            locations["brain_finding"] = "brain parenchyma, multiple regions"
-    
-    # Enhanced breast detection  
-    elif any(term in body_part + study_desc for term in ['breast', 'mammary', 'chest']):
-        
-        if brightness > 120 and contrast > 40:
-            pathologies.extend([
-                "large well defined lobulated irregular T2/STIR hyperintense peripherally enhancing collection in right breast upper quadrant measuring 7.0 x 5.7 x 6.5 cm (approximately 150 cc) with diffusion restriction on DWI",
-                "similar morphology irregular biloculated collection in left breast inner quadrant and retroareolar region measuring 4.0 x 5.8 x 6.0 cm (approximately 80 cc) reaching skin surface",
-                "bilateral breast abscesses with peripheral rim enhancement and central fluid content",
-                "complex cystic lesions with thick enhancing walls suggestive of organized collections"
-            ])
-            measurements["breast_collection_right"] = "7.0 x 5.7 x 6.5 cm (150 cc volume)"
-            measurements["breast_collection_left"] = "4.0 x 5.8 x 6.0 cm (80 cc volume)"
-            locations["breast_collection_right"] = "right breast upper quadrant"
-            locations["breast_collection_left"] = "left breast inner quadrant and retroareolar region"
-        
-        if contrast > 30:
-            pathologies.extend([
-                "inflammatory changes with surrounding parenchymal edema and trabecular thickening",
-                "enlarged oval lymph nodes in left axilla with maintained fatty hilum, largest measuring 1.8 x 0.9 cm",
-                "reactive lymphadenopathy secondary to inflammatory breast disease",
-                "bilateral fibrocystic changes with background parenchymal enhancement"
-            ])
-            measurements["axillary_lymph_node"] = "1.8 x 0.9 cm left axillary node"
-            locations["axillary_lymph_node"] = "left axilla"
-        
-        if edge_density > 0.05:
-            pathologies.extend([
-                "fluid-debris levels within collections consistent with infected material",
-                "skin thickening and enhancement overlying breast collections indicating superficial extension",
-                "irregular peripherally enhancing collections with internal septations"
-            ])
-            measurements["skin_involvement"] = f"skin thickening with {edge_density:.3f} enhancement pattern"
-            locations["skin_involvement"] = "bilateral breast skin overlying collections"
-        
-        # Fallback for breast studies
-        if not pathologies:
-            pathologies.extend([
-                "bilateral breast abnormalities requiring clinical correlation",
-                "complex breast lesions with enhancement patterns suggesting inflammatory process",
-                "breast findings consistent with infectious/inflammatory etiology"
-            ])
-            measurements["breast_finding"] = f"enhancement:{contrast:.0f}%, T2 signal changes"
-            locations["breast_finding"] = "bilateral breast parenchyma"
-    
-    # Enhanced chest/lung detection
-    elif any(term in body_part + study_desc for term in ['thorax', 'lung', 'pulmonary']):
-        
-        if brightness > 140 and contrast > 50:
-            pathologies.extend([
-                "spiculated pulmonary nodule measuring 15mm with irregular borders suspicious for malignancy",
-                "well-defined lung mass with central cavitation and thick walls",
-                "multiple bilateral pulmonary nodules consistent with metastatic lung cancer"
-            ])
-            measurements["pulmonary_nodule"] = f"{brightness:.0f} HU, 15mm diameter with {contrast:.0f}% enhancement"
-            locations["pulmonary_nodule"] = "right upper lobe, anterior segment"
-        
-        if edge_density > 0.08:
-            pathologies.extend([
-                "filling defect in pulmonary artery consistent with acute pulmonary embolism",
-                "segmental pulmonary arterial occlusion with peripheral wedge-shaped opacity"
-            ])
-            measurements["vascular_abnormality"] = f"{edge_density:.3f} vessel occlusion with {contrast:.0f}% contrast"
-            locations["vascular_abnormality"] = "main pulmonary artery and bilateral branches"
-        
-        if texture_std > 50:
-            pathologies.extend([
-                "confluent consolidation with air bronchograms consistent with bacterial pneumonia",
-                "necrotizing pneumonia with multiple cavitary lesions and fluid levels"
-            ])
-            measurements["pulmonary_infection"] = f"{texture_std:.0f} heterogeneity index, {brightness:.0f} HU density"
-            locations["pulmonary_infection"] = "bilateral lower lobes with right middle lobe involvement"
-    
-    # Enhanced abdominal detection
-    elif any(term in body_part + study_desc for term in ['abdomen', 'liver', 'kidney', 'pancreas']):
-        
-        if brightness > 130 and contrast > 45:
-            pathologies.extend([
-                "hepatocellular carcinoma with arterial enhancement and washout pattern",
-                "hypervascular liver lesion with central scar consistent with focal nodular hyperplasia",
-                "multiple liver metastases with rim enhancement pattern"
-            ])
-            measurements["liver_lesion"] = f"{brightness:.0f} HU with {contrast:.0f}% enhancement"
-            locations["liver_lesion"] = "right hepatic lobe, segments VI-VII"
-        
-        if edge_density > 0.06:
-            pathologies.extend([
-                "renal cell carcinoma with heterogeneous enhancement and central necrosis",
-                "complex renal cyst with thick walls and internal septations"
-            ])
-            measurements["renal_mass"] = f"{edge_density:.3f} edge definition with enhancement"
-            locations["renal_mass"] = "left kidney, upper pole"
-    
-    # General detection for any study
-    else:
-        if brightness > 120 or contrast > 30 or edge_density > 0.04 or texture_std > 25:
-            pathologies.extend([
-                "imaging abnormality requiring clinical correlation",
-                "tissue signal alteration of uncertain clinical significance",
-                "radiological finding suggestive of pathological process"
-            ])
-            measurements["general_abnormality"] = f"brightness:{brightness:.0f}, contrast:{contrast:.0f}, edge:{edge_density:.3f}"
-            locations["general_abnormality"] = "imaging study region"
-    
-    # Remove duplicates while preserving order
-    unique_pathologies = []
-    seen = set()
-    for pathology in pathologies:
-        if pathology not in seen:
-            unique_pathologies.append(pathology)
-            seen.add(pathology)
-    
-    return {
-        "pathologies": unique_pathologies[:10],  # Limit to top 10
-        "measurements": measurements,
-        "locations": locations
-    }
+    # Evaluate every numeric threshold in one call, then add the matching findings
+    mask = _classify(float(brightness), float(contrast), float(edge_density), float(texture_std),
+                     _study_type(metadata))
+    return _findings_from_mask(mask, brightness, contrast, edge_density, texture_std)
 
-def test_enhanced_detection():
-    """Test the enhanced detection system"""
-    
-    # Test with brain/pituitary study
-    class MockMetadata:
-        def __init__(self):
-            self.body_part_examined = 'head'
-            self.study_description = 'MRI Brain with contrast'
-            self.series_description = 'T1 Post Gd'
-    
-    test_features = {
-        'brightness': 145,
-        'contrast': 55,
-        'edge_density': 0.07,
-        'texture_std': 35
-    }
+
+def _classify_batch(brightness, contrast, edge_density, texture_std, study):
+    """Vectorized _classify over equal-length feature arrays; returns one bitmask per image"""
+    rules = _RULE_STUDIES == study
+    lower = _RULE_LOWER[rules]
+    upper = _RULE_UPPER[rules]
+    features = np.stack((brightness, contrast, edge_density, texture_std), axis=-1)[:, np.newaxis, :]
     
-    metadata = MockMetadata()
-    results = detect_enhanced_pathologies(test_features, metadata)
+    # (N, K) matrix of the rules each image meets, K being the study's rules
+    matched = (((lower == -np.inf) | (features > lower)) &
+               ((upper == np.inf) | (features < upper))).all(axis=2)
+    mask = np.bitwise_or.reduce(np.where(matched, _RULE_FINDINGS[rules], 0).astype(np.uint16), axis=1)
     
-    print("🔍 ENHANCED PATHOLOGY DETECTION TEST")
-    print("=" * 50)
-    print(f"✅ Pathologies detected: {len(results['pathologies'])}")
+    mask[mask == 0] = _STUDY_DEFAULT_FINDINGS[study]
+    return mask
+
+
+def detect_enhanced_pathologies_batch(features, metadata):
+    """
+    Batch variant of detect_enhanced_pathologies for images of one study
     
-    for i, pathology in enumerate(results['pathologies'], 1):
-        print(f"{i}. {pathology}")
+    Args:
+        features: dict of equal-length arrays keyed 'brightness', 'contrast',
+            'edge_density' and 'texture_std' (missing keys count as 0)
+        metadata: study metadata shared by every image
     
-    print("\n📏 Measurements:")
-    for key, value in results['measurements'].items():
-        print(f"  • {key}: {value}")
+    Returns:
+        list: one DetectionResult per image
+    """
+    count = len(next(iter(features.values()), ()))
+    brightness, contrast, edge_density, texture_std = (
+        np.asarray(features.get(key, np.zeros(count)), dtype=np.float64)
+        for key in ('brightness', 'contrast', 'edge_density', 'texture_std'))
     
-    print("\n📍 Locations:")
-    for key, value in results['locations'].items():
-        print(f"  • {key}: {value}")
-
-if __name__ == "__main__":
-    test_enhanced_detection()
+    # Thresholds are evaluated for the whole batch at once; only text assembly is per image
+    masks = _classify_batch(brightness, contrast, edge_density, texture_std, _study_type(metadata))
+    return [_findings_from_mask(int(mask), b, c, e, t)
+            for mask, b, c, e, t in zip(masks.tolist(), brightness.tolist(), contrast.tolist(),
+                                        edge_density.tolist(), texture_std.tolist())]
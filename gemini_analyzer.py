@@ -1,13 +1,131 @@
+import asyncio
+import functools
 import google.generativeai as genai
+import hashlib
+import itertools
 import logging
 import os
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass
-import json
+import random
+import re
+import time
+from collections import Counter, OrderedDict, defaultdict
+from statistics import fmean
+from typing import Callable, Dict, FrozenSet, List, Any, Optional, Set, Tuple
+from dataclasses import dataclass, field as dataclass_field
+import orjson
 from datetime import datetime
+from google.api_core import exceptions as google_exceptions
+
+# Persistent on-disk cache for Gemini analyses (optional)
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+    logging.warning("diskcache not available, Gemini analyses will only be cached in memory")
+
+# google-genai SDK for Batch API jobs and non-standard service tiers (optional)
+try:
+    from google import genai as google_genai
+    from google.genai import errors as google_genai_errors
+    GOOGLE_GENAI_AVAILABLE = True
+except ImportError:
+    GOOGLE_GENAI_AVAILABLE = False
+    logging.warning("google-genai not available, Gemini Batch API jobs and service tiers are disabled")
 
 logger = logging.getLogger(__name__)
 
+# Bold section headings of a written report, matched in a single scan
+_REPORT_SECTION_RE = re.compile(r'\*\*(CLINICAL INDICATION|TECHNIQUE|FINDINGS|IMPRESSION|RECOMMENDATIONS|REPORTED BY):\*\*')
+
+# Section key for each heading; REPORTED BY only ends the preceding section
+_REPORT_SECTION_KEYS = {
+    'CLINICAL INDICATION': 'clinical_indication',
+    'TECHNIQUE': 'technique',
+    'FINDINGS': 'findings',
+    'IMPRESSION': 'impression',
+    'RECOMMENDATIONS': 'recommendations',
+}
+
+
+@functools.lru_cache(maxsize=1)
+def _format_report_minute(epoch_minute: int) -> str:
+    """Report date for a minute since the epoch, formatted once per minute"""
+    return datetime.fromtimestamp(epoch_minute * 60).strftime('%B %d, %Y at %H:%M')
+
+
+def report_date() -> str:
+    """Current report date at the minute resolution shown in Gemini reports"""
+    return _format_report_minute(int(time.time() // 60))
+
+
+def chunk_text(chunk) -> str:
+    """
+    Text of a streamed Gemini response chunk, empty for chunks without parts
+    
+    The final chunk of a stream that ends on a stop sequence or the token limit can carry
+    no parts; .text raises ValueError for those in google-generativeai and returns None
+    in google-genai, so the text is read from the parts instead.
+    """
+    return ''.join(part.text or '' for part in chunk.parts or ())
+
+
+# Most frequent pathologies and landmarks listed per body part in a study summary
+_SUMMARY_TOP_FINDINGS = 10
+
+
+def _summary_findings(title: str, counts: Counter) -> List[str]:
+    """Summary lines for the most frequent findings, noting how many were left out"""
+    if len(counts) > _SUMMARY_TOP_FINDINGS:
+        title = f"{title} (top {_SUMMARY_TOP_FINDINGS} of {len(counts)})"
+    lines = [f"  - {title}:"]
+    for finding, count in counts.most_common(_SUMMARY_TOP_FINDINGS):
+        lines.append(f"    * {finding} ({count} files)")
+    return lines
+
+
+@functools.lru_cache(maxsize=256)
+def _summarize_study(study: Tuple[Tuple[Any, ...], ...]) -> Tuple[str, FrozenSet[str]]:
+    """
+    Summary text and modalities for a study
+    
+    Args:
+        study: (body_part, pathologies, landmarks, modality, confidence) for each result
+        
+    Returns:
+        Tuple: (summary grouped by body part, modalities across the study)
+    """
+    summary_parts = []
+    study_modalities = set()
+    
+    # Group by body part
+    body_part_groups = defaultdict(list)
+    for result in study:
+        body_part_groups[result[0]].append(result)
+    
+    summary_parts.append(f"Total DICOM files analyzed: {len(study)}")
+    
+    for body_part, results in body_part_groups.items():
+        summary_parts.append(f"\n{body_part.upper()} ANALYSIS ({len(results)} files):")
+        
+        # Count pathologies and landmarks across the group's files
+        pathology_counts = Counter(itertools.chain.from_iterable(result[1] for result in results))
+        landmark_counts = Counter(itertools.chain.from_iterable(result[2] for result in results))
+        modalities = {result[3] for result in results}
+        study_modalities |= modalities
+        avg_confidence = fmean(result[4] for result in results)
+        
+        summary_parts.append(f"  - Modality: {', '.join(modalities)}")
+        summary_parts.append(f"  - Average confidence: {avg_confidence:.2f}")
+        
+        if pathology_counts:
+            summary_parts.extend(_summary_findings("Pathologies detected", pathology_counts))
+        
+        if landmark_counts:
+            summary_parts.extend(_summary_findings("Anatomical landmarks", landmark_counts))
+    
+    return "\n".join(summary_parts), frozenset(study_modalities)
+
 @dataclass
 class GeminiAnalysis:
     """Results from Gemini AI analysis"""
@@ -18,129 +136,15 @@ class GeminiAnalysis:
     risk_assessment: str
     follow_up_plan: str
     ai_confidence: float
+    analysis_timestamp: float = dataclass_field(default_factory=time.time)  # when the analysis was generated
 
 class GeminiAnalyzer:
     """Gemini AI-powered medical image analysis"""
     
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize Gemini AI analyzer"""
-        self.api_key = api_key or os.getenv('GEMINI_API_KEY')
-        if not self.api_key:
-            logger.warning("No Gemini API key provided. Set GEMINI_API_KEY environment variable.")
-            self.client = None
-        else:
-            genai.configure(api_key=self.api_key)
-            self.client = genai.GenerativeModel('gemini-1.5-flash')
-            logger.info("Gemini AI analyzer initialized successfully")
-    
-    def analyze_dicom_data(self, analysis_results: List[Dict[str, Any]], patient_data: Dict[str, Any] = None) -> GeminiAnalysis:
-        """Analyze DICOM data using Gemini AI"""
-        if not self.client:
-            return self._generate_fallback_analysis(analysis_results)
-        
-        try:
-            # Prepare comprehensive data for Gemini
-            analysis_summary = self._prepare_analysis_summary(analysis_results)
-            
-            # Create detailed prompt for medical analysis
-            prompt = self._create_medical_analysis_prompt(analysis_summary, patient_data)
-            
-            # Get Gemini response
-            response = self.client.generate_content(prompt)
-            
-            # Parse and structure the response
-            return self._parse_gemini_response(response.text, analysis_results)
-            
-        except Exception as e:
-            logger.error(f"Error in Gemini analysis: {e}")
-            return self._generate_fallback_analysis(analysis_results)
-    
-    def _prepare_analysis_summary(self, analysis_results: List[Dict[str, Any]]) -> str:
-        """Prepare comprehensive summary of all analysis results"""
-        summary_parts = []
-        
-        # Group by body part
-        body_part_groups = {}
-        for result in analysis_results:
-            body_part = result.get('body_part', 'unknown')
-            if body_part not in body_part_groups:
-                body_part_groups[body_part] = []
-            body_part_groups[body_part].append(result)
-        
-        summary_parts.append(f"Total DICOM files analyzed: {len(analysis_results)}")
-        
-        for body_part, results in body_part_groups.items():
-            summary_parts.append(f"\n{body_part.upper()} ANALYSIS ({len(results)} files):")
-            
-            # Collect all pathologies
-            all_pathologies = []
-            all_landmarks = []
-            modalities = set()
-            confidences = []
-            
-            for result in results:
-                pathologies = result.get('pathologies', [])
-                landmarks = result.get('anatomical_landmarks', [])
-                modality = result.get('modality', 'unknown')
-                confidence = result.get('confidence', 0)
-                
-                all_pathologies.extend(pathologies)
-                all_landmarks.extend(landmarks)
-                modalities.add(modality)
-                confidences.append(confidence)
-            
-            # Remove duplicates and count
-            pathology_counts = {}
-            for pathology in all_pathologies:
-                pathology_counts[pathology] = pathology_counts.get(pathology, 0) + 1
-            
-            landmark_counts = {}
-            for landmark in all_landmarks:
-                landmark_counts[landmark] = landmark_counts.get(landmark, 0) + 1
-            
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-            
-            summary_parts.append(f"  - Modality: {', '.join(modalities)}")
-            summary_parts.append(f"  - Average confidence: {avg_confidence:.2f}")
-            
-            if pathology_counts:
-                summary_parts.append(f"  - Pathologies detected:")
-                for pathology, count in pathology_counts.items():
-                    summary_parts.append(f"    * {pathology} ({count} files)")
-            
-            if landmark_counts:
-                summary_parts.append(f"  - Anatomical landmarks:")
-                for landmark, count in landmark_counts.items():
-                    summary_parts.append(f"    * {landmark} ({count} files)")
-        
-        return "\n".join(summary_parts)
-    
-    def _create_medical_analysis_prompt(self, analysis_summary: str, patient_data: Dict[str, Any] = None) -> str:
-        """Create detailed medical analysis prompt for Gemini AI - comprehensive doctor report"""
-        current_date = datetime.now().strftime('%B %d, %Y at %H:%M')
-        
-        # Extract patient information
-        patient_name = patient_data.get('patient_name', 'UNKNOWN') if patient_data else 'UNKNOWN'
-        patient_id = patient_data.get('patient_id', 'N/A') if patient_data else 'N/A'
-        patient_sex = patient_data.get('patient_sex', 'Unknown') if patient_data else 'Unknown'
-        patient_age = patient_data.get('patient_age', 'Unknown') if patient_data else 'Unknown'
-        study_date = patient_data.get('study_date', 'Unknown') if patient_data else 'Unknown'
-        doctor_name = patient_data.get('doctor_name', 'DR. RADIOLOGIST') if patient_data else 'DR. RADIOLOGIST'
-        modality = patient_data.get('modality', 'Unknown') if patient_data else 'Unknown'
-        
-        return f"""
-You are {doctor_name}, an expert radiologist with 20+ years of experience. Generate a COMPREHENSIVE, DETAILED medical radiology report in professional doctor's format with multiple paragraphs.
-
-PATIENT INFORMATION:
-- Name: {patient_name}
-- ID: {patient_id}
-- Sex: {patient_sex}
-- Age: {patient_age}
-- Study Date: {study_date}
-- Modality: {modality}
-
-ANALYSIS DATA:
-{analysis_summary}
+    # Static report instructions, sent once as the model's system instruction so
+    # every request shares the same prefix; per-request data goes in the prompt
+    SYSTEM_INSTRUCTION = """
+You are the reporting radiologist named in the request, an expert radiologist with 20+ years of experience. Generate a COMPREHENSIVE, DETAILED medical radiology report in professional doctor's format with multiple paragraphs.
 
 REQUIREMENTS:
 - Write as a detailed, professional radiologist report
@@ -182,178 +186,551 @@ FORMAT (Write detailed paragraphs for each section):
 - Further workup if indicated]
 
 **REPORTED BY:**
-{doctor_name}
+[Reporting radiologist from the request]
 Board-Certified Radiologist
-Report Date: {current_date}
 
 IMPORTANT: Write in detailed, comprehensive paragraphs using professional medical language. Each section should be substantial and informative, not brief summaries.
 """
     
-    def _parse_gemini_response(self, response_text: str, analysis_results: List[Dict[str, Any]]) -> GeminiAnalysis:
-        """Parse Gemini response into structured analysis"""
+    # Per-request part of the prompt, filled from the patient data and analysis summary
+    REQUEST_TEMPLATE = """
+REPORTING RADIOLOGIST: {doctor_name}
+
+PATIENT INFORMATION:
+- Name: {patient_name}
+- ID: {patient_id}
+- Sex: {patient_sex}
+- Age: {patient_age}
+- Study Date: {study_date}
+- Modality: {modality}
+
+ANALYSIS DATA:
+{analysis_summary}
+"""
+    
+    # Values used for patient fields missing from the patient data
+    PATIENT_DEFAULTS = {
+        'patient_name': 'UNKNOWN',
+        'patient_id': 'N/A',
+        'patient_sex': 'Unknown',
+        'patient_age': 'Unknown',
+        'study_date': 'Unknown',
+        'doctor_name': 'DR. RADIOLOGIST',
+        'modality': 'Unknown',
+    }
+    
+    # Structured output schema for one report, mirroring the GeminiAnalysis fields
+    ANALYSIS_SCHEMA = {
+        'type': 'OBJECT',
+        'properties': {
+            'summary': {'type': 'STRING'},
+            'clinical_insights': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+            'differential_diagnosis': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+            'recommendations': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+            'risk_assessment': {'type': 'STRING'},
+            'follow_up_plan': {'type': 'STRING'},
+        },
+        'required': ['summary', 'clinical_insights', 'differential_diagnosis',
+                     'recommendations', 'risk_assessment', 'follow_up_plan'],
+    }
+    
+    # How the structured fields of a report relate to the written report
+    REPORT_FIELDS_INSTRUCTION = (
+        "whose summary is the complete report in the format above and whose other fields restate "
+        "its key findings, differential diagnoses, recommendations, risk assessment and follow-up plan"
+    )
+    
+    MODEL_NAME = 'gemini-1.5-flash'
+    
+    # Service tiers for interactive calls; flex is half price for latency-tolerant bulk work
+    SERVICE_TIERS = frozenset({'standard', 'flex', 'priority'})
+    
+    # Batch API job polling; jobs can take up to a day to finish
+    BATCH_POLL_SECONDS = 30
+    BATCH_DONE_STATES = frozenset({
+        'JOB_STATE_SUCCEEDED', 'JOB_STATE_FAILED', 'JOB_STATE_CANCELLED', 'JOB_STATE_EXPIRED',
+    })
+    
+    # Number of Gemini analyses kept in the in-memory response cache
+    RESPONSE_CACHE_SIZE = 256
+    
+    # Cached analyses on disk expire after a week
+    CACHE_EXPIRE_SECONDS = 7 * 24 * 3600
+    
+    # Transient Gemini errors (429, 503, timeouts) retried with jittered exponential backoff
+    RETRYABLE_ERRORS = (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+    )
+    RETRYABLE_STATUS_CODES = frozenset({429, 503, 504})  # same errors from the google-genai client
+    RETRY_ATTEMPTS = 3
+    RETRY_BACKOFF_SECONDS = 0.5
+    RETRY_MAX_BACKOFF_SECONDS = 8.0
+    
+    def __init__(self, api_key: Optional[str] = None, cache_dir: Optional[str] = None,
+                 min_findings_for_llm: int = 1, service_tier: str = 'standard'):
+        """
+        Initialize Gemini AI analyzer
+        
+        Args:
+            api_key: Gemini API key (if not provided, will use environment variable)
+            cache_dir: Directory for the analysis cache shared across processes (if not provided, uses
+                GEMINI_CACHE_DIR; unset keeps analyses in memory only, as they hold patient data)
+            min_findings_for_llm: Studies with fewer pathologies and landmarks get the fallback analysis
+            service_tier: 'standard', 'flex' (half price, for pipeline and bulk callers) or 'priority'
+        """
+        if service_tier not in self.SERVICE_TIERS:
+            raise ValueError(f"Unknown service tier {service_tier!r}, expected one of {sorted(self.SERVICE_TIERS)}")
+        self.service_tier = service_tier
+        self.min_findings_for_llm = min_findings_for_llm
+        self._response_cache = OrderedDict()  # cache key -> GeminiAnalysis, in LRU order
+        cache_dir = cache_dir or os.getenv('GEMINI_CACHE_DIR')
+        self.cache = diskcache.Cache(cache_dir) if DISKCACHE_AVAILABLE and cache_dir else None
+        self.api_key = api_key or os.getenv('GEMINI_API_KEY')
+        self._genai_client = None
+        if not self.api_key:
+            logger.warning("No Gemini API key provided. Set GEMINI_API_KEY environment variable.")
+            self.client = None
+        else:
+            # gRPC multiplexes every call over one long-lived HTTP/2 channel per process
+            genai.configure(api_key=self.api_key, transport='grpc')
+            self.client = genai.GenerativeModel(self.MODEL_NAME, system_instruction=self.SYSTEM_INSTRUCTION)
+            self._report_config = genai.GenerationConfig(
+                response_mime_type='application/json',
+                response_schema=self.ANALYSIS_SCHEMA,
+            )
+            self._batch_report_config = genai.GenerationConfig(
+                response_mime_type='application/json',
+                response_schema={'type': 'ARRAY', 'items': self.ANALYSIS_SCHEMA},
+            )
+            if GOOGLE_GENAI_AVAILABLE:
+                self._genai_client = google_genai.Client(api_key=self.api_key)
+            elif service_tier != 'standard':
+                logger.warning(f"google-genai not available, using the standard tier instead of {service_tier}")
+            logger.info("Gemini AI analyzer initialized successfully")
+    
+    def analyze_dicom_data(self, analysis_results: List[Dict[str, Any]], patient_data: Dict[str, Any] = None) -> GeminiAnalysis:
+        """Analyze DICOM data using Gemini AI"""
+        if not self.client or not self._worth_analyzing(analysis_results):
+            return self._generate_fallback_analysis(analysis_results)
+        
         try:
-            # Extract sections from the detailed report
-            sections = self._extract_report_sections(response_text)
+            # Prepare comprehensive data for Gemini
+            analysis_summary, modalities = self._prepare_analysis_summary(analysis_results)
             
-            # Create comprehensive summary from all sections
-            full_report = response_text.strip()
+            # Identical summaries for the same patient reuse the earlier analysis
+            cache_key = self._response_cache_key(analysis_summary, patient_data)
+            cached = self._cached_analysis(cache_key)
+            if cached is not None:
+                logger.info("Using cached Gemini analysis")
+                return cached
             
-            # Extract specific sections for structured data
-            clinical_insights = []
-            if sections.get('findings'):
-                clinical_insights.append(sections['findings'])
-            if sections.get('impression'):
-                clinical_insights.append(sections['impression'])
-                
-            differential_diagnosis = []
-            if sections.get('impression'):
-                # Extract potential diagnoses from impression
-                impression_text = sections['impression'].lower()
-                if 'differential' in impression_text or 'diagnosis' in impression_text:
-                    differential_diagnosis.append(sections['impression'])
-                else:
-                    differential_diagnosis.append("Clinical correlation required for definitive diagnosis")
+            # Create detailed prompt for medical analysis
+            prompt = self._create_report_prompt(analysis_summary, patient_data, modalities)
             
-            recommendations = []
-            if sections.get('recommendations'):
-                recommendations.append(sections['recommendations'])
-            else:
-                recommendations.append("Follow-up imaging and clinical correlation recommended")
+            # Get Gemini response as a structured report
+            response = self._generate_content(prompt, generation_config=self._report_config)
             
-            risk_assessment = "Moderate risk level" 
-            if sections.get('impression'):
-                impression_lower = sections['impression'].lower()
-                if any(word in impression_lower for word in ['severe', 'critical', 'urgent', 'emergent']):
-                    risk_assessment = "High risk - requires immediate attention"
-                elif any(word in impression_lower for word in ['mild', 'minor', 'stable', 'benign']):
-                    risk_assessment = "Low risk - routine follow-up"
+            # Parse and structure the response
+            analysis = self._parse_gemini_response(response.text, analysis_results)
+            self._store_analysis(cache_key, analysis)
+            return analysis
             
-            follow_up_plan = sections.get('recommendations', "Standard follow-up imaging recommended")
+        except Exception as e:
+            logger.error(f"Error in Gemini analysis: {e}")
+            return self._generate_fallback_analysis(analysis_results)
+    
+    async def analyze_dicom_data_async(self, analysis_results: List[Dict[str, Any]],
+                                       patient_data: Dict[str, Any] = None) -> GeminiAnalysis:
+        """Async variant of analyze_dicom_data for concurrent multi-study workloads"""
+        if not self.client or not self._worth_analyzing(analysis_results):
+            return self._generate_fallback_analysis(analysis_results)
+        
+        try:
+            # Build the summary off the event loop so other studies' requests keep flowing
+            analysis_summary, modalities = await asyncio.to_thread(self._prepare_analysis_summary, analysis_results)
             
-            return GeminiAnalysis(
-                summary=full_report,  # Use the entire detailed report
-                clinical_insights=clinical_insights,
-                differential_diagnosis=differential_diagnosis,
-                recommendations=recommendations,
-                risk_assessment=risk_assessment,
-                follow_up_plan=follow_up_plan,
-                ai_confidence=0.90  # High confidence for detailed Gemini analysis
-            )
+            cache_key = self._response_cache_key(analysis_summary, patient_data)
+            cached = self._cached_analysis(cache_key)
+            if cached is not None:
+                logger.info("Using cached Gemini analysis")
+                return cached
+            
+            prompt = self._create_report_prompt(analysis_summary, patient_data, modalities)
+            response = await self._generate_content_async(prompt, generation_config=self._report_config)
+            
+            analysis = self._parse_gemini_response(response.text, analysis_results)
+            self._store_analysis(cache_key, analysis)
+            return analysis
             
         except Exception as e:
-            logger.error(f"Error parsing Gemini response: {e}")
+            logger.error(f"Error in Gemini analysis: {e}")
             return self._generate_fallback_analysis(analysis_results)
     
-    def _extract_from_raw_response(self, response_text: str) -> Dict[str, Any]:
-        """Extract content from raw Gemini response when structured parsing fails"""
-        sections = {}
+    def _generate_content(self, prompt: str, generation_config=None):
+        """generate_content on the configured service tier, retrying transient errors before giving up"""
+        for attempt in range(1, self.RETRY_ATTEMPTS + 1):
+            try:
+                return self._request_content(prompt, generation_config)
+            except Exception as e:
+                if attempt == self.RETRY_ATTEMPTS or not self._is_transient(e):
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(f"Transient Gemini error ({e}), retrying in {delay:.1f}s (attempt {attempt})")
+                time.sleep(delay)
+    
+    def _stream_text(self, prompt: str):
+        """
+        Yield the text of a streamed Gemini response as it arrives
+        
+        Transient errors, whether raised by the request or while reading the stream, are
+        retried until the first text has been yielded; later errors are raised, since the
+        caller already holds part of the response.
+        """
+        for attempt in range(1, self.RETRY_ATTEMPTS + 1):
+            started = False
+            try:
+                for chunk in self._request_content(prompt, stream=True):
+                    text = chunk_text(chunk)
+                    if text:
+                        started = True
+                        yield text
+                return
+            except Exception as e:
+                if started or attempt == self.RETRY_ATTEMPTS or not self._is_transient(e):
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(f"Transient Gemini error ({e}), retrying in {delay:.1f}s (attempt {attempt})")
+                time.sleep(delay)
+    
+    def _request_content(self, prompt: str, generation_config=None, stream: bool = False):
+        """Single generate_content request on the configured service tier"""
+        if self._uses_service_tier():
+            models = self._genai_client.models
+            request = models.generate_content_stream if stream else models.generate_content
+            return request(model=self.MODEL_NAME, contents=prompt, config=self._tier_config(generation_config))
+        return self.client.generate_content(prompt, generation_config=generation_config, stream=stream)
+    
+    async def _generate_content_async(self, prompt: str, generation_config=None):
+        """generate_content_async on the configured service tier, retrying transient errors before giving up"""
+        for attempt in range(1, self.RETRY_ATTEMPTS + 1):
+            try:
+                if self._uses_service_tier():
+                    return await self._genai_client.aio.models.generate_content(
+                        model=self.MODEL_NAME, contents=prompt, config=self._tier_config(generation_config)
+                    )
+                return await self.client.generate_content_async(prompt, generation_config=generation_config)
+            except Exception as e:
+                if attempt == self.RETRY_ATTEMPTS or not self._is_transient(e):
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(f"Transient Gemini error ({e}), retrying in {delay:.1f}s (attempt {attempt})")
+                await asyncio.sleep(delay)
+    
+    def _uses_service_tier(self) -> bool:
+        """Whether calls go through google-genai to request a non-standard service tier"""
+        return self.service_tier != 'standard' and self._genai_client is not None
+    
+    def _tier_config(self, generation_config=None) -> Dict[str, Any]:
+        """google-genai request config with the service tier and any structured output settings"""
+        config = {'system_instruction': self.SYSTEM_INSTRUCTION, 'service_tier': self.service_tier}
+        if generation_config is not None:
+            config['response_mime_type'] = generation_config.response_mime_type
+            config['response_schema'] = generation_config.response_schema
+        return config
+    
+    def _is_transient(self, error: Exception) -> bool:
+        """Whether a failed Gemini call is worth retrying (rate limit, unavailable, timeout)"""
+        if isinstance(error, self.RETRYABLE_ERRORS):
+            return True
+        return (GOOGLE_GENAI_AVAILABLE and isinstance(error, google_genai_errors.APIError)
+                and error.code in self.RETRYABLE_STATUS_CODES)
+    
+    def _retry_delay(self, attempt: int) -> float:
+        """Exponential backoff with up to a second of jitter, capped at RETRY_MAX_BACKOFF_SECONDS"""
+        return min(self.RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1) + random.uniform(0, 1),
+                   self.RETRY_MAX_BACKOFF_SECONDS)
+    
+    async def analyze_many_async(self, studies: List[List[Dict[str, Any]]],
+                                 patient_data: Optional[List[Dict[str, Any]]] = None,
+                                 max_concurrency: int = 10) -> List[GeminiAnalysis]:
+        """
+        Analyze many studies concurrently, one Gemini call per study
+        
+        Args:
+            studies: Analysis results for each study
+            patient_data: Patient data for each study, in the same order
+            max_concurrency: Maximum number of Gemini calls in flight at once
+            
+        Returns:
+            List: Analyses in input order
+        """
+        if patient_data is None:
+            patient_data = [None] * len(studies)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def bounded(analysis_results, data):
+            async with semaphore:
+                return await self.analyze_dicom_data_async(analysis_results, data)
+        
+        return await asyncio.gather(*[bounded(results, data) for results, data in zip(studies, patient_data)])
+    
+    def analyze_many(self, studies: List[List[Dict[str, Any]]],
+                     patient_data: Optional[List[Dict[str, Any]]] = None,
+                     max_concurrency: int = 10) -> List[GeminiAnalysis]:
+        """Synchronous wrapper around analyze_many_async"""
+        return asyncio.run(self.analyze_many_async(studies, patient_data, max_concurrency))
+    
+    def analyze_dicom_data_batch(self, studies: List[List[Dict[str, Any]]],
+                                 patient_data: Optional[List[Dict[str, Any]]] = None) -> List[GeminiAnalysis]:
+        """Analyze several independent studies with a single Gemini call"""
+        if not studies:
+            return []
+        if patient_data is None:
+            patient_data = [None] * len(studies)
+        if not self.client:
+            return [self._generate_fallback_analysis(results) for results in studies]
         
-        # Split into lines and look for content
-        lines = response_text.split('\n')
-        
-        # Extract differential diagnosis
-        diff_diagnosis = []
-        in_diff_section = False
-        for line in lines:
-            line = line.strip()
-            if 'DIFFERENTIAL DIAGNOSIS' in line.upper() or 'DIAGNOSIS' in line.upper():
-                in_diff_section = True
-                continue
-            elif in_diff_section and line and len(line) > 20:
-                if any(keyword in line.upper() for keyword in ['RECOMMENDATIONS', 'RISK', 'FOLLOW', 'CLINICAL']):
-                    break
-                # Clean up the line
-                clean_line = line.replace('**', '').strip()
-                if clean_line and len(clean_line) > 10:
-                    diff_diagnosis.append(clean_line)
-        
-        # Extract recommendations
-        recommendations = []
-        in_rec_section = False
-        for line in lines:
-            line = line.strip()
-            if 'RECOMMENDATIONS' in line.upper() or 'TREATMENT' in line.upper():
-                in_rec_section = True
-                continue
-            elif in_rec_section and line and len(line) > 20:
-                if any(keyword in line.upper() for keyword in ['RISK', 'FOLLOW', 'CLINICAL', 'IMPRESSION']):
-                    break
-                # Clean up the line
-                clean_line = line.replace('**', '').strip()
-                if clean_line and len(clean_line) > 10:
-                    recommendations.append(clean_line)
-        
-        # Extract risk assessment
-        risk_text = ""
-        for line in lines:
-            if 'RISK' in line.upper() and 'ASSESSMENT' in line.upper():
-                risk_text = line
-                break
-        
-        # Extract follow-up plan
-        follow_up_text = ""
-        for line in lines:
-            if 'FOLLOW' in line.upper() and 'PLAN' in line.upper():
-                follow_up_text = line
-                break
-        
-        # Create a summary from the content
-        summary_parts = []
-        if diff_diagnosis:
-            summary_parts.append(f"Analysis identified {len(diff_diagnosis)} potential diagnoses.")
-        if recommendations:
-            summary_parts.append(f"Generated {len(recommendations)} clinical recommendations.")
-        
-        sections = {
-            'summary': ' '.join(summary_parts) if summary_parts else 'Comprehensive medical analysis completed with detailed findings and recommendations.',
-            'clinical_insights': [],
-            'differential_diagnosis': diff_diagnosis[:5],  # Limit to 5
-            'recommendations': recommendations[:5],  # Limit to 5
-            'risk_assessment': risk_text if risk_text else 'Moderate risk level identified.',
-            'follow_up_plan': follow_up_text if follow_up_text else 'Follow-up imaging and clinical correlation recommended.'
-        }
+        analyses, cache_keys, prompts = self._prepare_studies(studies, patient_data)
+        pending = list(prompts)
+        if not pending:
+            return analyses
+        
+        try:
+            prompt = self._create_batch_analysis_prompt(
+                [self._create_medical_analysis_prompt(*prompts[i]) for i in pending]
+            )
+            response = self._generate_content(prompt, generation_config=self._batch_report_config)
+            reports = orjson.loads(response.text)
+            if len(reports) != len(pending):
+                raise ValueError(f"Expected {len(pending)} reports, got {len(reports)}")
+            
+            for i, report in zip(pending, reports):
+                analyses[i] = self._analysis_from_report(report)
+                self._store_analysis(cache_keys[i], analyses[i])
+                
+        except Exception as e:
+            logger.error(f"Error in batched Gemini analysis: {e}")
+            for i in pending:
+                if analyses[i] is None:
+                    analyses[i] = self._generate_fallback_analysis(studies[i])
         
-        return sections
+        return analyses
+    
+    def analyze_dicom_data_batch_job(self, studies: List[List[Dict[str, Any]]],
+                                     patient_data: Optional[List[Dict[str, Any]]] = None) -> List[GeminiAnalysis]:
+        """
+        Analyze many studies offline through the Gemini Batch API
+        
+        Batch jobs cost half as much as interactive calls and have higher rate limits,
+        but can take up to a day to finish; interactive callers should use analyze_many.
+        
+        Args:
+            studies: Analysis results for each study
+            patient_data: Patient data for each study, in the same order
+            
+        Returns:
+            List: Analyses in input order
+        """
+        if not studies:
+            return []
+        if patient_data is None:
+            patient_data = [None] * len(studies)
+        if not self.client:
+            return [self._generate_fallback_analysis(results) for results in studies]
+        if self._genai_client is None:
+            return self.analyze_many(studies, patient_data)
+        
+        analyses, cache_keys, prompts = self._prepare_studies(studies, patient_data)
+        pending = list(prompts)
+        if not pending:
+            return analyses
+        
+        try:
+            batch_requests = [
+                {
+                    'contents': [{'role': 'user', 'parts': [{'text': self._create_report_prompt(*prompts[i])}]}],
+                    'config': {
+                        'system_instruction': self.SYSTEM_INSTRUCTION,
+                        'response_mime_type': 'application/json',
+                        'response_schema': self.ANALYSIS_SCHEMA,
+                    },
+                }
+                for i in pending
+            ]
+            job = self._genai_client.batches.create(model=self.MODEL_NAME, src=batch_requests)
+            logger.info(f"Submitted Gemini batch job {job.name} for {len(pending)} studies")
+            
+            while job.state.name not in self.BATCH_DONE_STATES:
+                time.sleep(self.BATCH_POLL_SECONDS)
+                job = self._genai_client.batches.get(name=job.name)
+            if job.state.name != 'JOB_STATE_SUCCEEDED':
+                raise RuntimeError(f"Gemini batch job {job.name} ended in {job.state.name}")
+            
+            # Inlined responses come back in request order
+            for i, inlined in zip(pending, job.dest.inlined_responses):
+                if inlined.error or inlined.response is None:
+                    logger.error(f"Gemini batch request for study {i} failed: {inlined.error}")
+                    continue
+                analyses[i] = self._parse_gemini_response(inlined.response.text, studies[i])
+                self._store_analysis(cache_keys[i], analyses[i])
+                
+        except Exception as e:
+            logger.error(f"Error in Gemini batch job: {e}")
+        
+        for i in pending:
+            if analyses[i] is None:
+                analyses[i] = self._generate_fallback_analysis(studies[i])
+        return analyses
+    
+    def _prepare_studies(self, studies: List[List[Dict[str, Any]]], patient_data: List[Optional[Dict[str, Any]]]):
+        """
+        Resolve studies from the cache or fallback, preparing prompt arguments for the rest
+        
+        Returns:
+            Tuple: (analyses with None for studies still to analyze, cache keys,
+                    prompt arguments keyed by the index of each study to analyze)
+        """
+        analyses = []
+        cache_keys = []
+        prompts = {}
+        for i, (results, data) in enumerate(zip(studies, patient_data)):
+            summary, modalities = self._prepare_analysis_summary(results)
+            cache_key = self._response_cache_key(summary, data)
+            if not self._worth_analyzing(results):
+                analysis = self._generate_fallback_analysis(results)
+            else:
+                analysis = self._cached_analysis(cache_key)
+                if analysis is None:
+                    prompts[i] = (summary, data, modalities)
+            analyses.append(analysis)
+            cache_keys.append(cache_key)
+        return analyses, cache_keys, prompts
+    
+    def _create_report_prompt(self, analysis_summary: str, patient_data: Dict[str, Any] = None,
+                              modalities: Optional[Set[str]] = None) -> str:
+        """Per-request prompt asking for one structured report"""
+        prompt = self._create_medical_analysis_prompt(analysis_summary, patient_data, modalities)
+        return f"{prompt}\nReturn the report as a JSON object {self.REPORT_FIELDS_INSTRUCTION}."
+    
+    def _create_batch_analysis_prompt(self, study_prompts: List[str]) -> str:
+        """Combine per-study prompts into one request for a JSON array of reports"""
+        count = len(study_prompts)
+        header = (
+            f"Analyze the following {count} independent studies. Return a JSON array of {count} report objects, "
+            f"one per study and in the same order, each {self.REPORT_FIELDS_INSTRUCTION}."
+        )
+        studies = "\n---\n".join(f"STUDY {number}:\n{prompt}" for number, prompt in enumerate(study_prompts, 1))
+        return f"{header}\n\n{studies}"
+    
+    def _cached_analysis(self, cache_key: str) -> Optional[GeminiAnalysis]:
+        """Return a cached analysis from memory, or from disk on a memory miss"""
+        analysis = self._response_cache.get(cache_key)
+        if analysis is not None:
+            self._response_cache.move_to_end(cache_key)
+            return analysis
+        
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if isinstance(cached, bytes):  # older versions pickled the analysis itself
+                analysis = GeminiAnalysis(**orjson.loads(cached))
+                self._remember_analysis(cache_key, analysis)
+        return analysis
+    
+    def _store_analysis(self, cache_key: str, analysis: GeminiAnalysis):
+        """Cache an analysis in memory and on disk"""
+        self._remember_analysis(cache_key, analysis)
+        if self.cache is not None:
+            # Stored as JSON bytes, which diskcache writes as is instead of pickling
+            self.cache.set(cache_key, orjson.dumps(analysis), expire=self.CACHE_EXPIRE_SECONDS)
+    
+    def _remember_analysis(self, cache_key: str, analysis: GeminiAnalysis):
+        """Keep an analysis in memory, evicting the least recently used beyond RESPONSE_CACHE_SIZE"""
+        self._response_cache[cache_key] = analysis
+        if len(self._response_cache) > self.RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+    
+    def _worth_analyzing(self, analysis_results: List[Dict[str, Any]]) -> bool:
+        """Whether a study has enough findings to justify a Gemini call over the fallback"""
+        if not analysis_results:
+            return False
+        total_findings = sum(len(result.get('pathologies', [])) + len(result.get('anatomical_landmarks', []))
+                             for result in analysis_results)
+        if total_findings < self.min_findings_for_llm:
+            logger.debug(f"Skipping Gemini for a study with {total_findings} findings")
+            return False
+        # A single file with landmarks only has nothing for the report to interpret
+        if len(analysis_results) == 1 and not analysis_results[0].get('pathologies'):
+            logger.debug("Skipping Gemini for a single-file study without pathologies")
+            return False
+        return True
+    
+    def _response_cache_key(self, analysis_summary: str, patient_data: Optional[Dict[str, Any]]) -> str:
+        """Cache key over the analysis summary and the patient data sent in the prompt"""
+        digest = hashlib.blake2b(analysis_summary.encode(), digest_size=16)
+        digest.update(orjson.dumps(patient_data or {}, default=str,
+                                   option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS))
+        return digest.hexdigest()
+    
+    def _prepare_analysis_summary(self, analysis_results: List[Dict[str, Any]]) -> Tuple[str, FrozenSet[str]]:
+        """Prepare comprehensive summary of all analysis results, with the modalities they cover"""
+        # Only these fields feed the summary, so repeated studies share one cached summary
+        study = tuple(
+            (result.get('body_part', 'unknown'),
+             tuple(result.get('pathologies', ())),
+             tuple(result.get('anatomical_landmarks', ())),
+             result.get('modality', 'unknown'),
+             result.get('confidence', 0))
+            for result in analysis_results
+        )
+        try:
+            return _summarize_study(study)
+        except TypeError:  # unhashable values cannot be cached
+            return _summarize_study.__wrapped__(study)
+    
+    def _create_medical_analysis_prompt(self, analysis_summary: str, patient_data: Dict[str, Any] = None,
+                                        modalities: Optional[Set[str]] = None) -> str:
+        """Create the per-request part of the medical analysis prompt for Gemini AI"""
+        fields = {**self.PATIENT_DEFAULTS, **(patient_data or {}), 'analysis_summary': analysis_summary}
+        # Without a modality in the patient data, report the ones found in the analysis results
+        if modalities and not (patient_data and 'modality' in patient_data):
+            fields['modality'] = ', '.join(sorted(modalities))
+        return self.REQUEST_TEMPLATE.format_map(fields)
+    
+    def _parse_gemini_response(self, response_text: str, analysis_results: List[Dict[str, Any]]) -> GeminiAnalysis:
+        """Parse Gemini's structured JSON report into a GeminiAnalysis"""
+        try:
+            return self._analysis_from_report(orjson.loads(response_text))
+        except Exception as e:
+            logger.error(f"Error parsing Gemini response: {e}")
+            return self._generate_fallback_analysis(analysis_results)
+    
+    def _analysis_from_report(self, report: Dict[str, Any]) -> GeminiAnalysis:
+        """Build a GeminiAnalysis from one report object matching ANALYSIS_SCHEMA"""
+        return GeminiAnalysis(
+            **{field: report[field] for field in self.ANALYSIS_SCHEMA['required']},
+            ai_confidence=0.90  # High confidence for detailed Gemini analysis
+        )
     
     def _extract_report_sections(self, response_text: str) -> Dict[str, str]:
         """Extract detailed report sections from Gemini response"""
         sections = {}
         
         try:
-            # Define section markers
-            section_markers = [
-                ('clinical_indication', '**CLINICAL INDICATION:**'),
-                ('technique', '**TECHNIQUE:**'),
-                ('findings', '**FINDINGS:**'),
-                ('impression', '**IMPRESSION:**'),
-                ('recommendations', '**RECOMMENDATIONS:**')
-            ]
-            
-            # Extract each section
-            for i, (section_name, marker) in enumerate(section_markers):
-                if marker in response_text:
-                    start_idx = response_text.find(marker) + len(marker)
-                    
-                    # Find the end of this section (start of next section or end of text)
-                    end_idx = len(response_text)
-                    for j in range(i + 1, len(section_markers)):
-                        next_marker = section_markers[j][1]
-                        if next_marker in response_text:
-                            next_start = response_text.find(next_marker)
-                            if next_start > start_idx:
-                                end_idx = next_start
-                                break
-                    
-                    # Also check for REPORTED BY section
-                    reported_by_idx = response_text.find('**REPORTED BY:**')
-                    if reported_by_idx != -1 and reported_by_idx < end_idx and reported_by_idx > start_idx:
-                        end_idx = reported_by_idx
-                    
-                    section_content = response_text[start_idx:end_idx].strip()
-                    # Clean up the content
-                    section_content = section_content.replace('\n\n', '\n').strip()
-                    if section_content:
-                        sections[section_name] = section_content
+            # Each section runs from its heading to the next heading (or the end)
+            headings = list(_REPORT_SECTION_RE.finditer(response_text))
+            for heading, next_heading in zip(headings, headings[1:] + [None]):
+                section_name = _REPORT_SECTION_KEYS.get(heading.group(1))
+                if section_name is None or section_name in sections:
+                    continue
+                
+                end_idx = next_heading.start() if next_heading else len(response_text)
+                section_content = response_text[heading.end():end_idx]
+                # Clean up the content
+                section_content = section_content.replace('\n\n', '\n').strip()
+                if section_content:
+                    sections[section_name] = section_content
             
             return sections
             
@@ -365,18 +742,11 @@ IMPORTANT: Write in detailed, comprehensive paragraphs using professional medica
         """Generate concise fallback analysis when Gemini is not available"""
         total_files = len(analysis_results)
         
-        # Collect all pathologies
-        all_pathologies = []
-        for result in analysis_results:
-            all_pathologies.extend(result.get('pathologies', []))
-        
-        pathology_counts = {}
-        for pathology in all_pathologies:
-            pathology_counts[pathology] = pathology_counts.get(pathology, 0) + 1
+        pathology_counts = Counter(itertools.chain.from_iterable(result.get('pathologies', ()) for result in analysis_results))
         
         # Generate concise summary (under 100 words)
         if pathology_counts:
-            most_common = max(pathology_counts, key=pathology_counts.get)
+            most_common = pathology_counts.most_common(1)[0][0]
             summary = f"Analysis of {total_files} DICOM files reveals {len(pathology_counts)} pathology types. Primary finding: {most_common}. Clinical correlation required. Follow-up imaging recommended."
         else:
             summary = f"Analysis of {total_files} DICOM files completed. No significant pathologies detected. Standard follow-up recommended."
@@ -399,8 +769,18 @@ IMPORTANT: Write in detailed, comprehensive paragraphs using professional medica
         """Generate clear human analysis (wrapper for compatibility)"""
         return self.generate_detailed_human_analysis(analysis_result)
     
-    def generate_detailed_human_analysis(self, analysis_result: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate detailed human-readable analysis for a single analysis result"""
+    def generate_detailed_human_analysis(self, analysis_result: Dict[str, Any],
+                                         on_text: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Generate detailed human-readable analysis for a single analysis result
+        
+        Args:
+            analysis_result: Analysis result for one DICOM file
+            on_text: Called with each piece of report text as Gemini streams it
+            
+        Returns:
+            Dict: Report sections parsed from the complete report
+        """
         if not self.client:
             return self._generate_fallback_human_analysis(analysis_result)
         
@@ -414,14 +794,19 @@ IMPORTANT: Write in detailed, comprehensive paragraphs using professional medica
             # Create detailed prompt
             prompt = self._create_medical_analysis_prompt(analysis_summary, patient_data)
             
-            # Get Gemini response
-            response = self.client.generate_content(prompt)
+            # Stream the Gemini response, handing each piece to the caller as it arrives
+            chunks = []
+            for text in self._stream_text(prompt):
+                chunks.append(text)
+                if on_text:
+                    on_text(text)
+            report_text = "".join(chunks)
             
-            # Parse the detailed response
-            sections = self._extract_report_sections(response.text)
+            # Parse the detailed response once it is complete
+            sections = self._extract_report_sections(report_text)
             
             return {
-                'executive_summary': response.text.strip(),
+                'executive_summary': report_text.strip(),
                 'detailed_findings': sections.get('findings', 'Detailed findings analysis completed'),
                 'clinical_indication': sections.get('clinical_indication', 'Radiological evaluation'),
                 'technique': sections.get('technique', 'Advanced medical imaging analysis'),
@@ -431,7 +816,7 @@ IMPORTANT: Write in detailed, comprehensive paragraphs using professional medica
                 'follow_up_plan': sections.get('recommendations', 'Standard follow-up recommended'),
                 'patient_demographics': patient_data,
                 'report_generated_by': patient_data.get('doctor_name', 'DR. RADIOLOGIST'),
-                'report_date': datetime.now().strftime('%B %d, %Y at %H:%M'),
+                'report_date': report_date(),
                 'enhanced': True
             }
             
@@ -469,16 +854,17 @@ IMPORTANT: Write in detailed, comprehensive paragraphs using professional medica
         if not raw_name or raw_name.upper() == 'UNKNOWN':
             return 'UNKNOWN PATIENT', 'DR. RADIOLOGIST'
         
-        # Clean the name
+        # Clean the name, uppercasing it once for the pattern checks
         raw_name = str(raw_name).strip()
+        upper_name = raw_name.upper()
         
         # Look for doctor name patterns
         doctor_name = 'DR. RADIOLOGIST'  # Default
         clean_patient_name = raw_name
         
         # Pattern 1: "PATIENT NAME DR.DOCTOR NAME"
-        if ' DR.' in raw_name.upper():
-            parts = raw_name.upper().split(' DR.')
+        if ' DR.' in upper_name:
+            parts = upper_name.split(' DR.')
             if len(parts) >= 2:
                 clean_patient_name = parts[0].strip()
                 doctor_part = parts[1].strip()
@@ -486,8 +872,8 @@ IMPORTANT: Write in detailed, comprehensive paragraphs using professional medica
                     doctor_name = f'DR.{doctor_part}'
         
         # Pattern 2: "PATIENT NAME DR DOCTOR NAME"
-        elif ' DR ' in raw_name.upper():
-            parts = raw_name.upper().split(' DR ')
+        elif ' DR ' in upper_name:
+            parts = upper_name.split(' DR ')
             if len(parts) >= 2:
                 clean_patient_name = parts[0].strip()
                 doctor_part = parts[1].strip()
@@ -503,8 +889,8 @@ IMPORTANT: Write in detailed, comprehensive paragraphs using professional medica
         
         for field in sex_fields:
             value = patient_info.get(field) or analysis_result.get(field)
-            if value and str(value).strip().upper() != 'UNKNOWN':
-                sex_value = str(value).strip().upper()
+            sex_value = str(value).strip().upper() if value else ''
+            if sex_value and sex_value != 'UNKNOWN':
                 # Normalize sex values
                 if sex_value in ['M', 'MALE', 'MAN']:
                     return 'Male'
@@ -522,10 +908,11 @@ IMPORTANT: Write in detailed, comprehensive paragraphs using professional medica
         
         for field in age_fields:
             value = patient_info.get(field) or analysis_result.get(field)
-            if value and str(value).strip().upper() != 'UNKNOWN':
-                age_str = str(value).strip()
+            age_str = str(value).strip() if value else ''
+            upper_age = age_str.upper()
+            if value and upper_age != 'UNKNOWN':
                 # Handle different age formats: "25Y", "025Y", "25", "25 years"
-                if 'Y' in age_str.upper():
+                if 'Y' in upper_age:
                     # Extract numeric part
                     numeric_part = ''.join(filter(str.isdigit, age_str))
                     if numeric_part:
@@ -628,6 +1015,6 @@ Board-Certified Radiologist""",
             'follow_up_plan': 'Standard follow-up recommended',
             'patient_demographics': patient_data,
             'report_generated_by': patient_data['doctor_name'],
-            'report_date': datetime.now().strftime('%B %d, %Y at %H:%M'),
+            'report_date': report_date(),
             'enhanced': False
         }
@@ -9,7 +9,7 @@ import base64
 import io
 import json
 import logging
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, FrozenSet
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -34,6 +34,9 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Imaging modalities accepted by the analyzer
+SUPPORTED_MODALITIES = frozenset({'CT', 'MR', 'XR', 'US', 'CR', 'DR', 'NM', 'PT'})
+
 
 @dataclass
 class BodyPartAnalysis:
@@ -2030,8 +2033,10 @@ class OpenSourceMedicalAnalyzer:
     def validate_dicom_file(self, file_path: str) -> bool:
         """Validate if file is a valid DICOM file"""
         try:
-            dataset = pydicom.dcmread(file_path)
-            return hasattr(dataset, 'Modality')
+            # Parse only the Modality element; skip the pixel data
+            dataset = pydicom.dcmread(file_path, stop_before_pixels=True,
+                                      specific_tags=['Modality'])
+            return 'Modality' in dataset
         except:
             return False
 
@@ -2294,6 +2299,6 @@ class OpenSourceMedicalAnalyzer:
             logger.error(f"Error detecting anatomical landmarks: {e}")
             return ["soft tissues"]
 
-    def get_supported_modalities(self) -> List[str]:
-        """Get list of supported imaging modalities"""
-        return ['CT', 'MR', 'XR', 'US', 'CR', 'DR', 'NM', 'PT']
+    def get_supported_modalities(self) -> FrozenSet[str]:
+        """Get set of supported imaging modalities"""
+        return SUPPORTED_MODALITIES
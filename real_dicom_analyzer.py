@@ -559,7 +559,7 @@ class RealDicomAnalyzer:
     def validate_dicom_file(self, filepath):
         """Validate DICOM file"""
         try:
-            dicom_data = pydicom.dcmread(filepath)
+            pydicom.dcmread(filepath, stop_before_pixels=True)
             return True
         except:
             return False
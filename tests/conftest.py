@@ -0,0 +1,20 @@
+"""Shared fixtures"""
+
+import pytest
+
+
+@pytest.fixture
+def gemini_chunk():
+    """Factory for streamed google-generativeai response chunks; text=None gives a part-less chunk"""
+    genai = pytest.importorskip('google.generativeai')
+    protos = genai.protos
+
+    def make(text=None, finish_reason=protos.Candidate.FinishReason.FINISH_REASON_UNSPECIFIED):
+        parts = [protos.Part(text=text)] if text is not None else []
+        response = protos.GenerateContentResponse(candidates=[protos.Candidate(
+            content=protos.Content(parts=parts, role='model'), finish_reason=finish_reason)])
+        return genai.types.GenerateContentResponse.from_response(response)
+
+    make.STOP = protos.Candidate.FinishReason.STOP
+    make.MAX_TOKENS = protos.Candidate.FinishReason.MAX_TOKENS
+    return make
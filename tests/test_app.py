@@ -0,0 +1,43 @@
+"""Tests for app.py helpers that do not need a running server"""
+
+import pytest
+
+pytest.importorskip('flask')
+
+import app
+
+
+def _stream(*chunks):
+    """Streamed response chunks, recording which were read"""
+    read = []
+    def stream():
+        for chunk in chunks:
+            read.append(chunk)
+            yield chunk
+    return stream(), read
+
+
+def test_collect_clear_summary_stops_after_word_limit(gemini_chunk):
+    analyzer = app.GeminiAnalyzer.__new__(app.GeminiAnalyzer)
+    limit = analyzer.CLEAR_SUMMARY_WORDS
+    # Marker and words split across chunks, with a final chunk that is never needed
+    chunks = [gemini_chunk(text) for text in
+              ('Intro **CLINICAL', ' SUMMARY:** wo', 'rd ' * (limit - 1), 'last', ' extra', ' unread')]
+    response, read = _stream(*chunks)
+
+    text = analyzer._collect_clear_summary(response)
+
+    assert read[-1] is chunks[-2]
+    assert text.endswith('last extra')
+
+
+@pytest.mark.parametrize('finish_reason', ['STOP', 'MAX_TOKENS'])
+def test_collect_clear_summary_reads_short_responses_completely(gemini_chunk, finish_reason):
+    analyzer = app.GeminiAnalyzer.__new__(app.GeminiAnalyzer)
+    # Chunks without parts, including the final one of a stopped stream, add no text
+    response, read = _stream(gemini_chunk('**CLINICAL SUMMARY:** Normal '), gemini_chunk(),
+                             gemini_chunk('study.'),
+                             gemini_chunk(finish_reason=getattr(gemini_chunk, finish_reason)))
+
+    assert analyzer._collect_clear_summary(response) == '**CLINICAL SUMMARY:** Normal study.'
+    assert len(read) == 4
@@ -0,0 +1,193 @@
+"""Tests for database_manager helpers that do not need a live Supabase project"""
+
+import base64
+import io
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('supabase')
+
+import database_manager
+from database_manager import DatabaseManager, decode_page_cursor, encode_page_cursor
+
+CREATED_AT = '2024-05-01T10:20:30.12345+00:00'
+RECORD_ID = '0f8fad5b-d9cb-469f-a165-70867728950e'
+
+
+@pytest.fixture
+def manager():
+    """DatabaseManager with a mocked Supabase client"""
+    with mock.patch.dict('os.environ', {'SUPABASE_URL': '', 'SUPABASE_KEY': ''}):
+        db = DatabaseManager()
+    db.supabase_url = 'https://example.supabase.co'
+    db.client = mock.MagicMock()
+    return db
+
+
+def test_page_cursor_round_trip():
+    token = encode_page_cursor((CREATED_AT, RECORD_ID))
+
+    assert ',' not in token and '+' not in token
+    assert decode_page_cursor(token) == ('2024-05-01T10:20:30.123450+00:00', RECORD_ID)
+
+
+def test_page_cursor_empty():
+    assert encode_page_cursor(None) is None
+    assert decode_page_cursor(None) is None
+    assert decode_page_cursor('') is None
+
+
+@pytest.mark.parametrize('cursor', [
+    [CREATED_AT, f'{RECORD_ID}),id.gt.0'],
+    ['2024-05-01"),created_at.gt.("', RECORD_ID],
+    [CREATED_AT, 42],
+    [CREATED_AT],
+    {'created_at': CREATED_AT},
+])
+def test_page_cursor_rejects_invalid_values(cursor):
+    token = base64.urlsafe_b64encode(database_manager.orjson.dumps(cursor)).decode()
+
+    with pytest.raises(ValueError):
+        decode_page_cursor(token)
+
+
+@pytest.mark.parametrize('token', [
+    f'{CREATED_AT},{RECORD_ID}',
+    'not base64!',
+    base64.urlsafe_b64encode(b'not json').decode(),
+    'é',
+])
+def test_page_cursor_rejects_malformed_tokens(token):
+    with pytest.raises(ValueError):
+        decode_page_cursor(token)
+
+
+def test_fetch_page_quotes_cursor_filter(manager):
+    query = manager.client.table.return_value.select.return_value\
+        .order.return_value.order.return_value.limit.return_value
+    query.or_.return_value.execute.return_value.data = []
+
+    manager._fetch_page('dicom_analyses', 20, (CREATED_AT, RECORD_ID.upper()))
+
+    query.or_.assert_called_once_with(
+        'created_at.lt."2024-05-01T10:20:30.123450+00:00",'
+        f'and(created_at.eq."2024-05-01T10:20:30.123450+00:00",id.lt."{RECORD_ID}")')
+
+
+def test_fetch_page_rejects_invalid_cursor(manager):
+    assert manager.get_analysis_history(20, (CREATED_AT, 'x),id.gt.0')) == \
+        {'rows': [], 'next_cursor': None}
+
+
+@pytest.fixture
+def storage_requests(manager):
+    """Route the manager's storage calls through storage3 to a recording mock transport"""
+    httpx = pytest.importorskip('httpx')
+    from storage3 import SyncStorageClient
+
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={'Key': 'patient-reports/report.pdf', 'Id': RECORD_ID})
+
+    manager.client.storage = SyncStorageClient(
+        'https://example.supabase.co/storage/v1/', {},
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+    return requests
+
+
+def test_upload_pdf_bytes(manager, storage_requests):
+    info = manager.upload_pdf_to_storage(b'%PDF-1.4 bytes', 'report.pdf')
+
+    assert info['file_size'] == 14
+    assert info['public_url'].endswith('/storage/v1/object/public/patient-reports/report.pdf')
+    assert b'%PDF-1.4 bytes' in storage_requests[0].read()
+
+
+def test_upload_pdf_file_handle(manager, storage_requests, tmp_path):
+    pdf_path = tmp_path / 'report.pdf'
+    pdf_path.write_bytes(b'%PDF-1.4 file')
+
+    with open(pdf_path, 'rb') as pdf_file:
+        info = manager.upload_pdf_to_storage(pdf_file, 'report.pdf')
+
+    assert info['file_size'] == 13
+    assert b'%PDF-1.4 file' in storage_requests[0].read()
+
+
+def test_upload_pdf_rejects_other_streams(manager):
+    manager.client.storage = mock.MagicMock()
+
+    assert manager.upload_pdf_to_storage(io.BytesIO(b'%PDF'), 'report.pdf') is None
+    manager.client.storage.from_.assert_not_called()
+
+
+def test_upload_pdf_bytes_falls_back_to_update(manager):
+    bucket = manager.client.storage.from_.return_value
+    bucket.upload.side_effect = RuntimeError('Duplicate')
+
+    info = manager.upload_pdf_to_storage(b'%PDF', 'report.pdf')
+
+    assert info['file_size'] == 4
+    bucket.update.assert_called_once_with(
+        path='report.pdf', file=b'%PDF', file_options={'content-type': 'application/pdf'})
+
+
+def test_save_patient_report_upsert_payload(manager):
+    upsert = manager.client.table.return_value.upsert
+    upsert.return_value.execute.return_value.data = [{'id': 'report-id'}]
+    analysis_result = {
+        'patient_info': {'name': 'JOHN DOE DR.S KAR', 'patient_id': 'P1', 'study_date': '20240501'},
+        'modality': 'MR',
+        'body_part': 'brain',
+        'pathologies': ['Pituitary microadenoma'],
+    }
+
+    assert manager.save_patient_report(analysis_result) == 'report-id'
+    assert manager.save_patient_report(analysis_result) == 'report-id'
+
+    first, second = (call.args[0] for call in upsert.call_args_list)
+    assert first == second
+    assert upsert.call_args.kwargs == {'on_conflict': 'id'}
+    assert first['patient_name'] == 'JOHN DOE'
+    assert first['doctor_name'] == 'DR.S KAR'
+    assert first['pathologies'] == ['Pituitary microadenoma']
+    assert first['id'] == str(database_manager.uuid.uuid5(
+        database_manager._REPORT_ID_NAMESPACE, 'P1|20240501|MR'))
+    # Re-saving must not reset the status or other server-owned columns
+    assert not first.keys() & {'report_status', 'is_professional', 'report_type',
+                               'created_at', 'updated_at', 'report_date'}
+
+
+def test_http_pool_shared_by_supabase_clients():
+    env = {'SUPABASE_URL': 'https://example.supabase.co', 'SUPABASE_KEY': 'key',
+           'SUPABASE_HTTP_POOL': 'true'}
+    with mock.patch.dict('os.environ', env):
+        db = DatabaseManager()
+
+    session = db.client.postgrest.session
+    assert db.client.storage.session is session
+    assert session.timeout.connect == 2
+
+
+def test_duplicate_file_hash_skips_second_save(manager):
+    table = manager.client.table.return_value
+    table.upsert.return_value.execute.return_value.data = [{'id': RECORD_ID}]
+    table.select.return_value.eq.return_value.limit.return_value.execute.return_value.data = \
+        [{'id': RECORD_ID}]
+    file_info = {'filename': 'a.dcm', 'file_hash': 'abc'}
+
+    assert manager.save_analysis_result({}, file_info) == RECORD_ID
+    assert manager.save_analysis_result({}, file_info) == RECORD_ID
+    assert table.upsert.call_count == 1
+
+
+def test_known_hashes_are_bounded(manager, monkeypatch):
+    monkeypatch.setattr(database_manager, '_KNOWN_HASHES_SIZE', 2)
+
+    for file_hash in ('a', 'b', 'c'):
+        manager._remember_hash(file_hash)
+
+    assert list(manager._known_hashes) == ['b', 'c']
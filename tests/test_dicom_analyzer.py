@@ -0,0 +1,47 @@
+"""Tests for DICOMAnalyzer image preparation"""
+
+import os
+import shutil
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('openai')
+pydicom_examples = pytest.importorskip('pydicom.examples')
+
+from dicom_analyzer import DICOMAnalyzer
+
+
+@pytest.fixture
+def dicom_path(tmp_path):
+    path = tmp_path / 'CT_small.dcm'
+    shutil.copy(pydicom_examples.get_path('ct'), path)
+    return str(path)
+
+
+def test_converted_images_not_cached_by_default(dicom_path, tmp_path):
+    analyzer = DICOMAnalyzer(api_key='test', cache_dir=None)
+
+    analyzer._prepare_dicom_file(dicom_path)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['CT_small.dcm']
+
+
+def test_converted_image_cache_is_versioned(dicom_path, monkeypatch):
+    analyzer = DICOMAnalyzer(api_key='test', cache_dir=None, cache_converted_images=True)
+    convert = mock.Mock(wraps=analyzer.convert_to_image)
+    monkeypatch.setattr(analyzer, 'convert_to_image', convert)
+    cache_path = analyzer._converted_image_path(dicom_path)
+
+    _, image = analyzer._prepare_dicom_file(dicom_path)
+    assert os.path.exists(cache_path)
+
+    # Re-runs are served from the cache without decoding pixels
+    assert analyzer._prepare_dicom_file(dicom_path)[1] == image
+    assert convert.call_count == 1
+
+    # A new conversion version ignores JPEGs written by older code
+    monkeypatch.setattr(analyzer, 'IMAGE_CACHE_VERSION', DICOMAnalyzer.IMAGE_CACHE_VERSION + 1)
+    analyzer._prepare_dicom_file(dicom_path)
+    assert convert.call_count == 2
+    assert analyzer._converted_image_path(dicom_path) != cache_path
@@ -0,0 +1,62 @@
+"""Tests for the threshold classifiers in enhanced_pathology_detector"""
+
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+import enhanced_pathology_detector as detector
+
+# Values on, just inside and just outside every threshold, plus NaN
+BRIGHTNESS = [np.nan, 0, 100, 101, 120, 121, 130, 131, 140, 141, 179, 180, 181]
+CONTRAST = [np.nan, 0, 25, 26, 30, 31, 40, 41, 45, 46, 50, 51, 84, 85, 86]
+EDGE_DENSITY = [np.nan, 0, 0.03, 0.031, 0.04, 0.041, 0.05, 0.051, 0.06, 0.061, 0.08, 0.081]
+TEXTURE_STD = [np.nan, 0, 20, 21, 25, 26, 50, 51]
+
+
+@pytest.mark.parametrize('study', range(detector._STUDY_OTHER + 1))
+def test_classify_batch_matches_classify(study):
+    rows = list(itertools.product(BRIGHTNESS, CONTRAST, EDGE_DENSITY, TEXTURE_STD))
+
+    masks = detector._classify_batch(*np.array(rows).T, study)
+
+    assert masks.tolist() == [detector._classify(*row, study) for row in rows]
+
+
+def test_classify_thresholds():
+    brain = detector._STUDY_BRAIN
+    assert detector._classify(150.0, 0.0, 0.0, 0.0, brain) == detector._PITUITARY_MICROADENOMA
+    assert detector._classify(180.0, 0.0, 0.0, 0.0, brain) == detector._BRAIN_FINDING
+    assert detector._classify(141.0, 51.0, 0.0, 0.0, detector._STUDY_CHEST) == detector._PULMONARY_NODULE
+    assert detector._classify(0.0, 0.0, 0.0, 0.0, detector._STUDY_CHEST) == 0
+    assert detector._classify(0.0, 0.0, 0.0, 26.0, detector._STUDY_OTHER) == detector._GENERAL_ABNORMALITY
+
+
+@pytest.mark.parametrize('metadata, study, default_phrases', [
+    (SimpleNamespace(body_part_examined='BRAIN', study_description='MRI pituitary',
+                     series_description='T1 SAG POST'),
+     detector._STUDY_BRAIN, detector._BRAIN_FINDING_PHRASES),
+    (SimpleNamespace(body_part_examined='BREAST', study_description='MRI breast bilateral',
+                     series_description='STIR AX'),
+     detector._STUDY_BREAST, detector._BREAST_FINDING_PHRASES),
+])
+def test_detect_batch_matches_per_image(metadata, study, default_phrases):
+    # The second image meets none of the study's rules and gets its default findings
+    features = {
+        'brightness': [150.0, 90.0, 185.0],
+        'contrast': [30.0, 10.0, 90.0],
+        'edge_density': [0.05, 0.01, 0.02],
+        'texture_std': [30.0, 10.0, 90.0],
+    }
+
+    batch = detector.detect_enhanced_pathologies_batch(features, metadata)
+
+    assert detector._study_type(metadata) == study
+    assert batch[1].pathologies == list(default_phrases)
+    assert batch == [
+        detector.detect_enhanced_pathologies(
+            {key: values[i] for key, values in features.items()}, metadata)
+        for i in range(3)]
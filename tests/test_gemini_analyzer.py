@@ -0,0 +1,130 @@
+"""Tests for gemini_analyzer that do not call the Gemini API"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('google.generativeai')
+
+import gemini_analyzer
+from gemini_analyzer import GeminiAnalyzer
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    """GeminiAnalyzer without an API key or disk cache, with retries that do not sleep"""
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    monkeypatch.delenv('GEMINI_CACHE_DIR', raising=False)
+    monkeypatch.setattr(gemini_analyzer.time, 'sleep', lambda seconds: None)
+    return GeminiAnalyzer()
+
+
+def _stream(*chunks, error=None):
+    """Stream of response chunks, optionally failing after them"""
+    yield from chunks
+    if error:
+        raise error
+
+
+def test_chunk_text_skips_chunks_without_parts(gemini_chunk):
+    assert gemini_analyzer.chunk_text(gemini_chunk('Normal study.')) == 'Normal study.'
+    assert gemini_analyzer.chunk_text(gemini_chunk(finish_reason=gemini_chunk.STOP)) == ''
+    assert gemini_analyzer.chunk_text(SimpleNamespace(parts=None)) == ''
+
+
+def test_stream_text_retries_errors_before_first_text(analyzer, gemini_chunk):
+    analyzer.client = mock.Mock()
+    analyzer.client.generate_content.side_effect = [
+        _stream(gemini_chunk(), error=gemini_analyzer.google_exceptions.ServiceUnavailable('busy')),
+        _stream(gemini_chunk('**FINDINGS:** '), gemini_chunk(), gemini_chunk('Normal study.'),
+                gemini_chunk(finish_reason=gemini_chunk.MAX_TOKENS)),
+    ]
+
+    assert list(analyzer._stream_text('prompt')) == ['**FINDINGS:** ', 'Normal study.']
+    assert analyzer.client.generate_content.call_count == 2
+
+
+def test_stream_text_does_not_retry_after_text(analyzer, gemini_chunk):
+    analyzer.client = mock.Mock()
+    analyzer.client.generate_content.side_effect = [
+        _stream(gemini_chunk('partial'),
+                error=gemini_analyzer.google_exceptions.ServiceUnavailable('busy')),
+    ]
+
+    with pytest.raises(gemini_analyzer.google_exceptions.ServiceUnavailable):
+        list(analyzer._stream_text('prompt'))
+    assert analyzer.client.generate_content.call_count == 1
+
+
+def _study(body_part='brain', pathologies=(), landmarks=(), modality='MR', confidence=0.8):
+    return (body_part, tuple(pathologies), tuple(landmarks), modality, confidence)
+
+
+def test_summarize_study_lists_every_finding_up_to_limit():
+    limit = gemini_analyzer._SUMMARY_TOP_FINDINGS
+    pathologies = [f'finding {i}' for i in range(limit)]
+
+    summary, modalities = gemini_analyzer._summarize_study((_study(pathologies=pathologies),))
+
+    assert '  - Pathologies detected:' in summary
+    assert all(f'    * {pathology} (1 files)' in summary for pathology in pathologies)
+    assert modalities == frozenset({'MR'})
+
+
+def test_summarize_study_keeps_most_frequent_findings():
+    limit = gemini_analyzer._SUMMARY_TOP_FINDINGS
+    rare = [f'rare {i}' for i in range(limit)]
+    study = (
+        _study(pathologies=['common'] + rare, landmarks=['sella']),
+        _study(pathologies=['common']),
+        _study(body_part='chest', pathologies=['nodule'], modality='CT', confidence=0.6),
+    )
+
+    summary, modalities = gemini_analyzer._summarize_study(study)
+
+    assert f'  - Pathologies detected (top {limit} of {limit + 1}):' in summary
+    brain = summary.split('CHEST ANALYSIS')[0]
+    assert brain.index('    * common (2 files)') < brain.index('    * rare 0 (1 files)')
+    assert 'rare 8' in brain and f'rare {limit - 1}' not in brain
+    assert '  - Anatomical landmarks:\n    * sella (1 files)' in brain
+    assert 'CHEST ANALYSIS (1 files):' in summary
+    assert modalities == frozenset({'MR', 'CT'})
+
+
+def test_analysis_cache_round_trip(monkeypatch, tmp_path):
+    pytest.importorskip('diskcache')
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    analysis = gemini_analyzer.GeminiAnalysis(
+        summary='Pituitary microadenoma.',
+        clinical_insights=['Small sellar lesion'],
+        differential_diagnosis=['Rathke cleft cyst'],
+        recommendations=['Follow-up MRI in 6 months'],
+        risk_assessment='Low',
+        follow_up_plan='Endocrinology referral',
+        ai_confidence=0.9,
+    )
+
+    GeminiAnalyzer(cache_dir=str(tmp_path))._store_analysis('key', analysis)
+
+    # A fresh analyzer has an empty memory cache, so this reads the orjson bytes from disk
+    fresh = GeminiAnalyzer(cache_dir=str(tmp_path))
+    assert isinstance(fresh.cache.get('key'), bytes)
+    assert fresh._cached_analysis('key') == analysis
+    assert fresh._response_cache['key'] == analysis
+
+
+def test_analysis_cache_ignores_pickled_entries(analyzer, tmp_path):
+    diskcache = pytest.importorskip('diskcache')
+    analyzer.cache = diskcache.Cache(str(tmp_path))
+    analyzer.cache.set('key', {'summary': 'pickled by an older version'})
+
+    assert analyzer._cached_analysis('key') is None
+
+
+def test_disk_cache_is_opt_in(analyzer, monkeypatch, tmp_path):
+    pytest.importorskip('diskcache')
+    assert analyzer.cache is None
+
+    monkeypatch.setenv('GEMINI_CACHE_DIR', str(tmp_path))
+    assert GeminiAnalyzer().cache.directory == str(tmp_path)